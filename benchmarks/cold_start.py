@@ -0,0 +1,66 @@
+'''
+    Measures how long a fresh process takes to load the Panopto 4.6
+    service WSDLs, with and without the parsed WSDL cache.
+
+    python -m benchmarks.cold_start --server <panopto server> \
+        [--cache-dir <sqlite cache file>] [--runs 5]
+
+    Every run is a new interpreter, so the process-wide memo never
+    helps. The first cached run parses and saves the documents, later
+    runs load them from disk.
+'''
+import argparse
+import statistics
+import os
+import subprocess
+import sys
+import tempfile
+
+
+SERVICES = ['Auth', 'SessionManagement', 'AccessManagement',
+            'UserManagement']
+
+CHILD = '''
+import sys, time
+started = time.perf_counter()
+from panopto.auth import service_document
+for name in sys.argv[3:]:
+    service_document(sys.argv[1], name, sys.argv[2] or None)
+print(time.perf_counter() - started)
+'''
+
+
+def cold_start(server, cache_dir):
+    output = subprocess.check_output(
+        [sys.executable, '-c', CHILD, server, cache_dir or ''] + SERVICES)
+    return float(output)
+
+
+def measure(server, cache_dir, runs):
+    return [cold_start(server, cache_dir) for i in range(runs)]
+
+
+def report(label, timings):
+    print('{:<28} median {:7.3f}s  min {:7.3f}s  max {:7.3f}s'.format(
+        label, statistics.median(timings), min(timings), max(timings)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--server', required=True)
+    parser.add_argument('--cache-dir')
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    cache_dir = args.cache_dir or os.path.join(
+        tempfile.mkdtemp(), 'panopto.sqlite')
+
+    report('no cache', measure(args.server, None, args.runs))
+
+    first = cold_start(args.server, cache_dir)
+    report('cache, first run', [first])
+    report('cache, warm', measure(args.server, cache_dir, args.runs))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,186 @@
+'''
+    Load harness for PanoptoSessionManager, run against the stand-in
+    SOAP service in panopto.tests.soap_service.
+
+    python -m benchmarks.sessions [--sessions 1000,10000,50000] \
+        [--concurrency 1,8,32] [--calls 200] [--output results.json]
+
+    For each catalog size a stand-in is started in its own process, and
+    each operation is called --calls times from a pool of --concurrency
+    threads sharing one manager. Latency percentiles and calls per
+    second are reported with the peak memory a single call allocates,
+    measured with tracemalloc on a separate, untimed call.
+'''
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import multiprocessing
+import random
+import sys
+import time
+import tracemalloc
+
+from benchmarks.upload import parse_list, percentile, save
+from panopto.session import PanoptoSessionManager
+from panopto.tests.soap_service import ROOT_FOLDER, Catalog, serve
+
+
+class LocalSessionManager(PanoptoSessionManager):
+
+    '''
+        A PanoptoSessionManager whose clients talk to a stand-in over
+        http, with a connection pool big enough for every thread.
+    '''
+
+    pool_size = 10
+
+    def _client(self, server, name, cache_dir):
+        import requests
+        from zeep import Client
+        from zeep.transports import Transport
+
+        from panopto.auth import _memoize
+
+        def client():
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(
+                pool_connections=1, pool_maxsize=self.pool_size)
+            session.mount('http://', adapter)
+            return Client(
+                'http://{}/Panopto/PublicAPI/4.6/{}.svc?wsdl'.format(
+                    server, name),
+                transport=Transport(session=session))
+
+        return _memoize(('benchmark', server, name, self.pool_size), client)
+
+
+def _serve(sessions, ports):
+    server = serve(Catalog(sessions))
+    ports.put(server.server_address[1])
+    server.serve_forever()
+
+
+class StandIn(object):
+
+    '''
+        Runs a stand-in SOAP service over a catalog of `sessions`
+        sessions in a child process.
+    '''
+
+    def __init__(self, sessions):
+        self.ports = multiprocessing.Queue()
+        self.process = multiprocessing.Process(
+            target=_serve, args=(sessions, self.ports), daemon=True)
+
+    def __enter__(self):
+        self.process.start()
+        self.address = '127.0.0.1:{}'.format(self.ports.get(timeout=300))
+        return self
+
+    def __exit__(self, *exc_info):
+        self.process.terminate()
+        self.process.join()
+
+
+def operations(sessions):
+    '''
+        The operations measured, as name to a function of a manager and
+        a random.Random, over a Catalog of `sessions` sessions. The
+        catalog is rebuilt here to pick real ids; it is deterministic.
+    '''
+    catalog = Catalog(sessions)
+    session_ids = list(catalog.sessions)
+    folder_ids = list(catalog.folders)
+    names = [(f['ParentFolder'], f['Name']) for f in catalog.folders.values()]
+    large = Catalog.folder_id(0)
+
+    return {
+        'get_session_list': lambda m, rng: m.get_session_list(
+            rng.choice(folder_ids[1:])),
+        'get_session_list (large)': lambda m, rng: m.get_session_list(large),
+        'get_folder': lambda m, rng: m.get_folder(*rng.choice(names)),
+        'get_session_url': lambda m, rng: m.get_session_url(
+            rng.choice(session_ids)),
+        'get_sessions_by_id (500)': lambda m, rng: m.get_sessions_by_id(
+            rng.sample(session_ids, min(500, len(session_ids)))),
+        'move_sessions (10)': lambda m, rng: m.move_sessions(
+            rng.sample(session_ids, 10), rng.choice(folder_ids)),
+    }
+
+
+def allocated(operation, manager):
+    '''
+        Peak bytes allocated by one call of operation.
+    '''
+    tracemalloc.start()
+    try:
+        operation(manager, random.Random(0))
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def measure(operation, manager, concurrency, calls):
+    def timed(seed):
+        rng = random.Random(seed)
+        started = time.perf_counter()
+        operation(manager, rng)
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        latencies = sorted(executor.map(timed, range(calls)))
+    seconds = time.perf_counter() - started
+
+    return {
+        'calls_per_second': calls / seconds,
+        'p50': percentile(latencies, 0.5),
+        'p90': percentile(latencies, 0.9),
+        'p99': percentile(latencies, 0.99),
+    }
+
+
+def report(result):
+    print('{:>7} x{:<3} {:<26} {:8.1f}/s  p50 {:7.4f}s  p90 {:7.4f}s  '
+          'p99 {:7.4f}s  {:8.1f} KiB'.format(
+              result['sessions'], result['concurrency'],
+              result['operation'], result['calls_per_second'],
+              result['p50'], result['p90'], result['p99'],
+              result['allocated'] / 1024))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sessions', type=parse_list,
+                        default=[1000, 10000, 50000])
+    parser.add_argument('--concurrency', type=parse_list, default=[1, 8, 32])
+    parser.add_argument('--calls', type=int, default=200)
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    LocalSessionManager.pool_size = max(args.concurrency)
+    results = []
+    for sessions in args.sessions:
+        with StandIn(sessions) as stand_in:
+            manager = LocalSessionManager(
+                stand_in.address, 'benchmark', password='benchmark')
+            # parse the WSDLs before anything is timed
+            manager.get_folder(ROOT_FOLDER, '')
+            manager.get_folder_access_details(ROOT_FOLDER)
+
+            for name, operation in operations(sessions).items():
+                memory = allocated(operation, manager)
+                for concurrency in args.concurrency:
+                    result = measure(
+                        operation, manager, concurrency, args.calls)
+                    result.update(sessions=sessions, operation=name,
+                                  concurrency=concurrency, allocated=memory)
+                    report(result)
+                    results.append(result)
+
+    if args.output:
+        save(results, args.output)
+    sys.exit(0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,25 @@
+'''
+    Serves the stand-in for Panopto's SOAP services in
+    panopto.tests.soap_service, for trying clients against by hand.
+
+    python -m benchmarks.soap_service [--sessions 10000] [--port 8000]
+'''
+import argparse
+
+from panopto.tests.soap_service import Catalog, serve
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sessions', type=int, default=10000)
+    parser.add_argument('--port', type=int, default=8000)
+    args = parser.parse_args()
+
+    server = serve(Catalog(args.sessions), args.port)
+    print('Serving {} sessions on {}:{}'.format(
+        args.sessions, *server.server_address))
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,212 @@
+'''
+    Measures the full PanoptoUpload workflow against a local stand-in
+    for Panopto's sessionUpload REST endpoints and S3 multipart API.
+
+    python -m benchmarks.upload [--sizes 1M,64M,1G] [--concurrency 1,4] \
+        [--chunk-size <bytes>] [--output results.json] \
+        [--compare baseline.json] [--tolerance 0.1]
+
+    Every upload runs in a new interpreter, so the peak RSS reported is
+    that upload's alone. Each part is mapped only while it is sent, so
+    peak RSS should not grow with the file size. Files are sparse, so the
+    benchmark measures the upload path rather than the disk. The
+    stand-in discards what it receives.
+
+    With --output, results are appended to a JSON file. With --compare,
+    they are checked against the last run saved in another, and the
+    benchmark exits with status 1 if throughput fell, or peak RSS rose,
+    by more than the tolerance.
+'''
+import argparse
+from datetime import datetime, timezone
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+import tempfile
+import time
+
+from panopto.tests.upload_service import StandIn
+
+
+UNITS = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+
+
+def parse_size(size):
+    m = re.match(r'^([0-9]+)([KMG]?)B?$', size.strip().upper())
+    if m is None:
+        raise argparse.ArgumentTypeError('bad size {}'.format(size))
+    return int(m.group(1)) * UNITS[m.group(2)]
+
+
+def parse_list(value, parse=int):
+    return [parse(item) for item in value.split(',')]
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(round(fraction * len(values))))]
+
+
+def peak_rss():
+    import resource
+
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+
+def upload(server, path, concurrency, chunk_size):
+    '''
+        Runs one upload in this process and returns its measurements.
+    '''
+    import requests
+
+    from panopto.progress import PanoptoUploadSummary
+    from panopto.upload import PanoptoUpload
+
+    class LocalSession(requests.Session):
+        # PanoptoUpload calls https:// URLs, the stand-in speaks http
+        def request(self, method, url, *args, **kwargs):
+            url = url.replace('https://', 'http://', 1)
+            return super().request(method, url, *args, **kwargs)
+
+    uploader = PanoptoUpload()
+    uploader.server = server
+    uploader.folder = 'benchmark'
+    uploader.input_file = path
+    uploader.chunk_size = chunk_size
+    uploader.max_concurrency = concurrency
+    uploader.session = LocalSession()
+    summary = PanoptoUploadSummary()
+    uploader.listeners.append(summary)
+
+    started = time.perf_counter()
+    uploader.create_session()
+    uploader.create_bucket()
+    uploader.upload_manifest()
+    uploader.upload_media()
+    uploader.complete_session()
+    seconds = time.perf_counter() - started
+
+    latencies = sorted(s for size, s in summary.parts.values())
+    return {
+        'seconds': seconds,
+        'stages': summary.stats()['stages'],
+        'throughput': summary.throughput(),
+        'parts': len(latencies),
+        'retries': uploader.retries,
+        'bytes_wasted': uploader.bytes_wasted,
+        'part_p50': percentile(latencies, 0.5),
+        'part_p90': percentile(latencies, 0.9),
+        'part_p99': percentile(latencies, 0.99),
+        'peak_rss': peak_rss(),
+    }
+
+
+def measure(server, size, concurrency, chunk_size):
+    with tempfile.NamedTemporaryFile(suffix='.mp4', delete=False) as f:
+        f.truncate(size)
+    try:
+        output = subprocess.check_output(
+            [sys.executable, '-m', 'benchmarks.upload', '--child',
+             server, f.name, str(concurrency), str(chunk_size or 0)])
+    finally:
+        os.remove(f.name)
+
+    result = json.loads(output)
+    result.update(size=size, concurrency=concurrency, chunk_size=chunk_size)
+    return result
+
+
+def key(result):
+    return (result['size'], result['concurrency'], result['chunk_size'])
+
+
+def report(result):
+    print('{:>6} MiB x{:<3} {:8.1f} MB/s  part p50 {:6.3f}s  '
+          'p90 {:6.3f}s  p99 {:6.3f}s  rss {:6.1f} MiB'.format(
+              result['size'] // UNITS['M'], result['concurrency'],
+              result['throughput'] / 1e6, result['part_p50'],
+              result['part_p90'], result['part_p99'],
+              result['peak_rss'] / UNITS['M']))
+
+
+def compare(results, baseline_path, tolerance):
+    '''
+        Prints each result against the last saved run and returns the
+        number of regressions.
+    '''
+    with open(baseline_path) as f:
+        baseline = {key(r): r for r in json.load(f)[-1]['results']}
+
+    regressions = 0
+    for result in results:
+        before = baseline.get(key(result))
+        if before is None:
+            continue
+
+        throughput = result['throughput'] / before['throughput'] - 1
+        rss = result['peak_rss'] / before['peak_rss'] - 1
+        regressed = throughput < -tolerance or rss > tolerance
+        regressions += regressed
+        print('{:>6} MiB x{:<3} throughput {:+6.1%}  rss {:+6.1%}{}'.format(
+            result['size'] // UNITS['M'], result['concurrency'],
+            throughput, rss, '  REGRESSION' if regressed else ''))
+    return regressions
+
+
+def save(results, path):
+    runs = []
+    if os.path.exists(path):
+        with open(path) as f:
+            runs = json.load(f)
+
+    runs.append({
+        'date': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'results': results,
+    })
+    with open(path, 'w') as f:
+        json.dump(runs, f, indent=2)
+
+
+def main():
+    if sys.argv[1:2] == ['--child']:
+        server, path, concurrency, chunk_size = sys.argv[2:6]
+        print(json.dumps(upload(
+            server, path, int(concurrency), int(chunk_size) or None)))
+        return
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=lambda v: parse_list(v, parse_size),
+                        default=parse_list('1M,64M,1G', parse_size))
+    parser.add_argument('--concurrency', type=parse_list, default=[1, 4])
+    parser.add_argument('--chunk-size', type=parse_size)
+    parser.add_argument('--output')
+    parser.add_argument('--compare')
+    parser.add_argument('--tolerance', type=float, default=0.1)
+    args = parser.parse_args()
+
+    results = []
+    with StandIn() as stand_in:
+        for size in args.sizes:
+            for concurrency in args.concurrency:
+                result = measure(stand_in.address(), size, concurrency,
+                                 args.chunk_size)
+                report(result)
+                results.append(result)
+
+    regressions = 0
+    if args.compare:
+        regressions = compare(results, args.compare, args.tolerance)
+    if args.output:
+        save(results, args.output)
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
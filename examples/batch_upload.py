@@ -0,0 +1,70 @@
+import getopt
+import sys
+
+from panopto.batch import PanoptoUploadBatch
+
+
+def usage():
+    print('python examples.batch_upload '
+          '--server <panopto server> '
+          '--folder-id <panopto folder uuid> '
+          '--username <panopto username> '
+          '--password <panopto password> '
+          '--max-uploads <files uploaded at once> '
+          '<file> [<file> ...]')
+
+
+def main():
+
+    try:
+        opts, args = getopt.getopt(
+            sys.argv[1:],
+            "hs:f:u:p:m:",
+            ["help", "server=", "folder-id=", "username=", "password=",
+             "max-uploads="])
+    except getopt.GetoptError as err:
+        # print help information and exit
+        print(str(err))
+        usage()
+        sys.exit(2)
+
+    max_uploads = 4
+    for o, a in opts:
+        if o in ('-h', '--help'):
+            usage()
+            sys.exit()
+        elif o in ('-s', '--server'):
+            server = a
+        elif o in ('-f', '--folder-id'):
+            folder = a
+        elif o in ('-u', '--username'):
+            # A Panopto username with access to the selected folder
+            username = a
+        elif o in ('-p', '--password'):
+            # The password for the Panopto username
+            password = a
+        elif o in ('-m', '--max-uploads'):
+            max_uploads = int(a)
+        else:
+            assert False, 'unhandled option {}'.format(o)
+
+    batch = PanoptoUploadBatch(
+        server, username, password, max_uploads=max_uploads)
+    for input_file in args:
+        batch.add(input_file, folder)
+
+    print('Uploading {} files to {}/{}'.format(len(args), server, folder))
+    for job in batch.run():
+        if job.succeeded:
+            print('{}: upload {} in {:.1f}s'.format(
+                job.input_file, job.upload_id, job.seconds))
+        else:
+            print('{}: failed, {}'.format(job.input_file, job.error))
+
+    stats = batch.stats()
+    print('{} of {} uploaded, {:.1f} MB/s'.format(
+        stats['succeeded'], stats['jobs'], stats['throughput'] / 1e6))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,10 @@
 import getopt
 import sys
-import time
 
+from panopto.progress import PanoptoUploadSummary
+from panopto.throttle import PanoptoBandwidthLimiter
 from panopto.upload import PanoptoUpload, PanoptoUploadStatus
+from panopto.watch import PanoptoUploadWatcher
 
 
 def getopts(argv):
@@ -22,7 +24,8 @@ def usage():
           '--password <panopto username> '
           '--instance-name <panopto instance name> '
           '--application-key <panopto application key>'
-          '--input-file <full upload path>')
+          '--input-file <full upload path> '
+          '[--max-rate <MB/s>]')
 
 
 def main():
@@ -30,9 +33,10 @@ def main():
     try:
         opts, args = getopt.getopt(
             sys.argv[1:],
-            "hs:f:u:p:i:a:l:",
+            "hs:f:u:p:i:a:l:r:",
             ["help", "server=", "folder-id=", "username=", "password=",
-             "instance-name=", "application-key=", "input-file="])
+             "instance-name=", "application-key=", "input-file=",
+             "max-rate="])
     except getopt.GetoptError as err:
         # print help information and exit:
         print(str(err))  # will print something like "option -a not recognized"
@@ -40,6 +44,8 @@ def main():
         sys.exit(2)
 
     uploader = PanoptoUpload()
+    summary = PanoptoUploadSummary()
+    uploader.listeners.append(summary)
 
     for o, a in opts:
         if o in ('-h', '--help'):
@@ -61,6 +67,10 @@ def main():
             uploader.instance_name = a
         elif o in ('-l', '--input-file'):
             uploader.input_file = a
+        elif o in ('-r', '--max-rate'):
+            # Leave the rest of the uplink to everyone else
+            uploader.bandwidth_limiter = PanoptoBandwidthLimiter(
+                rate=float(a) * 1e6)
         else:
             assert False, 'unhandled option'
 
@@ -85,25 +95,23 @@ def main():
 
     uploader.complete_session()
     print("Panopto upload complete")
+    for stage, seconds in summary.stats()['stages'].items():
+        print('{}: {:.1f}s'.format(stage, seconds))
+    print('{:.1f} MB/s'.format(summary.throughput() / 1e6))
 
     # Check the status of the upload
-    upload_status = PanoptoUploadStatus()
-    upload_status.server = uploader.server
-    upload_status.username = uploader.username
-    upload_status.password = uploader.password
-    upload_status.upload_id = uploader.get_upload_id()
-    while True:
-        (state, panopto_id) = upload_status.check()
+    def on_change(upload_id, previous, state, panopto_id):
         if state in PanoptoUploadStatus.UPLOAD_STATES.keys():
             print('state: {}, sessionId: {}'.format(
                 PanoptoUploadStatus.UPLOAD_STATES[state], panopto_id))
         else:
             print('unknown state: {}'.format(state))
 
-        if state >= PanoptoUploadStatus.UPLOAD_READY:  # complete
-            break
-
-        time.sleep(5)
+    watcher = PanoptoUploadWatcher(
+        uploader.server, uploader.username, uploader.password,
+        on_change=on_change)
+    watcher.add(uploader.get_upload_id())
+    watcher.run()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,3 @@
+# zeep, boto3, botocore, lxml and requests are imported by the functions
+# that use them, so that importing any panopto module stays cheap.
+# panopto/tests/test_imports.py holds every module to it.
@@ -0,0 +1,341 @@
+import asyncio
+import threading
+
+from panopto.auth import PanoptoAuth, _fault, service_document
+from panopto.session import (
+    PanoptoFolderIndex, PanoptoSessionManager, _batches,
+    _cache_lookup, _cache_scope, _cache_update, _folder_list_request,
+    _guids, _parse_creator_groups, _parse_folder_id, _parse_folder_page,
+    _parse_session_field, _parse_session_page, _parse_sessions,
+    _plan_access_sync, _record_grants, _session_key, _session_list_request)
+
+
+class AsyncPanoptoSessionManager(object):
+    '''
+        An asyncio PanoptoSessionManager. Methods match the synchronous
+        manager's and return the same data, but are coroutines.
+
+        Calls go through zeep's AsyncClient over a single httpx
+        connection pool, so any number of concurrent calls share at most
+        max_connections connections. WSDLs are parsed once per process,
+        as for PanoptoSessionManager. Requires httpx, installed with
+        `pip install pypanopto[async]`.
+
+        async with AsyncPanoptoSessionManager(
+                server, username, password=password) as manager:
+            urls = await asyncio.gather(
+                *[manager.get_session_url(id) for id in session_ids])
+    '''
+
+    SERVICES = PanoptoSessionManager.SERVICES
+
+    def __init__(self, server, username,
+                 instance_name=None, application_key=None,
+                 password=None, cache_dir=None,
+                 max_connections=20, timeout=300, session_cache=None,
+                 folder_index=None, metrics=None):
+        # zeep AsyncClients by SERVICES key, built on first use
+        self.client = {}
+        self.auth_info = PanoptoAuth.auth_info(
+            server, username, instance_name, application_key, password)
+        self._cache_scope = _cache_scope(server, self.auth_info)
+
+        self.server = server
+        self.username = username
+        self.instance_name = instance_name
+        self.application_key = application_key
+        self.password = password
+        self.cache_dir = cache_dir
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.session_cache = session_cache
+        self.folder_index = folder_index
+        self.metrics = metrics
+        self._http = None
+        self._http_lock = threading.Lock()
+
+    def _http_client(self):
+        import httpx
+
+        with self._http_lock:
+            if self._http is None:
+                # callers wait for a free connection rather than time out
+                self._http = httpx.AsyncClient(
+                    limits=httpx.Limits(
+                        max_connections=self.max_connections,
+                        max_keepalive_connections=self.max_connections),
+                    timeout=httpx.Timeout(self.timeout, pool=None))
+            return self._http
+
+    def _client(self, key):
+        '''
+            Builds the AsyncClient for a SERVICES key. Downloading and
+            parsing the WSDL, and the transport's TLS setup, block, so
+            this runs in an executor.
+        '''
+        from zeep import AsyncClient
+        from zeep.transports import AsyncTransport
+
+        document = service_document(
+            self.server, self.SERVICES[key], self.cache_dir)
+        transport = AsyncTransport(client=self._http_client())
+        if self.metrics is None:
+            return AsyncClient(document, transport=transport)
+
+        client = AsyncClient(document, transport=transport,
+                             plugins=[self.metrics.plugin()])
+        return self.metrics.wrap(client, asynchronous=True)
+
+    async def _service(self, key):
+        '''
+            The service of the client for a SERVICES key, built on the
+            loop's default executor the first time it is asked for.
+        '''
+        if key not in self.client:
+            loop = asyncio.get_running_loop()
+            client = await loop.run_in_executor(None, self._client, key)
+            if self.client.setdefault(key, client) is not client:
+                # another call built it first
+                client.transport.wsdl_client.close()
+        return self.client[key].service
+
+    async def close(self):
+        for client in self.client.values():
+            client.transport.wsdl_client.close()
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def add_folder(self, name, parent_guid):
+        try:
+            service = await self._service('session')
+            response = await service.AddFolder(
+                auth=self.auth_info, name=name, parentFolder=parent_guid,
+                isPublic=False)
+            folder_id = _parse_folder_id(response)
+        except _fault():
+            return ''
+
+        if folder_id and self.folder_index is not None:
+            self.folder_index.add(
+                parent_guid, {'Id': folder_id, 'Name': name},
+                self._cache_scope)
+        return folder_id
+
+    async def _creator_folders(self, parent_guid, page_size=100):
+        folders, page = [], 0
+        try:
+            while True:
+                service = await self._service('session')
+                response = await service.GetCreatorFoldersList(
+                    auth=self.auth_info,
+                    request=_folder_list_request(parent_guid, page, page_size))
+                results, total = _parse_folder_page(response)
+                folders.extend(results)
+                if len(results) < page_size or len(folders) >= total:
+                    return folders
+                page += 1
+        except (_fault(), TypeError):
+            return None
+
+    async def get_folder(self, parent_guid, name):
+        index = self.folder_index
+        if index is None:
+            index = PanoptoFolderIndex()
+
+        folder_id = index.get(parent_guid, name, self._cache_scope)
+        if folder_id is None and index.stale(parent_guid, self._cache_scope):
+            folders = await self._creator_folders(parent_guid)
+            if folders is None:
+                return ''
+            index.load(parent_guid, folders, self._cache_scope)
+            folder_id = index.get(parent_guid, name, self._cache_scope)
+        return folder_id or ''
+
+    async def get_folder_access_details(self, folder_id):
+        try:
+            service = await self._service('access')
+            response = await service.GetFolderAccessDetails(
+                auth=self.auth_info, folderId=folder_id)
+            return _parse_creator_groups(response)
+        except (_fault(), TypeError):
+            return ''
+
+    async def grant_group_access_to_folder(self, folder_id, group_id):
+        try:
+            service = await self._service('access')
+            await service.GrantGroupAccessToFolder(
+                auth=self.auth_info, folderId=folder_id, groupId=group_id)
+            return True
+        except _fault():
+            return False
+
+    async def inherit_folder_access(self, from_folder_id, to_folder_id):
+        reports = await self.sync_folder_access(
+            [(from_folder_id, to_folder_id)])
+        return reports[0]
+
+    async def sync_folder_access(self, pairs, max_concurrency=8):
+        '''
+            Gives each target folder the creator groups of its source,
+            as PanoptoSessionManager.sync_folder_access does.
+        '''
+        semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+        async def limited(coroutine):
+            async with semaphore:
+                return await coroutine
+
+        pairs = list(pairs)
+        folders = list(dict.fromkeys(f for pair in pairs for f in pair))
+        results = await asyncio.gather(
+            *[limited(self.get_folder_access_details(folder))
+              for folder in folders])
+        reports, grants = _plan_access_sync(pairs, dict(zip(folders, results)))
+        results = await asyncio.gather(
+            *[limited(self.grant_group_access_to_folder(*grant))
+              for grant in grants])
+        _record_grants(reports, grants, results)
+        return reports
+
+    async def get_session_url(self, session_id):
+        if self.session_cache is not None:
+            return await self._cached_field(session_id, 'MP4Url', '')
+
+        try:
+            service = await self._service('session')
+            response = await service.GetSessionsById(
+                auth=self.auth_info, sessionIds=_guids([session_id]))
+        except _fault():
+            return ''
+
+        return _parse_session_field(response, 'MP4Url', '')
+
+    async def get_thumb_url(self, session_id):
+        if self.session_cache is not None:
+            return await self._cached_field(session_id, 'ThumbUrl', None)
+
+        try:
+            service = await self._service('session')
+            response = await service.GetSessionsById(
+                auth=self.auth_info, sessionIds=_guids([session_id]))
+        except _fault():
+            return None
+
+        return _parse_session_field(response, 'ThumbUrl', None)
+
+    async def _sessions_by_id(self, session_ids, semaphore):
+        async with semaphore:
+            try:
+                service = await self._service('session')
+                response = await service.GetSessionsById(
+                    auth=self.auth_info, sessionIds=_guids(session_ids))
+            except _fault():
+                return []
+
+        return _parse_sessions(response)
+
+    async def get_sessions_by_id(self, session_ids, batch_size=100,
+                                 max_concurrency=4):
+        '''
+            Returns a dict of session id to the full session record, as
+            PanoptoSessionManager.get_sessions_by_id does.
+        '''
+        found, session_ids = _cache_lookup(
+            self.session_cache, self._cache_scope, session_ids)
+        semaphore = asyncio.Semaphore(max(1, max_concurrency))
+        results = await asyncio.gather(
+            *[self._sessions_by_id(batch, semaphore)
+              for batch in _batches(session_ids, batch_size)])
+        return _cache_update(
+            self.session_cache, self._cache_scope, found, results)
+
+    async def _cached_field(self, session_id, field, default):
+        sessions = await self.get_sessions_by_id([session_id])
+        session = sessions.get(_session_key(session_id))
+        return session[field] if session else default
+
+    async def get_session_urls(self, session_ids, **kwargs):
+        sessions = await self.get_sessions_by_id(session_ids, **kwargs)
+        return {id: session['MP4Url'] for id, session in sessions.items()}
+
+    async def get_thumb_urls(self, session_ids, **kwargs):
+        sessions = await self.get_sessions_by_id(session_ids, **kwargs)
+        return {id: session['ThumbUrl'] for id, session in sessions.items()}
+
+    async def _session_page(self, folder, page, page_size, sort_by,
+                            sort_increasing):
+        request = _session_list_request(
+            folder, page, page_size, sort_by, sort_increasing)
+        try:
+            service = await self._service('session')
+            response = await service.GetSessionsList(
+                auth=self.auth_info, request=request, searchQuery=None)
+        except _fault():
+            # a later page failing would silently cut the list short
+            if page:
+                raise
+            return ([], 0)
+
+        return _parse_session_page(response)
+
+    async def iter_session_list(self, folder, page_size=100, sort_by=None,
+                                sort_increasing=True, prefetch=True):
+        '''
+            Asynchronously yields every session in folder, as
+            PanoptoSessionManager.iter_session_list does.
+        '''
+        def request(page):
+            coroutine = self._session_page(
+                folder, page, page_size, sort_by, sort_increasing)
+            return asyncio.ensure_future(coroutine) if prefetch else coroutine
+
+        page, seen = 0, 0
+        next_page = request(page)
+        try:
+            while True:
+                sessions, total = await next_page
+                seen += len(sessions)
+                more = len(sessions) == page_size and seen < total
+                if more:
+                    page += 1
+                    next_page = request(page)
+
+                for session in sessions:
+                    yield session
+                if not more:
+                    return
+        finally:
+            if asyncio.isfuture(next_page):
+                next_page.cancel()
+            else:
+                next_page.close()
+
+    async def get_session_list(self, folder):
+        return [session async for session in self.iter_session_list(folder)]
+
+    async def move_sessions(self, session_ids, folder):
+        if self.session_cache is not None:
+            self.session_cache.invalidate(session_ids)
+
+        try:
+            service = await self._service('session')
+            await service.MoveSessions(
+                auth=self.auth_info, sessionIds=_guids(session_ids),
+                folderId=folder)
+        except _fault():
+            return False
+        finally:
+            # a lookup during the move may have cached the old folder
+            if self.session_cache is not None:
+                self.session_cache.invalidate(session_ids)
+
+        # This api does not return a response. If no exception is thrown
+        # assuming everything was completed successfully
+        return True
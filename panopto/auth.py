@@ -1,7 +1,93 @@
 import hashlib
+import hmac
+import os
+import threading
 
-from zeep import Client
-from zeep.exceptions import Fault
+
+_memo = {}
+_memo_locks = {}
+_memo_lock = threading.Lock()
+
+
+def _memoize(key, factory):
+    '''
+        Process-wide memo. Concurrent callers for the same key wait for
+        a single factory() call rather than each building the value.
+    '''
+    try:
+        return _memo[key]
+    except KeyError:
+        pass
+
+    with _memo_lock:
+        lock = _memo_locks.setdefault(key, threading.Lock())
+    with lock:
+        if key not in _memo:
+            _memo[key] = factory()
+    return _memo[key]
+
+
+def _fault():
+    '''
+        zeep's Fault, for except clauses. Those are only evaluated once
+        an exception is raised, so zeep is still imported on first use.
+    '''
+    from zeep.exceptions import Fault
+    return Fault
+
+
+def wsdl_url(server, name):
+    return 'https://{}/Panopto/PublicAPI/4.6/{}.svc?wsdl'.format(
+        server, name)
+
+
+def _transport(cache_dir=None):
+    from zeep.cache import SqliteCache
+    from zeep.transports import Transport
+
+    if cache_dir:
+        return Transport(cache=SqliteCache(path=cache_dir), timeout=1440)
+    return Transport()
+
+
+def _load_document(server, name, cache_dir):
+    from zeep.wsdl import Document
+
+    url = wsdl_url(server, name)
+    if not cache_dir:
+        return Document(url, _transport())
+
+    # the parsed document is pickled into a private directory named
+    # after the sqlite cache file
+    from panopto.wsdl_cache import load_document
+    return load_document(
+        url, _transport(cache_dir),
+        '{}.wsdl'.format(os.path.abspath(cache_dir)))
+
+
+def service_document(server, name, cache_dir=None):
+    '''
+        The parsed WSDL of a Panopto service, downloaded and parsed
+        once per process for each (server, service, cache_dir). With a
+        cache_dir, the parse is also kept on disk for later processes.
+    '''
+    return _memoize(
+        ('document', server, name, cache_dir),
+        lambda: _load_document(server, name, cache_dir))
+
+
+def service_client(server, name, cache_dir=None):
+    '''
+        A zeep Client for a Panopto service, shared process-wide. Only
+        use it for calls that carry their own AuthenticationInfo, as its
+        transport session is shared by every caller.
+    '''
+    from zeep import Client
+
+    return _memoize(
+        ('client', server, name, cache_dir),
+        lambda: Client(service_document(server, name, cache_dir),
+                       transport=_transport(cache_dir)))
 
 
 class PanoptoAuth(object):
@@ -20,14 +106,19 @@ class PanoptoAuth(object):
         https://support.panopto.com/articles/Documentation/api-0
     '''
 
-    def __init__(self, server):
+    def __init__(self, server, cache_dir=None):
         self.server = server
+        self.cache_dir = cache_dir
         self.client = self._client('Auth')
 
     def _client(self, name):
-        url = 'https://{}/Panopto/PublicAPI/4.6/{}.svc?wsdl'.format(
-            self.server, name)
-        return Client(url)
+        from zeep import Client
+        from zeep.transports import Transport
+
+        # each instance logs in on its own transport session, only the
+        # parsed WSDL is shared
+        return Client(service_document(self.server, name, self.cache_dir),
+                      transport=Transport())
 
     @classmethod
     def _auth_code(cls, server, user_key, application_key):
@@ -71,14 +162,13 @@ class PanoptoAuth(object):
             # return the underlying request object
             # @todo - does it make more sense to return the auth cookie?
             return self.client.transport.session
-        except (Fault, AttributeError):
+        except (_fault(), AttributeError):
             pass
 
         return None
 
     def authenticate_with_application_key(
             self, username, instance_name, application_key):
-
         try:
             user_key = self.user_key(username, instance_name)
             auth_code = self._auth_code(
@@ -89,7 +179,103 @@ class PanoptoAuth(object):
             # return the underlying request object
             # @todo - does it make more sense to return the auth cookie?
             return self.client.transport.session
-        except (Fault, AttributeError):
+        except (_fault(), AttributeError):
             pass
 
         return None
+
+
+class PanoptoSessionPool(object):
+    '''
+        A process-wide cache of requests.Sessions authenticated through
+        LogOnWithPassword, keyed by (server, username). A salted hash of
+        the password a session was opened with is kept beside it, and a
+        caller giving any other password logs in again rather than
+        being handed that session.
+
+        A cached session is handed out until one of its cookies expires
+        or a caller reports it was rejected with renew(). Logins for a
+        key are serialized, so however many threads find the same
+        session rejected at once, only one of them logs in again.
+    '''
+
+    class _Entry(object):
+        def __init__(self):
+            self.lock = threading.Lock()
+            self.session = None
+            self.digest = b''
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._salt = os.urandom(16)
+
+    def _digest(self, password) -> bytes:
+        return hashlib.sha256(
+            self._salt + (password or '').encode('utf-8')).digest()
+
+    def _entry(self, server, username):
+        with self._lock:
+            return self._entries.setdefault(
+                (server, username), self._Entry())
+
+    def _login(self, server, username, password):
+        auth = PanoptoAuth(server)
+        return auth.authenticate_with_password(username, password)
+
+    @classmethod
+    def _expired(cls, session) -> bool:
+        cookies = list(session.cookies)
+        return not cookies or any(
+            cookie.is_expired() for cookie in cookies)
+
+    def get(self, server, username, password):
+        '''
+            Returns an authenticated requests.Session, logging in if
+            there is none or its cookies have expired. Returns None if
+            the login fails.
+        '''
+        entry = self._entry(server, username)
+        digest = self._digest(password)
+        with entry.lock:
+            if (entry.session is None or self._expired(entry.session) or
+                    not hmac.compare_digest(entry.digest, digest)):
+                entry.session = self._login(server, username, password)
+                entry.digest = digest
+            return entry.session
+
+    def renew(self, server, username, password, session):
+        '''
+            Report that `session` was rejected and return its
+            replacement. If another caller has already replaced it, the
+            replacement is returned without logging in again.
+        '''
+        entry = self._entry(server, username)
+        with entry.lock:
+            if entry.session is session:
+                entry.session = None
+        return self.get(server, username, password)
+
+    def request(self, server, username, password, method, url, **kwargs):
+        '''
+            Make a request on the pooled session, logging in again and
+            retrying once if it is refused with a 401 or 403. Returns
+            None if no session could be authenticated.
+        '''
+        session = self.get(server, username, password)
+        if session is None:
+            return None
+
+        response = session.request(method, url, **kwargs)
+        if response.status_code in (401, 403):
+            session = self.renew(server, username, password, session)
+            if session is not None:
+                response = session.request(method, url, **kwargs)
+        return response
+
+    def clear(self):
+        with self._lock:
+            self._entries = {}
+
+
+session_pool = PanoptoSessionPool()
@@ -0,0 +1,150 @@
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+
+from panopto.auth import session_pool
+from panopto.upload import PanoptoUpload
+
+
+class PanoptoUploadJob(object):
+
+    '''
+        One file in a PanoptoUploadBatch, and the result of uploading it.
+        input_file accepts anything PanoptoUpload.input_file does.
+    '''
+
+    def __init__(self, input_file, folder, title=None, description=None):
+        self.input_file = input_file
+        self.folder = folder
+        self.title = title
+        self.description = description
+
+        self.succeeded = False
+        self.upload_id = None
+        self.error = None
+        self.bytes_uploaded = 0
+        self.seconds = None
+
+    def throughput(self) -> float:
+        if not self.seconds:
+            return 0.0
+        return self.bytes_uploaded / self.seconds
+
+
+class PanoptoUploadBatch(object):
+
+    '''
+        Upload many files concurrently to the same Panopto server.
+
+        The batch authenticates once, and all uploads share that
+        requests.Session, one S3 client per upload host and a single
+        executor for media parts. Up to max_uploads files are in flight
+        at once, each sending up to max_concurrency parts at a time.
+
+        batch = PanoptoUploadBatch(server, username, password)
+        batch.add('/path/to/lecture.mp4', folder_id, 'Lecture 1')
+        batch.run()
+        for job in batch.jobs:
+            print(job.input_file, job.succeeded, job.error)
+    '''
+
+    def __init__(self, server, username, password,
+                 max_uploads=4, max_concurrency=4):
+        self.server = server
+        self.username = username
+        self.password = password
+        self.max_uploads = max_uploads
+        self.max_concurrency = max_concurrency
+
+        self.jobs = []
+        self.session = None
+        self.seconds = None
+        self._s3 = {}
+        self._lock = threading.Lock()
+
+    def add(self, input_file, folder, title=None,
+            description=None) -> PanoptoUploadJob:
+        job = PanoptoUploadJob(input_file, folder, title, description)
+        self.jobs.append(job)
+        return job
+
+    def authenticate(self) -> bool:
+        if self.session is None:
+            self.session = session_pool.get(
+                self.server, self.username, self.password)
+        return self.session is not None
+
+    def _s3_client(self, uploader):
+        host = uploader.target.host()
+        with self._lock:
+            if host not in self._s3:
+                uploader.create_bucket()
+                self._s3[host] = uploader.s3
+            return self._s3[host]
+
+    def _upload(self, job, executor):
+        uploader = PanoptoUpload()
+        uploader.server = self.server
+        uploader.folder = job.folder
+        uploader.input_file = job.input_file
+        uploader.title = job.title
+        uploader.description = job.description
+        uploader.username = self.username
+        uploader.password = self.password
+        uploader.session = self.session
+        uploader.max_concurrency = self.max_concurrency
+        uploader.executor = executor
+
+        started = time.monotonic()
+        try:
+            if not uploader.create_session():
+                job.error = 'Failed to create a session'
+                return
+
+            job.upload_id = uploader.get_upload_id()
+            uploader.s3 = self._s3_client(uploader)
+            uploader.upload_manifest()
+            uploader.upload_media()
+
+            if uploader.complete_session():
+                job.succeeded = True
+            else:
+                job.error = 'Failed to complete the session'
+        except Exception as e:
+            # report the failure against this job, the rest carry on
+            job.error = '{}: {}'.format(type(e).__name__, e)
+        finally:
+            job.bytes_uploaded = uploader.bytes_uploaded
+            job.seconds = time.monotonic() - started
+
+    def run(self) -> list[PanoptoUploadJob]:
+        started = time.monotonic()
+        if not self.authenticate():
+            for job in self.jobs:
+                job.error = 'Failed to authenticate'
+            return self.jobs
+
+        part_workers = max(1, self.max_uploads * self.max_concurrency)
+        with ThreadPoolExecutor(max_workers=part_workers) as parts, \
+                ThreadPoolExecutor(max_workers=self.max_uploads) as uploads:
+            for job in self.jobs:
+                uploads.submit(self._upload, job, parts)
+
+        self.seconds = time.monotonic() - started
+        return self.jobs
+
+    def stats(self) -> dict:
+        '''
+            Aggregate results of the last run. throughput is the bytes
+            uploaded by all jobs over the wall-clock time of the batch.
+        '''
+        uploaded = sum(job.bytes_uploaded for job in self.jobs)
+        succeeded = len([job for job in self.jobs if job.succeeded])
+        return {
+            'jobs': len(self.jobs),
+            'succeeded': succeeded,
+            'failed': len(self.jobs) - succeeded,
+            'bytes_uploaded': uploaded,
+            'seconds': self.seconds,
+            'throughput': uploaded / self.seconds if self.seconds else 0.0,
+        }
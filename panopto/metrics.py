@@ -0,0 +1,239 @@
+import threading
+import time
+
+
+# upper bounds, in seconds, of the latency histogram buckets
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+class _Operation(object):
+
+    def __init__(self, buckets):
+        self.calls = 0
+        self.faults = 0
+        self.errors = 0
+        self.seconds = 0.0
+        self.buckets = [0] * (buckets + 1)
+        self.responses = 0
+        self.response_bytes = 0
+
+
+class PanoptoMetrics(object):
+
+    '''
+        Counts the SOAP calls made by session managers created with
+        metrics=PanoptoMetrics(). For each operation it records calls,
+        a latency histogram, Faults, other errors and the size of
+        response payloads. Managers without metrics use the shared zeep
+        clients directly and pay nothing.
+
+        metrics = PanoptoMetrics()
+        manager = PanoptoSessionManager(
+            server, username, password=password, metrics=metrics)
+        ...
+        metrics.snapshot()['GetSessionsById']['calls']
+        print(metrics.prometheus())
+    '''
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._operations = {}
+        self._lock = threading.Lock()
+
+    def _operation(self, name):
+        operation = self._operations.get(name)
+        if operation is None:
+            operation = self._operations.setdefault(
+                name, _Operation(len(self.buckets)))
+        return operation
+
+    def observe(self, name, seconds, fault=False, error=False):
+        bucket = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                bucket = i
+                break
+
+        with self._lock:
+            operation = self._operation(name)
+            operation.calls += 1
+            operation.faults += fault
+            operation.errors += error
+            operation.seconds += seconds
+            operation.buckets[bucket] += 1
+
+    def observe_response(self, name, size):
+        with self._lock:
+            operation = self._operation(name)
+            operation.responses += 1
+            operation.response_bytes += size
+
+    def reset(self):
+        with self._lock:
+            self._operations = {}
+
+    def snapshot(self) -> dict:
+        '''
+            A dict of operation name to its counters. latency maps each
+            bucket's upper bound, and 'inf', to the calls that took at
+            most that long.
+        '''
+        snapshot = {}
+        with self._lock:
+            for name, operation in self._operations.items():
+                cumulative, latency = 0, {}
+                bounds = self.buckets + ('inf',)
+                for bound, count in zip(bounds, operation.buckets):
+                    cumulative += count
+                    latency[bound] = cumulative
+                snapshot[name] = {
+                    'calls': operation.calls,
+                    'faults': operation.faults,
+                    'errors': operation.errors,
+                    'seconds': operation.seconds,
+                    'latency': latency,
+                    'responses': operation.responses,
+                    'response_bytes': operation.response_bytes,
+                }
+        return snapshot
+
+    def prometheus(self, prefix='panopto_soap') -> str:
+        '''
+            The snapshot in the Prometheus text exposition format.
+        '''
+        snapshot = self.snapshot()
+        lines = []
+
+        def family(name, kind, help):
+            lines.append('# HELP {}_{} {}'.format(prefix, name, help))
+            lines.append('# TYPE {}_{} {}'.format(prefix, name, kind))
+
+        def sample(name, operation, value, le=None):
+            labels = 'operation="{}"'.format(operation)
+            if le is not None:
+                labels += ',le="{}"'.format(le)
+            lines.append('{}_{}{{{}}} {}'.format(prefix, name, labels, value))
+
+        for name, key, help in (
+                ('calls_total', 'calls', 'SOAP calls made.'),
+                ('faults_total', 'faults',
+                 'SOAP calls that returned a Fault.'),
+                ('errors_total', 'errors',
+                 'SOAP calls that failed without a Fault.')):
+            family(name, 'counter', help)
+            for operation, counters in sorted(snapshot.items()):
+                sample(name, operation, counters[key])
+
+        family('call_seconds', 'histogram', 'SOAP call latency.')
+        for operation, counters in sorted(snapshot.items()):
+            for bound, count in counters['latency'].items():
+                le = '+Inf' if bound == 'inf' else bound
+                sample('call_seconds_bucket', operation, count, le)
+            sample('call_seconds_sum', operation, counters['seconds'])
+            sample('call_seconds_count', operation, counters['calls'])
+
+        family('response_bytes', 'summary', 'SOAP response payload size.')
+        for operation, counters in sorted(snapshot.items()):
+            sample('response_bytes_sum', operation,
+                   counters['response_bytes'])
+            sample('response_bytes_count', operation, counters['responses'])
+
+        return '\n'.join(lines) + '\n'
+
+    def plugin(self):
+        return _ResponseSizePlugin(self)
+
+    def wrap(self, client, asynchronous=False):
+        '''
+            Returns client with its service calls timed and counted.
+        '''
+        return _MeteredClient(client, self, asynchronous)
+
+
+class _ResponseSizePlugin(object):
+
+    '''
+        A zeep plugin recording the size of each response envelope.
+    '''
+
+    def __init__(self, metrics):
+        self.metrics = metrics
+
+    def egress(self, envelope, http_headers, operation, binding_options):
+        return envelope, http_headers
+
+    def ingress(self, envelope, http_headers, operation):
+        size = (http_headers or {}).get('Content-Length')
+        if size is None:
+            from lxml import etree
+            size = len(etree.tostring(envelope))
+        self.metrics.observe_response(operation.name, int(size))
+        return envelope, http_headers
+
+
+class _MeteredClient(object):
+
+    def __init__(self, client, metrics, asynchronous):
+        self._client = client
+        self.service = _MeteredService(client.service, metrics, asynchronous)
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+class _MeteredService(object):
+
+    def __init__(self, service, metrics, asynchronous):
+        from zeep.exceptions import Fault
+
+        self._service = service
+        self._metrics = metrics
+        self._asynchronous = asynchronous
+        self._fault = Fault
+
+    def _observe(self, operation, started, error):
+        self._metrics.observe(
+            operation, time.monotonic() - started,
+            fault=isinstance(error, self._fault),
+            error=error is not None and not isinstance(error, self._fault))
+
+    def __getattr__(self, operation):
+        call = getattr(self._service, operation)
+
+        def metered(*args, **kwargs):
+            started, error = time.monotonic(), None
+            try:
+                return call(*args, **kwargs)
+            except Exception as e:
+                error = e
+                raise
+            finally:
+                self._observe(operation, started, error)
+
+        async def metered_async(*args, **kwargs):
+            started, error = time.monotonic(), None
+            try:
+                return await call(*args, **kwargs)
+            except Exception as e:
+                error = e
+                raise
+            finally:
+                self._observe(operation, started, error)
+
+        return metered_async if self._asynchronous else metered
+
+
+def metered_service_client(server, name, cache_dir, metrics):
+    '''
+        A zeep Client for a Panopto service reporting to metrics. Unlike
+        service_client it is not shared, but it is built over the same
+        parsed WSDL, so it is cheap to make.
+    '''
+    from zeep import Client
+
+    from panopto.auth import _transport, service_document
+
+    client = Client(service_document(server, name, cache_dir),
+                    transport=_transport(cache_dir),
+                    plugins=[metrics.plugin()])
+    return metrics.wrap(client)
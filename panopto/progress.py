@@ -0,0 +1,162 @@
+from collections import deque
+import threading
+import time
+
+
+class PanoptoUploadListener(object):
+
+    '''
+        Receives progress from a PanoptoUpload it is added to with
+        upload.listeners.append(listener). Override the events of
+        interest, the rest do nothing.
+
+        Stages are the upload's workflow methods: create_session,
+        create_bucket, upload_manifest, upload_media and
+        complete_session. Media parts are reported from the threads that
+        send them, so listeners used with max_concurrency above 1, or
+        with several files, must be thread-safe. The parts of each file
+        of a multi-stream session are reported with a copy of the upload
+        whose media_file is that file.
+    '''
+
+    def stage_started(self, upload, stage):
+        pass
+
+    def stage_finished(self, upload, stage, seconds, error):
+        '''
+            error is the exception the stage raised, or None.
+        '''
+        pass
+
+    def part_started(self, upload, part_number, size):
+        pass
+
+    def part_finished(self, upload, part_number, size, seconds):
+        pass
+
+    def part_retried(self, upload, part_number, attempt, error, delay):
+        '''
+            A part failed with error and is sent again, for the attempt
+            time, after delay seconds. part_number is None when it is
+            the call starting, listing or completing the upload that is
+            repeated.
+        '''
+        pass
+
+
+def _part(upload, part_number):
+    # each file of a multi-stream session numbers its parts from 1
+    media_file = getattr(upload, 'media_file', None)
+    if media_file is None:
+        return part_number
+    return (media_file.dest_filename, part_number)
+
+
+class PanoptoUploadSummary(PanoptoUploadListener):
+
+    '''
+        Collects the stage timings and part statistics of an upload.
+
+        summary = PanoptoUploadSummary()
+        uploader.listeners.append(summary)
+        ...
+        print(summary.stats())
+
+        rolling_throughput() is the rate over parts finished in the
+        last window seconds, and parts_in_flight() tells a slow link,
+        where parts keep finishing, from a part that is stuck. Parts of
+        a multi-stream session are keyed by (dest_filename, number).
+    '''
+
+    def __init__(self, window=10):
+        self.window = window
+
+        self.stages = {}
+        self.errors = {}
+        self.parts = {}
+        self.bytes_sent = 0
+        self.retries = 0
+        self._started = {}
+        self._in_flight = {}
+        self._recent = deque()
+        self._lock = threading.Lock()
+
+    def stage_started(self, upload, stage):
+        with self._lock:
+            self._started[stage] = time.monotonic()
+
+    def stage_finished(self, upload, stage, seconds, error):
+        with self._lock:
+            self.stages[stage] = seconds
+            if error is not None:
+                self.errors[stage] = error
+
+    def part_started(self, upload, part_number, size):
+        with self._lock:
+            self._in_flight[_part(upload, part_number)] = time.monotonic()
+
+    def part_finished(self, upload, part_number, size, seconds):
+        now = time.monotonic()
+        part = _part(upload, part_number)
+        with self._lock:
+            self._in_flight.pop(part, None)
+            self.parts[part] = (size, seconds)
+            self.bytes_sent += size
+            self._recent.append((now, size))
+            self._expire(now)
+
+    def part_retried(self, upload, part_number, attempt, error, delay):
+        with self._lock:
+            self.retries += 1
+
+    def _expire(self, now):
+        while self._recent and self._recent[0][0] < now - self.window:
+            self._recent.popleft()
+
+    def parts_in_flight(self) -> dict:
+        '''
+            The parts being sent, with the seconds each has taken so far.
+        '''
+        now = time.monotonic()
+        with self._lock:
+            return {number: now - started
+                    for number, started in self._in_flight.items()}
+
+    def rolling_throughput(self) -> float:
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            sent = sum(size for finished, size in self._recent)
+            started = self._started.get('upload_media', now)
+        elapsed = min(self.window, now - started)
+        return sent / elapsed if elapsed > 0 else 0.0
+
+    def throughput(self) -> float:
+        '''
+            Bytes sent over the time upload_media took, or has taken so
+            far.
+        '''
+        with self._lock:
+            seconds = self.stages.get('upload_media')
+            if seconds is None and 'upload_media' in self._started:
+                seconds = time.monotonic() - self._started['upload_media']
+            sent = self.bytes_sent
+        return sent / seconds if seconds else 0.0
+
+    def stats(self) -> dict:
+        with self._lock:
+            latencies = sorted(seconds for size, seconds
+                               in self.parts.values())
+            stats = {
+                'stages': dict(self.stages),
+                'errors': {stage: '{}: {}'.format(type(e).__name__, e)
+                           for stage, e in self.errors.items()},
+                'parts': len(self.parts),
+                'bytes_sent': self.bytes_sent,
+                'retries': self.retries,
+                'part_seconds_mean': (
+                    sum(latencies) / len(latencies) if latencies else 0.0),
+                'part_seconds_max': latencies[-1] if latencies else 0.0,
+            }
+        stats['throughput'] = self.throughput()
+        return stats
@@ -1,82 +1,292 @@
-from zeep.cache import SqliteCache
-from zeep.client import Client
-from zeep.exceptions import Fault
-from zeep.helpers import serialize_object
-from zeep.transports import Transport
+from collections import OrderedDict
+import functools
+import hashlib
+import threading
+import time
+import uuid
 
-from panopto.auth import PanoptoAuth
+from panopto.auth import PanoptoAuth, _fault, service_client
+
+
+class _ServiceClients(dict):
+    '''
+        Maps 'session', 'access' and 'user' to their zeep clients,
+        fetching each one the first time it is looked up.
+    '''
+
+    def __init__(self, factory):
+        super().__init__()
+        self.factory = factory
+
+    def __missing__(self, key):
+        client = self[key] = self.factory(key)
+        return client
+
+
+class PanoptoSessionCache(object):
+    '''
+        An in-process cache of GetSessionsById records, shared by any
+        number of session managers. Holds up to max_size sessions for
+        ttl seconds each, evicting the least recently used first.
+
+        Records are kept under a scope, which managers set to their
+        server, user key and credentials, so that a shared cache never
+        hands one user a record fetched for another. Session ids are
+        normalised to the lower case, hyphenated form Panopto returns.
+
+        cache = PanoptoSessionCache(max_size=5000, ttl=600)
+        manager = PanoptoSessionManager(
+            server, username, password=password, session_cache=cache)
+    '''
+
+    def __init__(self, max_size=1024, ttl=300):
+        self.max_size = max_size
+        self.ttl = ttl
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def lookup(self, session_ids, scope=None):
+        '''
+            Returns a dict of the sessions among session_ids cached for
+            scope and a list of the ids that need fetching.
+        '''
+        found, missing = {}, []
+        now = time.monotonic()
+        with self._lock:
+            for session_id in map(_session_key, session_ids):
+                key = (scope, session_id)
+                entry = self._sessions.get(key)
+                if entry is not None and entry[0] > now:
+                    self._sessions.move_to_end(key)
+                    found[session_id] = entry[1]
+                    self.hits += 1
+                    continue
+
+                if entry is not None:
+                    del self._sessions[key]
+                    self.evictions += 1
+                missing.append(session_id)
+                self.misses += 1
+        return found, missing
+
+    def update(self, sessions, scope=None):
+        expires = time.monotonic() + self.ttl
+        with self._lock:
+            for session_id, session in sessions.items():
+                key = (scope, _session_key(session_id))
+                self._sessions[key] = (expires, session)
+                self._sessions.move_to_end(key)
+            while len(self._sessions) > self.max_size:
+                self._sessions.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, session_ids):
+        '''
+            Drops session_ids from every scope.
+        '''
+        session_ids = set(map(_session_key, session_ids))
+        with self._lock:
+            for key in [key for key in self._sessions
+                        if key[1] in session_ids]:
+                del self._sessions[key]
+
+    def clear(self):
+        with self._lock:
+            self._sessions.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'size': len(self._sessions),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+
+class PanoptoFolderIndex(object):
+    '''
+        Creator folders by parent and name, so that get_folder answers
+        from memory. A parent's folders are listed in full the first
+        time one of them is looked up, and listed again when a name is
+        not found and the listing is more than max_age seconds old.
+        Folders made with add_folder are added as they are created.
+
+        GetCreatorFoldersList answers for the caller, so listings are
+        kept under a scope as PanoptoSessionCache records are.
+    '''
+
+    def __init__(self, max_age=300):
+        self.max_age = max_age
+
+        self._children = {}
+        self._ids = {}
+        self._loaded = {}
+        self._lock = threading.Lock()
+
+    def get(self, parent, name, scope=None):
+        with self._lock:
+            return self._ids.get((scope, parent, name))
+
+    def children(self, parent, scope=None) -> list:
+        with self._lock:
+            return list(self._children.get((scope, parent), {}).values())
+
+    def stale(self, parent, scope=None) -> bool:
+        with self._lock:
+            loaded = self._loaded.get((scope, parent))
+        return loaded is None or time.monotonic() - loaded > self.max_age
+
+    def load(self, parent, folders, scope=None):
+        with self._lock:
+            self._drop((scope, parent))
+            for folder in folders:
+                self._add((scope, parent), folder)
+            self._loaded[(scope, parent)] = time.monotonic()
+
+    def add(self, parent, folder, scope=None):
+        with self._lock:
+            self._add((scope, parent), folder)
+
+    def invalidate(self, parent=None):
+        '''
+            Drops parent's folders from every scope, or everything when
+            parent is None.
+        '''
+        with self._lock:
+            if parent is None:
+                self._children.clear()
+                self._ids.clear()
+                self._loaded.clear()
+                return
+
+            for key in [key for key in self._loaded.keys() |
+                        self._children.keys() if key[1] == parent]:
+                self._drop(key)
+                self._loaded.pop(key, None)
+
+    def _add(self, key, folder):
+        self._children.setdefault(key, {})[folder['Id']] = folder
+        # Panopto allows duplicate names, the first listed wins
+        self._ids.setdefault(key + (folder['Name'],), folder['Id'])
+
+    def _drop(self, key):
+        for folder in self._children.pop(key, {}).values():
+            self._ids.pop(key + (folder['Name'],), None)
+
+
+class PanoptoFolderAccessReport(object):
+    '''
+        The result of copying creator access from source to target.
+        granted lists the groups given access, present those the target
+        already had and failed those Panopto refused to grant.
+    '''
+
+    def __init__(self, source, target):
+        self.source = source
+        self.target = target
+
+        self.granted = []
+        self.present = []
+        self.failed = []
+        self.error = None
+        self.succeeded = False
 
 
 class PanoptoSessionManager(object):
 
+    SERVICES = {
+        'session': 'SessionManagement',
+        'access': 'AccessManagement',
+        'user': 'UserManagement'
+    }
+
     def __init__(self, server, username,
                  instance_name=None, application_key=None,
-                 password=None, cache_dir=None):
-        self.client = {
-            'session': self._client(server, 'SessionManagement', cache_dir),
-            'access': self._client(server, 'AccessManagement', cache_dir),
-            'user': self._client(server, 'UserManagement', cache_dir)
-        }
+                 password=None, cache_dir=None, session_cache=None,
+                 folder_index=None, metrics=None):
+        # clients are built on first use and shared across the process
+        self.client = _ServiceClients(
+            lambda key: self._client(server, self.SERVICES[key], cache_dir))
         self.auth_info = PanoptoAuth.auth_info(
             server, username, instance_name, application_key, password)
+        self._cache_scope = _cache_scope(server, self.auth_info)
 
         self.server = server
         self.username = username
         self.instance_name = instance_name
         self.application_key = application_key
         self.password = password
+        self.session_cache = session_cache
+        self.folder_index = folder_index
+        self.metrics = metrics
 
     def _client(self, server, name, cache_dir):
-        url = 'https://{}/Panopto/PublicAPI/4.6/{}.svc?wsdl'.format(
-            server, name)
-        if cache_dir:
-            cache = SqliteCache(path=cache_dir)
-            transport = Transport(cache=cache, timeout=1440)
-        else:
-            transport = Transport()
-        return Client(url, transport=transport)
+        if self.metrics is not None:
+            from panopto.metrics import metered_service_client
+            return metered_service_client(
+                server, name, cache_dir, self.metrics)
+        return service_client(server, name, cache_dir)
 
     def add_folder(self, name, parent_guid):
         try:
             response = self.client['session'].service.AddFolder(
                 auth=self.auth_info, name=name, parentFolder=parent_guid,
                 isPublic=False)
+            folder_id = _parse_folder_id(response)
+        except _fault():
+            return ''
 
-            if response is None or len(response) < 1:
-                return ''
+        if folder_id and self.folder_index is not None:
+            self.folder_index.add(
+                parent_guid, {'Id': folder_id, 'Name': name},
+                self._cache_scope)
+        return folder_id
 
-            obj = serialize_object(response)
-            return obj['Id']
-        except Fault:
-            return ''
+    def _creator_folders(self, parent_guid, page_size=100):
+        folders, page = [], 0
+        try:
+            while True:
+                service = self.client['session'].service
+                response = service.GetCreatorFoldersList(
+                    auth=self.auth_info,
+                    request=_folder_list_request(parent_guid, page, page_size))
+                results, total = _parse_folder_page(response)
+                folders.extend(results)
+                if len(results) < page_size or len(folders) >= total:
+                    return folders
+                page += 1
+        except (_fault(), TypeError):
+            return None
 
     def get_folder(self, parent_guid, name):
-        try:
-            response = self.client['session'].service.GetCreatorFoldersList(
-                auth=self.auth_info, request={'ParentFolderId': parent_guid})
+        index = self.folder_index
+        if index is None:
+            # without a shared index, list the parent for this call only
+            index = PanoptoFolderIndex()
 
-            if response is None or len(response) < 1:
+        folder_id = index.get(parent_guid, name, self._cache_scope)
+        if folder_id is None and index.stale(parent_guid, self._cache_scope):
+            folders = self._creator_folders(parent_guid)
+            if folders is None:
                 return ''
-
-            obj = serialize_object(response)
-            for folder in obj['Results']['Folder']:
-                if folder['Name'] == name:
-                    return folder['Id']
-            return ''
-        except (Fault, TypeError):
-            return ''
+            index.load(parent_guid, folders, self._cache_scope)
+            folder_id = index.get(parent_guid, name, self._cache_scope)
+        return folder_id or ''
 
     def get_folder_access_details(self, folder_id):
         try:
             response = self.client['access'].service.GetFolderAccessDetails(
                 auth=self.auth_info, folderId=folder_id)
-
-            if response is None or len(response) < 1:
-                return ''
-
-            obj = serialize_object(response)
-            return obj['GroupsWithCreatorAccess']
-        except (Fault, TypeError):
+            return _parse_creator_groups(response)
+        except (_fault(), TypeError):
             return ''
 
     def grant_group_access_to_folder(self, folder_id, group_id):
@@ -86,68 +296,376 @@ class PanoptoSessionManager(object):
                 auth=self.auth_info, folderId=folder_id, groupId=group_id)
 
             return True
-        except Fault:
+        except _fault():
             return False
 
     def inherit_folder_access(self, from_folder_id, to_folder_id):
-        groups = self.get_folder_access_details(from_folder_id)
-        for group in groups['guid']:
-            self.grant_group_access_to_folder(to_folder_id, group)
+        return self.sync_folder_access([(from_folder_id, to_folder_id)])[0]
+
+    def sync_folder_access(self, pairs, max_concurrency=8):
+        '''
+            Gives each target folder the creator groups of its source,
+            for an iterable of (source, target) folder ids. The access
+            details of every folder are read concurrently, and only the
+            groups a target is missing are granted, also concurrently.
+            Returns a PanoptoFolderAccessReport per pair, in order.
+        '''
+        from concurrent.futures import ThreadPoolExecutor
+
+        pairs = list(pairs)
+        folders = list(dict.fromkeys(f for pair in pairs for f in pair))
+        with ThreadPoolExecutor(max_workers=max(1, max_concurrency)) \
+                as executor:
+            details = dict(zip(folders, executor.map(
+                self.get_folder_access_details, folders)))
+            reports, grants = _plan_access_sync(pairs, details)
+            results = executor.map(
+                lambda grant: self.grant_group_access_to_folder(*grant),
+                grants)
+            _record_grants(reports, grants, results)
+        return reports
 
     def get_session_url(self, session_id):
+        if self.session_cache is not None:
+            return self._cached_field(session_id, 'MP4Url', '')
+
         try:
             response = self.client['session'].service.GetSessionsById(
-                auth=self.auth_info, sessionIds=[session_id])
-        except Fault:
-            return ''
-
-        if response is None or len(response) < 1:
+                auth=self.auth_info, sessionIds=_guids([session_id]))
+        except _fault():
             return ''
 
-        obj = serialize_object(response)
-        return obj[0]['MP4Url']
+        return _parse_session_field(response, 'MP4Url', '')
 
     def get_thumb_url(self, session_id):
+        if self.session_cache is not None:
+            return self._cached_field(session_id, 'ThumbUrl', None)
+
         try:
             response = self.client['session'].service.GetSessionsById(
-                auth=self.auth_info, sessionIds=[session_id])
-        except Fault:
+                auth=self.auth_info, sessionIds=_guids([session_id]))
+        except _fault():
             return None
 
-        if response is None or len(response) < 1:
-            return None
+        return _parse_session_field(response, 'ThumbUrl', None)
+
+    def _sessions_by_id(self, session_ids):
+        try:
+            response = self.client['session'].service.GetSessionsById(
+                auth=self.auth_info, sessionIds=_guids(session_ids))
+        except _fault():
+            return []
 
-        obj = serialize_object(response)
-        return obj[0]['ThumbUrl']
+        return _parse_sessions(response)
 
-    def get_session_list(self, folder):
-        request = {
-            'FolderId': folder,
-            'Pagination': {'MaxNumberResults': 100, 'PageNumber': 0}
-        }
+    def get_sessions_by_id(self, session_ids, batch_size=100,
+                           max_concurrency=4):
+        '''
+            Returns a dict of session id to the full session record,
+            MP4Url, ThumbUrl, State, Duration and so on, for every id
+            Panopto knows, keyed by the id as Panopto returns it. Ids
+            are requested batch_size at a time, with up to
+            max_concurrency batches in flight. With a session_cache,
+            only the ids not cached are requested.
+        '''
+        from concurrent.futures import ThreadPoolExecutor
+
+        found, session_ids = _cache_lookup(
+            self.session_cache, self._cache_scope, session_ids)
+        batches = _batches(session_ids, batch_size)
+        if len(batches) < 2 or max_concurrency < 2:
+            results = map(self._sessions_by_id, batches)
+            return _cache_update(
+                self.session_cache, self._cache_scope, found, results)
+
+        workers = min(max_concurrency, len(batches))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = executor.map(self._sessions_by_id, batches)
+            return _cache_update(
+                self.session_cache, self._cache_scope, found, results)
+
+    def _cached_field(self, session_id, field, default):
+        session = self.get_sessions_by_id([session_id]).get(
+            _session_key(session_id))
+        return session[field] if session else default
+
+    def get_session_urls(self, session_ids, **kwargs):
+        sessions = self.get_sessions_by_id(session_ids, **kwargs)
+        return {id: session['MP4Url'] for id, session in sessions.items()}
+
+    def get_thumb_urls(self, session_ids, **kwargs):
+        sessions = self.get_sessions_by_id(session_ids, **kwargs)
+        return {id: session['ThumbUrl'] for id, session in sessions.items()}
 
+    def _session_page(self, folder, page, page_size, sort_by,
+                      sort_increasing):
+        request = _session_list_request(
+            folder, page, page_size, sort_by, sort_increasing)
         try:
             response = self.client['session'].service.GetSessionsList(
                 auth=self.auth_info, request=request, searchQuery=None)
-        except Fault:
-            return []
+        except _fault():
+            # a later page failing would silently cut the list short
+            if page:
+                raise
+            return ([], 0)
 
-        if (
-                response is None or len(response) < 1 or
-                response['TotalNumberResults'] == 0
-        ):
-            return []
+        return _parse_session_page(response)
+
+    def iter_session_list(self, folder, page_size=100, sort_by=None,
+                          sort_increasing=True, prefetch=True):
+        '''
+            Yields every session in folder, walking GetSessionsList one
+            page at a time. With prefetch, the next page is requested in
+            the background while the caller works through the current
+            one. sort_by is a Panopto SessionSortField such as 'Name',
+            'Date' or 'Duration'.
+
+            A Fault on the first page yields nothing, as for an empty
+            folder. A Fault on a later page is raised, rather than
+            leaving the caller with part of the folder.
+        '''
+        from concurrent.futures import ThreadPoolExecutor
+
+        def fetch(page):
+            return self._session_page(
+                folder, page, page_size, sort_by, sort_increasing)
+
+        executor = ThreadPoolExecutor(max_workers=1) if prefetch else None
+
+        def request(page):
+            if executor is None:
+                return functools.partial(fetch, page)
+            return executor.submit(fetch, page).result
+
+        try:
+            page, seen = 0, 0
+            next_page = request(page)
+            while True:
+                sessions, total = next_page()
+                seen += len(sessions)
+                more = len(sessions) == page_size and seen < total
+                if more:
+                    page += 1
+                    next_page = request(page)
 
-        obj = serialize_object(response)
-        return obj['Results']['Session']
+                yield from sessions
+                if not more:
+                    return
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
+
+    def get_session_list(self, folder):
+        return list(self.iter_session_list(folder))
 
     def move_sessions(self, session_ids, folder):
+        if self.session_cache is not None:
+            self.session_cache.invalidate(session_ids)
+
         try:
             self.client['session'].service.MoveSessions(
-                auth=self.auth_info, sessionIds=session_ids, folderId=folder)
-        except Fault:
+                auth=self.auth_info, sessionIds=_guids(session_ids),
+                folderId=folder)
+        except _fault():
             return False
+        finally:
+            # a lookup during the move may have cached the old folder
+            if self.session_cache is not None:
+                self.session_cache.invalidate(session_ids)
 
         # This api does not return a response. If no exception is thrown
         # assuming everything was completed successfully
         return True
+
+
+# Request builders and response parsers, shared with
+# panopto.aio.AsyncPanoptoSessionManager so both return the same shapes
+
+
+def _guids(ids):
+    # zeep sends only the first item of a plain list given for an
+    # ArrayOfguid, the list has to be passed as its guid element
+    return {'guid': list(ids)}
+
+
+def _parse_folder_id(response):
+    from zeep.helpers import serialize_object
+
+    if response is None or len(response) < 1:
+        return ''
+
+    obj = serialize_object(response)
+    return obj['Id']
+
+
+def _folder_list_request(parent_guid, page=0, page_size=100):
+    return {
+        'ParentFolderId': parent_guid,
+        'Pagination': {'MaxNumberResults': page_size, 'PageNumber': page}
+    }
+
+
+def _parse_folder_page(response):
+    from zeep.helpers import serialize_object
+
+    if response is None or len(response) < 1:
+        return ([], 0)
+
+    obj = serialize_object(response)
+    folders = (obj['Results'] or {}).get('Folder') or []
+    return (folders, obj.get('TotalNumberResults') or 0)
+
+
+def _parse_creator_groups(response):
+    from zeep.helpers import serialize_object
+
+    if response is None or len(response) < 1:
+        return ''
+
+    obj = serialize_object(response)
+    return obj['GroupsWithCreatorAccess']
+
+
+def _creator_group_ids(groups):
+    # no groups serializes as None rather than an empty list
+    if not groups:
+        return []
+    return groups['guid'] or []
+
+
+def _plan_access_sync(pairs, details):
+    '''
+        Returns a report for each (source, target) pair and a dict of
+        the (target, group) grants needed to the reports that need them.
+        get_folder_access_details returns '' when it cannot read a
+        folder, which fails the pairs involving it.
+    '''
+    reports, grants = [], {}
+    for source, target in pairs:
+        report = PanoptoFolderAccessReport(source, target)
+        reports.append(report)
+
+        unreadable = [f for f in (source, target) if details[f] == '']
+        if unreadable:
+            report.error = 'Failed to read access details for {}'.format(
+                ', '.join(unreadable))
+            continue
+
+        present = set(_creator_group_ids(details[target]))
+        for group in _creator_group_ids(details[source]):
+            if group in present:
+                report.present.append(group)
+            else:
+                grants.setdefault((target, group), []).append(report)
+    return reports, grants
+
+
+def _record_grants(reports, grants, results):
+    for grant, granted in zip(list(grants), results):
+        for report in grants[grant]:
+            if granted:
+                report.granted.append(grant[1])
+            else:
+                report.failed.append(grant[1])
+
+    for report in reports:
+        report.succeeded = report.error is None and not report.failed
+
+
+def _parse_session_field(response, field, default):
+    from zeep.helpers import serialize_object
+
+    if response is None or len(response) < 1:
+        return default
+
+    obj = serialize_object(response)
+    return obj[0][field]
+
+
+def _batches(session_ids, batch_size):
+    # drop duplicates, keeping the caller's order
+    ids = list(dict.fromkeys(session_ids))
+    return [ids[i:i + batch_size] for i in range(0, len(ids), batch_size)]
+
+
+def _parse_sessions(response):
+    from zeep.helpers import serialize_object
+
+    if response is None or len(response) < 1:
+        return []
+
+    return serialize_object(response)
+
+
+def _session_key(session_id):
+    '''
+        session_id as Panopto returns it, a lower case, hyphenated guid,
+        whatever the case or braces it was given with. Anything that is
+        not a guid is left alone.
+    '''
+    try:
+        return str(uuid.UUID(str(session_id)))
+    except ValueError:
+        return session_id
+
+
+def _sessions_by_key(results):
+    return {_session_key(session['Id']): session
+            for sessions in results for session in sessions}
+
+
+def _cache_scope(server, auth_info):
+    '''
+        The PanoptoSessionCache scope of a manager: its server, user key
+        and a hash of its password or auth code.
+    '''
+    if not auth_info:
+        return (server, None, None)
+    secret = auth_info.get('Password') or auth_info.get('AuthCode') or ''
+    return (server, auth_info['UserKey'],
+            hashlib.sha256(secret.encode('utf-8')).hexdigest())
+
+
+def _cache_lookup(cache, scope, session_ids):
+    if cache is None:
+        return {}, session_ids
+    return cache.lookup(
+        list(dict.fromkeys(map(_session_key, session_ids))), scope)
+
+
+def _cache_update(cache, scope, found, results):
+    sessions = _sessions_by_key(results)
+    if cache is not None:
+        cache.update(sessions, scope)
+    found.update(sessions)
+    return found
+
+
+def _session_list_request(folder, page=0, page_size=100, sort_by=None,
+                          sort_increasing=True):
+    request = {
+        'FolderId': folder,
+        'Pagination': {'MaxNumberResults': page_size, 'PageNumber': page}
+    }
+    if sort_by:
+        request['SortBy'] = sort_by
+        request['SortIncreasing'] = sort_increasing
+    return request
+
+
+def _parse_session_page(response):
+    '''
+        Returns the sessions on one page of GetSessionsList results and
+        the total number of sessions across all pages.
+    '''
+    from zeep.helpers import serialize_object
+
+    if (
+            response is None or len(response) < 1 or
+            response['TotalNumberResults'] == 0
+    ):
+        return ([], 0)
+
+    obj = serialize_object(response)
+    return (obj['Results']['Session'], obj['TotalNumberResults'])
@@ -1,3 +1,8 @@
+import hashlib
+import threading
+import time
+
+
 class MockPanoptoSoapClient(object):
 
     class MockAuthService(object):
@@ -22,3 +27,194 @@ class MockPanoptoSoapClient(object):
 
 def mock_soap_client(instance, name):
     return MockPanoptoSoapClient()
+
+
+class MockS3Client(object):
+    '''
+        Records multipart calls in memory. delay slows each upload_part
+        so concurrent uploads overlap. With md5_etags, ETags are MD5
+        based as S3's are, and parts numbered in corrupt are given the
+        ETag of different data. failures maps a part number, or the
+        object key, to the exceptions its uploads raise in turn, each
+        after reading part of the body. media holds each multipart
+        upload completed from parts sent to its key.
+    '''
+
+    def __init__(self, delay=0, parts=None, max_parts=1000,
+                 md5_etags=False, corrupt=(), failures=None):
+        self.delay = delay
+        self.max_parts = max_parts
+        self.md5_etags = md5_etags
+        self.corrupt = corrupt
+        self.failures = {name: list(errors)
+                         for name, errors in (failures or {}).items()}
+        self.parts = dict(parts or {})
+        self.key_parts = {}
+        self.media = {}
+        self.objects = {}
+        self.content_md5 = {}
+        self.content_types = {}
+        self.created = 0
+        self.completed = None
+        self.aborted = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+    def _fail(self, name, body):
+        with self.lock:
+            errors = self.failures.get(name)
+            error = errors.pop(0) if errors else None
+        if error is not None:
+            body.read(10)
+            raise error
+
+    def _etag(self, name, data):
+        if not self.md5_etags:
+            return '"{}"'.format(name)
+        if name in self.corrupt:
+            data += b'corrupt'
+        return '"{}"'.format(hashlib.md5(data).hexdigest())
+
+    def create_multipart_upload(self, Bucket, Key):
+        self.created += 1
+        return {'UploadId': 'upload-1'}
+
+    def list_parts(self, Bucket, Key, UploadId, PartNumberMarker=-1):
+        numbers = sorted(n for n in self.parts if n > PartNumberMarker)
+        page = numbers[:self.max_parts]
+        return {
+            'Parts': [{'PartNumber': n, 'ETag': '"etag-{}"'.format(n)}
+                      for n in page],
+            'IsTruncated': len(numbers) > len(page),
+            'NextPartNumberMarker': page[-1] if page else None
+        }
+
+    def upload_part(self, Bucket, Body, Key, UploadId, PartNumber,
+                    ContentMD5=None):
+        self._fail(PartNumber, Body)
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(self.delay)
+        with self.lock:
+            self.in_flight -= 1
+            self.parts[PartNumber] = Body.read()
+            self.key_parts.setdefault(Key, {})[PartNumber] = \
+                self.parts[PartNumber]
+            self.content_md5[PartNumber] = ContentMD5
+        if not self.md5_etags:
+            return {'ETag': '"etag-{}"'.format(PartNumber)}
+        return {'ETag': self._etag(PartNumber, self.parts[PartNumber])}
+
+    def put_object(self, Bucket, Key, Body, ContentMD5=None,
+                   ContentType=None):
+        self._fail(Key, Body)
+        self.objects[Key] = Body.read()
+        self.content_md5[Key] = ContentMD5
+        self.content_types[Key] = ContentType
+        return {'ETag': self._etag('object', self.objects[Key])}
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self.aborted.append(UploadId)
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId,
+                                  MultipartUpload):
+        from botocore.exceptions import ClientError
+        from panopto import upload
+
+        self.completed = MultipartUpload['Parts']
+        parts = self.key_parts.get(Key, {})
+        numbers = [part['PartNumber'] for part in self.completed]
+        sizes = [len(parts.get(number, self.parts.get(number, b'')))
+                 for number in numbers]
+        if any(size < upload.MIN_PART_SIZE for size in sizes[:-1]):
+            raise ClientError({
+                'Error': {'Code': 'EntityTooSmall'},
+                'ResponseMetadata': {'HTTPStatusCode': 400}},
+                'CompleteMultipartUpload')
+        if all(number in parts for number in numbers):
+            self.media[Key] = b''.join(parts[number] for number in numbers)
+        if not self.md5_etags:
+            return {'ETag': '"complete"'}
+
+        digests = b''.join(
+            hashlib.md5(self.parts[part['PartNumber']]).digest()
+            for part in self.completed)
+        if 'complete' in self.corrupt:
+            digests += b'corrupt'
+        return {'ETag': '"{}-{}"'.format(
+            hashlib.md5(digests).hexdigest(), len(self.completed))}
+
+
+class MockResponse(object):
+
+    def __init__(self, status_code, content=b''):
+        self.status_code = status_code
+        self.content = content
+
+
+class MockSession(object):
+    '''
+        Stands in for the authenticated requests.Session, answering
+        every request with the configured responses by method.
+    '''
+
+    def __init__(self, **responses):
+        self.responses = responses
+        self.requests = []
+
+    def _respond(self, method, url, **kwargs):
+        self.requests.append((method, url))
+        return self.responses[method]
+
+    def request(self, method, url, **kwargs):
+        return self._respond(method, url, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self._respond('get', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self._respond('post', url, **kwargs)
+
+    def put(self, url, **kwargs):
+        return self._respond('put', url, **kwargs)
+
+
+class MockSoapService(object):
+    '''
+        Answers SOAP operations from a dict of operation name to a
+        response, an exception to raise or a function of the call's
+        arguments. Unknown operations return None.
+    '''
+
+    def __init__(self, responses=None):
+        self.responses = responses or {}
+        self.calls = []
+
+    def __getattr__(self, operation):
+        def call(**kwargs):
+            self.calls.append((operation, kwargs))
+            response = self.responses.get(operation)
+            if isinstance(response, Exception):
+                raise response
+            if callable(response):
+                return response(**kwargs)
+            return response
+        return call
+
+
+class MockAsyncSoapService(MockSoapService):
+
+    def __getattr__(self, operation):
+        call = super().__getattr__(operation)
+
+        async def async_call(**kwargs):
+            return call(**kwargs)
+        return async_call
+
+
+class MockSoapClient(object):
+
+    def __init__(self, service):
+        self.service = service
@@ -0,0 +1,409 @@
+'''
+    A local stand-in for Panopto's 4.6 SessionManagement and
+    AccessManagement SOAP services, over a generated catalog of folders,
+    sessions and groups, shared by the tests and benchmarks.
+
+    serve() answers at
+    http://127.0.0.1:<port>/Panopto/PublicAPI/4.6/<service>.svc, with
+    the WSDL at ?wsdl. Only the operations PanoptoSessionManager
+    calls are described, and only the fields it reads are returned.
+    Every caller is accepted.
+'''
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import random
+import threading
+import uuid
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape
+
+
+TNS = 'http://tempuri.org/'
+SOAP_ENV = 'http://schemas.xmlsoap.org/soap/envelope/'
+SERVICE_PATH = '/Panopto/PublicAPI/4.6/{}.svc'
+
+# the root all generated folders descend from
+ROOT_FOLDER = str(uuid.UUID(int=0))
+
+TYPES = '''
+<xs:complexType name="AuthenticationInfo"><xs:sequence>
+  <xs:element name="AuthCode" type="xs:string" minOccurs="0" nillable="true"/>
+  <xs:element name="Password" type="xs:string" minOccurs="0" nillable="true"/>
+  <xs:element name="UserKey" type="xs:string" minOccurs="0" nillable="true"/>
+</xs:sequence></xs:complexType>
+<xs:complexType name="Pagination"><xs:sequence>
+  <xs:element name="MaxNumberResults" type="xs:int" minOccurs="0"/>
+  <xs:element name="PageNumber" type="xs:int" minOccurs="0"/>
+</xs:sequence></xs:complexType>
+<xs:complexType name="ArrayOfguid"><xs:sequence>
+  <xs:element name="guid" type="xs:string" minOccurs="0"
+    maxOccurs="unbounded"/>
+</xs:sequence></xs:complexType>
+<xs:complexType name="ListSessionsRequest"><xs:sequence>
+  <xs:element name="FolderId" type="xs:string" minOccurs="0"/>
+  <xs:element name="Pagination" type="tns:Pagination" minOccurs="0"/>
+  <xs:element name="SortBy" type="xs:string" minOccurs="0"/>
+  <xs:element name="SortIncreasing" type="xs:boolean" minOccurs="0"/>
+</xs:sequence></xs:complexType>
+<xs:complexType name="Session"><xs:sequence>
+  <xs:element name="Duration" type="xs:double" minOccurs="0"/>
+  <xs:element name="FolderId" type="xs:string" minOccurs="0"/>
+  <xs:element name="Id" type="xs:string" minOccurs="0"/>
+  <xs:element name="MP4Url" type="xs:string" minOccurs="0"/>
+  <xs:element name="Name" type="xs:string" minOccurs="0"/>
+  <xs:element name="State" type="xs:string" minOccurs="0"/>
+  <xs:element name="ThumbUrl" type="xs:string" minOccurs="0"/>
+</xs:sequence></xs:complexType>
+<xs:complexType name="ArrayOfSession"><xs:sequence>
+  <xs:element name="Session" type="tns:Session" minOccurs="0"
+    maxOccurs="unbounded"/>
+</xs:sequence></xs:complexType>
+<xs:complexType name="ListSessionsResponse"><xs:sequence>
+  <xs:element name="Results" type="tns:ArrayOfSession" minOccurs="0"/>
+  <xs:element name="TotalNumberResults" type="xs:int" minOccurs="0"/>
+</xs:sequence></xs:complexType>
+<xs:complexType name="ListFoldersRequest"><xs:sequence>
+  <xs:element name="Pagination" type="tns:Pagination" minOccurs="0"/>
+  <xs:element name="ParentFolderId" type="xs:string" minOccurs="0"/>
+</xs:sequence></xs:complexType>
+<xs:complexType name="Folder"><xs:sequence>
+  <xs:element name="Id" type="xs:string" minOccurs="0"/>
+  <xs:element name="Name" type="xs:string" minOccurs="0"/>
+  <xs:element name="ParentFolder" type="xs:string" minOccurs="0"/>
+</xs:sequence></xs:complexType>
+<xs:complexType name="ArrayOfFolder"><xs:sequence>
+  <xs:element name="Folder" type="tns:Folder" minOccurs="0"
+    maxOccurs="unbounded"/>
+</xs:sequence></xs:complexType>
+<xs:complexType name="ListFoldersResponse"><xs:sequence>
+  <xs:element name="Results" type="tns:ArrayOfFolder" minOccurs="0"/>
+  <xs:element name="TotalNumberResults" type="xs:int" minOccurs="0"/>
+</xs:sequence></xs:complexType>
+<xs:complexType name="FolderAccessDetails"><xs:sequence>
+  <xs:element name="FolderId" type="xs:string" minOccurs="0"/>
+  <xs:element name="GroupsWithCreatorAccess" type="tns:ArrayOfguid"
+    minOccurs="0" nillable="true"/>
+</xs:sequence></xs:complexType>
+'''
+
+# operation: ([(argument, type)], (result, type) or None)
+OPERATIONS = {
+    'SessionManagement': {
+        'GetSessionsList': (
+            [('auth', 'tns:AuthenticationInfo'),
+             ('request', 'tns:ListSessionsRequest'),
+             ('searchQuery', 'xs:string')],
+            ('GetSessionsListResult', 'tns:ListSessionsResponse')),
+        'GetSessionsById': (
+            [('auth', 'tns:AuthenticationInfo'),
+             ('sessionIds', 'tns:ArrayOfguid')],
+            ('GetSessionsByIdResult', 'tns:ArrayOfSession')),
+        'GetCreatorFoldersList': (
+            [('auth', 'tns:AuthenticationInfo'),
+             ('request', 'tns:ListFoldersRequest')],
+            ('GetCreatorFoldersListResult', 'tns:ListFoldersResponse')),
+        'AddFolder': (
+            [('auth', 'tns:AuthenticationInfo'), ('name', 'xs:string'),
+             ('parentFolder', 'xs:string'), ('isPublic', 'xs:boolean')],
+            ('AddFolderResult', 'tns:Folder')),
+        'MoveSessions': (
+            [('auth', 'tns:AuthenticationInfo'),
+             ('sessionIds', 'tns:ArrayOfguid'), ('folderId', 'xs:string')],
+            None),
+    },
+    'AccessManagement': {
+        'GetFolderAccessDetails': (
+            [('auth', 'tns:AuthenticationInfo'), ('folderId', 'xs:string')],
+            ('GetFolderAccessDetailsResult', 'tns:FolderAccessDetails')),
+        'GrantGroupAccessToFolder': (
+            [('auth', 'tns:AuthenticationInfo'), ('folderId', 'xs:string'),
+             ('groupId', 'xs:string')],
+            None),
+    },
+}
+
+
+def wsdl(service, location):
+    '''
+        A document/literal WSDL for service, answering at location.
+    '''
+    elements, messages, port, binding = [], [], [], []
+    for name, (arguments, result) in OPERATIONS[service].items():
+        fields = ''.join(
+            '<xs:element name="{}" type="{}" minOccurs="0" '
+            'nillable="true"/>'.format(*argument) for argument in arguments)
+        elements.append(
+            '<xs:element name="{0}"><xs:complexType><xs:sequence>{1}'
+            '</xs:sequence></xs:complexType></xs:element>'.format(
+                name, fields))
+        result = '' if result is None else (
+            '<xs:element name="{}" type="{}" minOccurs="0" '
+            'nillable="true"/>'.format(*result))
+        elements.append(
+            '<xs:element name="{0}Response"><xs:complexType><xs:sequence>'
+            '{1}</xs:sequence></xs:complexType></xs:element>'.format(
+                name, result))
+
+        for message in (name, name + 'Response'):
+            messages.append(
+                '<wsdl:message name="{0}"><wsdl:part name="parameters" '
+                'element="tns:{0}"/></wsdl:message>'.format(message))
+        port.append(
+            '<wsdl:operation name="{0}"><wsdl:input message="tns:{0}"/>'
+            '<wsdl:output message="tns:{0}Response"/>'
+            '</wsdl:operation>'.format(name))
+        binding.append(
+            '<wsdl:operation name="{0}"><soap:operation '
+            'soapAction="{1}I{2}/{0}" style="document"/>'
+            '<wsdl:input><soap:body use="literal"/></wsdl:input>'
+            '<wsdl:output><soap:body use="literal"/></wsdl:output>'
+            '</wsdl:operation>'.format(name, TNS, service))
+
+    return '''<?xml version="1.0" encoding="utf-8"?>
+<wsdl:definitions name="{service}" targetNamespace="{tns}"
+    xmlns:wsdl="http://schemas.xmlsoap.org/wsdl/"
+    xmlns:soap="http://schemas.xmlsoap.org/wsdl/soap/"
+    xmlns:xs="http://www.w3.org/2001/XMLSchema" xmlns:tns="{tns}">
+<wsdl:types><xs:schema elementFormDefault="qualified"
+    targetNamespace="{tns}">{types}{elements}</xs:schema></wsdl:types>
+{messages}
+<wsdl:portType name="I{service}">{port}</wsdl:portType>
+<wsdl:binding name="BasicHttpBinding_I{service}" type="tns:I{service}">
+<soap:binding transport="http://schemas.xmlsoap.org/soap/http"/>
+{binding}</wsdl:binding>
+<wsdl:service name="{service}">
+<wsdl:port name="BasicHttpBinding_I{service}"
+    binding="tns:BasicHttpBinding_I{service}">
+<soap:address location="{location}"/></wsdl:port></wsdl:service>
+</wsdl:definitions>'''.format(
+        service=service, tns=TNS, types=TYPES, elements=''.join(elements),
+        messages=''.join(messages), port=''.join(port),
+        binding=''.join(binding), location=location)
+
+
+class Catalog(object):
+
+    '''
+        Generated folders, sessions and creator groups. Folders form a
+        two level tree under ROOT_FOLDER, a hundred to a parent. The
+        first folder holds a tenth of the sessions, so listing it pages
+        through many results, and the rest are spread evenly.
+    '''
+
+    def __init__(self, sessions=10000, folders=None, groups=50, seed=0):
+        rng = random.Random(seed)
+        folders = folders or max(2, sessions // 20)
+        parents = max(1, folders // 100)
+
+        self.folders = {}
+        self.children = {}
+        for i in range(folders):
+            parent = ROOT_FOLDER if i < parents else self.folder_id(
+                i % parents)
+            self.folders[self.folder_id(i)] = {
+                'Id': self.folder_id(i), 'Name': 'Folder {}'.format(i),
+                'ParentFolder': parent}
+            self.children.setdefault(parent, []).append(self.folder_id(i))
+
+        self.groups = [str(uuid.UUID(int=rng.getrandbits(128)))
+                       for i in range(groups)]
+        self.access = {folder: rng.sample(self.groups, min(3, groups))
+                       for folder in self.folders}
+
+        self.sessions = {}
+        self.folder_sessions = {folder: [] for folder in self.folders}
+        big = sessions // 10
+        for i in range(sessions):
+            folder = self.folder_id(0 if i < big else 1 + i % (folders - 1))
+            session_id = str(uuid.UUID(int=(1 << 64) + i))
+            self.sessions[session_id] = {
+                'Id': session_id, 'Name': 'Session {}'.format(i),
+                'FolderId': folder,
+                'MP4Url': 'https://example.com/{}.mp4'.format(session_id),
+                'ThumbUrl': 'https://example.com/{}.jpg'.format(session_id),
+                'State': 'Complete', 'Duration': float(rng.randrange(3600)),
+            }
+            self.folder_sessions[folder].append(session_id)
+
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def folder_id(i):
+        return str(uuid.UUID(int=(1 << 32) + i))
+
+    def session_list(self, folder, page, size, sort_by, increasing):
+        with self.lock:
+            sessions = [self.sessions[s]
+                        for s in self.folder_sessions.get(folder, [])]
+        if sort_by in ('Name', 'Duration'):
+            sessions.sort(key=lambda s: s[sort_by], reverse=not increasing)
+        return sessions[page * size:(page + 1) * size], len(sessions)
+
+    def folder_list(self, parent, page, size):
+        with self.lock:
+            folders = [self.folders[f] for f in self.children.get(parent, [])]
+        return folders[page * size:(page + 1) * size], len(folders)
+
+    def move(self, session_ids, folder):
+        with self.lock:
+            for session_id in session_ids:
+                session = self.sessions.get(session_id)
+                if session is None or folder not in self.folders:
+                    continue
+                self.folder_sessions[session['FolderId']].remove(session_id)
+                self.folder_sessions[folder].append(session_id)
+                session['FolderId'] = folder
+
+    def add_folder(self, name, parent):
+        with self.lock:
+            folder = {'Id': str(uuid.uuid4()), 'Name': name,
+                      'ParentFolder': parent}
+            self.folders[folder['Id']] = folder
+            self.children.setdefault(parent, []).append(folder['Id'])
+            self.folder_sessions[folder['Id']] = []
+            self.access[folder['Id']] = []
+        return folder
+
+    def grant(self, folder, group):
+        with self.lock:
+            if group not in self.access.setdefault(folder, []):
+                self.access[folder].append(group)
+
+
+def _local(element):
+    return element.tag.rsplit('}', 1)[-1]
+
+
+def _child(element, name):
+    for child in element if element is not None else ():
+        if _local(child) == name:
+            return child
+    return None
+
+
+def _text(element, name, default=None):
+    child = _child(element, name)
+    return default if child is None or child.text is None else child.text
+
+
+def _guids(element):
+    return [child.text for child in element if child.text] \
+        if element is not None else []
+
+
+def _record(name, fields):
+    return '<{0}>{1}</{0}>'.format(name, ''.join(
+        '<{0}>{1}</{0}>'.format(key, escape(str(value)))
+        for key, value in sorted(fields.items())))
+
+
+def _array(name, records):
+    return ''.join(_record(name, record) for record in records)
+
+
+class SoapHandler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+    catalog = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _respond(self, status, body, content_type='text/xml'):
+        body = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _service(self):
+        name = self.path.split('?')[0].rsplit('/', 1)[-1]
+        name = name[:-len('.svc')] if name.endswith('.svc') else None
+        return name if name in OPERATIONS else None
+
+    def do_GET(self):
+        service = self._service()
+        if service is None:
+            self._respond(404, '')
+            return
+        location = 'http://{}{}'.format(
+            self.headers['Host'], SERVICE_PATH.format(service))
+        self._respond(200, wsdl(service, location))
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        envelope = ElementTree.fromstring(body)
+        request = next(iter(_child(envelope, 'Body')))
+        operation = _local(request)
+
+        result = getattr(self, 'op_' + operation)(request)
+        self._respond(200, (
+            '<s:Envelope xmlns:s="{}"><s:Body>'
+            '<{}Response xmlns="{}">{}</{}Response>'
+            '</s:Body></s:Envelope>').format(
+                SOAP_ENV, operation, TNS, result or '', operation))
+
+    def op_GetSessionsList(self, request):
+        query = _child(request, 'request')
+        pagination = _child(query, 'Pagination')
+        sessions, total = self.catalog.session_list(
+            _text(query, 'FolderId'),
+            int(_text(pagination, 'PageNumber', 0)),
+            int(_text(pagination, 'MaxNumberResults', 10)),
+            _text(query, 'SortBy'),
+            _text(query, 'SortIncreasing', 'true') == 'true')
+        return ('<GetSessionsListResult><Results>{}</Results>'
+                '<TotalNumberResults>{}</TotalNumberResults>'
+                '</GetSessionsListResult>').format(
+                    _array('Session', sessions), total)
+
+    def op_GetSessionsById(self, request):
+        ids = _guids(_child(request, 'sessionIds'))
+        sessions = [self.catalog.sessions[i] for i in ids
+                    if i in self.catalog.sessions]
+        return '<GetSessionsByIdResult>{}</GetSessionsByIdResult>'.format(
+            _array('Session', sessions))
+
+    def op_GetCreatorFoldersList(self, request):
+        query = _child(request, 'request')
+        pagination = _child(query, 'Pagination')
+        folders, total = self.catalog.folder_list(
+            _text(query, 'ParentFolderId'),
+            int(_text(pagination, 'PageNumber', 0)),
+            int(_text(pagination, 'MaxNumberResults', 10)))
+        return ('<GetCreatorFoldersListResult><Results>{}</Results>'
+                '<TotalNumberResults>{}</TotalNumberResults>'
+                '</GetCreatorFoldersListResult>').format(
+                    _array('Folder', folders), total)
+
+    def op_AddFolder(self, request):
+        folder = self.catalog.add_folder(
+            _text(request, 'name'), _text(request, 'parentFolder'))
+        return _record('AddFolderResult', folder)
+
+    def op_MoveSessions(self, request):
+        self.catalog.move(_guids(_child(request, 'sessionIds')),
+                          _text(request, 'folderId'))
+
+    def op_GetFolderAccessDetails(self, request):
+        folder = _text(request, 'folderId')
+        groups = ''.join('<guid>{}</guid>'.format(g)
+                         for g in self.catalog.access.get(folder, []))
+        return ('<GetFolderAccessDetailsResult><FolderId>{}</FolderId>'
+                '<GroupsWithCreatorAccess>{}</GroupsWithCreatorAccess>'
+                '</GetFolderAccessDetailsResult>').format(folder, groups)
+
+    def op_GrantGroupAccessToFolder(self, request):
+        self.catalog.grant(
+            _text(request, 'folderId'), _text(request, 'groupId'))
+
+
+def serve(catalog, port=0):
+    '''
+        Returns a ThreadingHTTPServer answering for catalog. Call its
+        serve_forever() to start it.
+    '''
+    handler = type('CatalogSoapHandler', (SoapHandler,), {'catalog': catalog})
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    server.daemon_threads = True
+    return server
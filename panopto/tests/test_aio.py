@@ -0,0 +1,180 @@
+import asyncio
+import threading
+import unittest
+
+from mock import patch
+from zeep.exceptions import Fault
+
+from panopto import auth
+from panopto.aio import AsyncPanoptoSessionManager
+from panopto.tests.patches import MockAsyncSoapService, MockSoapClient
+from panopto.session import PanoptoFolderIndex, PanoptoSessionCache
+from panopto.tests.soap_service import Catalog, serve
+from panopto.tests.test_session import (
+    SESSION_ID, folder_access, paged_folders, paged_sessions, panopto_ids,
+    sessions_by_id)
+
+
+SESSION = {'Id': 'abc', 'MP4Url': 'https://mp4', 'ThumbUrl': 'https://jpg'}
+
+
+class TestAsyncPanoptoSessionManager(unittest.TestCase):
+
+    def setUp(self):
+        self.manager = AsyncPanoptoSessionManager(
+            'test.hosted.panopto.com', 'test', password='pw')
+        self.service = MockAsyncSoapService({
+            'GetSessionsById': [SESSION],
+            'GetSessionsList': {
+                'TotalNumberResults': 1, 'Results': {'Session': [SESSION]}},
+            'AddFolder': {'Id': 'folder-id'},
+            'MoveSessions': Fault('denied'),
+        })
+        self.manager.client['session'] = MockSoapClient(self.service)
+
+    def run_async(self, coroutine):
+        return asyncio.run(coroutine)
+
+    def test_get_session_url(self):
+        self.assertEqual(
+            self.run_async(self.manager.get_session_url('abc')),
+            'https://mp4')
+        self.assertEqual(
+            self.run_async(self.manager.get_thumb_url('abc')),
+            'https://jpg')
+
+    def test_concurrent(self):
+        async def fetch():
+            return await asyncio.gather(
+                *[self.manager.get_session_url(i) for i in range(50)])
+
+        self.assertEqual(self.run_async(fetch()), ['https://mp4'] * 50)
+        self.assertEqual(len(self.service.calls), 50)
+
+    def test_get_session_list(self):
+        self.assertEqual(
+            self.run_async(self.manager.get_session_list('folder')),
+            [SESSION])
+
+    def test_iter_session_list(self):
+        async def fetch():
+            return [session async for session in
+                    self.manager.iter_session_list('folder', page_size=10)]
+
+        self.service.responses['GetSessionsList'] = paged_sessions(25)
+        sessions = self.run_async(fetch())
+        self.assertEqual([s['Id'] for s in sessions],
+                         [str(i) for i in range(25)])
+
+    def test_later_page_fault(self):
+        async def fetch():
+            return [session async for session in
+                    self.manager.iter_session_list('folder', page_size=10)]
+
+        self.service.responses['GetSessionsList'] = paged_sessions(
+            25, failing_page=2)
+        with self.assertRaises(Fault):
+            self.run_async(fetch())
+
+    def test_get_sessions_by_id(self):
+        self.service.responses['GetSessionsById'] = sessions_by_id
+        ids = [str(i) for i in range(120)]
+        urls = self.run_async(
+            self.manager.get_session_urls(ids, batch_size=50))
+        self.assertEqual(len(urls), 120)
+        self.assertEqual(urls['3'], 'https://3.mp4')
+        self.assertEqual(len(self.service.calls), 3)
+
+    def test_cached_id_formats(self):
+        self.manager.session_cache = PanoptoSessionCache()
+        self.service.responses['GetSessionsById'] = panopto_ids
+        self.assertEqual(
+            self.run_async(self.manager.get_session_url(SESSION_ID.upper())),
+            'https://{}.mp4'.format(SESSION_ID))
+        self.assertEqual(
+            self.run_async(
+                self.manager.get_thumb_url('{' + SESSION_ID + '}')),
+            'https://{}.jpg'.format(SESSION_ID))
+        self.assertEqual(len(self.service.calls), 1)
+
+    def test_add_folder(self):
+        self.assertEqual(
+            self.run_async(self.manager.add_folder('name', 'parent')),
+            'folder-id')
+
+    def test_get_folder(self):
+        self.manager.folder_index = PanoptoFolderIndex()
+        self.service.responses['GetCreatorFoldersList'] = paged_folders(120)
+        self.assertEqual(
+            self.run_async(self.manager.get_folder('parent', 'folder 110')),
+            'id-110')
+        self.assertEqual(
+            self.run_async(self.manager.get_folder('parent', 'folder 3')),
+            'id-3')
+        self.assertEqual(len(self.service.calls), 2)
+
+    def test_sync_folder_access(self):
+        self.manager.client['access'] = MockSoapClient(MockAsyncSoapService(
+            {'GetFolderAccessDetails': folder_access}))
+        reports = self.run_async(self.manager.sync_folder_access(
+            [('source', 'target'), ('missing', 'target')]))
+        self.assertEqual(sorted(reports[0].granted), ['g1', 'g3'])
+        self.assertTrue(reports[0].succeeded)
+        self.assertFalse(reports[1].succeeded)
+
+    def test_fault(self):
+        self.assertFalse(
+            self.run_async(self.manager.move_sessions(['abc'], 'folder')))
+
+
+class TestAsyncPanoptoSessionManagerStandIn(unittest.TestCase):
+
+    def setUp(self):
+        self.catalog = Catalog(100)
+        self.server = serve(self.catalog)
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        # the stand-in answers over http
+        https_url = auth.wsdl_url
+        wsdl_url = patch('panopto.auth.wsdl_url', side_effect=lambda *args:
+                         https_url(*args).replace('https:', 'http:'))
+        wsdl_url.start()
+        self.addCleanup(wsdl_url.stop)
+
+        self.manager = AsyncPanoptoSessionManager(
+            '127.0.0.1:{}'.format(self.server.server_address[1]), 'test',
+            password='pw')
+
+    def test_clients(self):
+        loaded = []
+        service_document = auth.service_document
+
+        def recording(*args):
+            loaded.append(threading.current_thread())
+            return service_document(*args)
+
+        async def calls():
+            async with self.manager:
+                session_id = next(iter(self.catalog.sessions))
+                return await asyncio.gather(
+                    self.manager.get_session_url(session_id),
+                    self.manager.get_session_url(session_id),
+                    self.manager.get_folder_access_details(
+                        Catalog.folder_id(0)))
+
+        with patch('panopto.aio.service_document', side_effect=recording):
+            urls = asyncio.run(calls())
+
+        self.assertEqual(urls[0], urls[1])
+        self.assertTrue(urls[0].endswith('.mp4'))
+        self.assertEqual(urls[2]['guid'],
+                         self.catalog.access[Catalog.folder_id(0)])
+        # the WSDLs were loaded off the event loop's thread
+        self.assertTrue(loaded)
+        self.assertNotIn(threading.current_thread(), loaded)
+        self.assertEqual(set(self.manager.client), {'session', 'access'})
+        self.assertIsNone(self.manager._http)
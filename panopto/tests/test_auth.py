@@ -1,8 +1,11 @@
 from mock import patch
+import threading
+import time
 import unittest
 
-from panopto.auth import PanoptoAuth
-from panopto.tests.patches import mock_soap_client
+from panopto import auth
+from panopto.auth import PanoptoAuth, PanoptoSessionPool
+from panopto.tests.patches import MockResponse, mock_soap_client
 
 
 class TestPanoptoAuth(unittest.TestCase):
@@ -36,3 +39,135 @@ class TestPanoptoAuth(unittest.TestCase):
         self.assertEqual(
             self.auth.authenticate_with_application_key('test', 'bar'),
             'valid session')
+
+
+class MockCookie(object):
+
+    def __init__(self, expired=False):
+        self.expired = expired
+
+    def is_expired(self):
+        return self.expired
+
+
+class MockAuthSession(object):
+
+    def __init__(self, statuses=()):
+        self.cookies = [MockCookie()]
+        self.statuses = list(statuses)
+
+    def request(self, method, url, **kwargs):
+        status = self.statuses.pop(0) if self.statuses else 200
+        return MockResponse(status)
+
+
+class TestPanoptoSessionPool(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = PanoptoSessionPool()
+        self.logins = []
+
+        def login(server, username, password):
+            time.sleep(0.01)
+            session = MockAuthSession()
+            self.logins.append(session)
+            return session
+
+        self.pool._login = login
+
+    def test_get_cached(self):
+        session = self.pool.get('server', 'test', 'pw')
+        self.assertIs(self.pool.get('server', 'test', 'pw'), session)
+        self.assertIsNot(self.pool.get('server', 'other', 'pw'), session)
+        self.assertEqual(len(self.logins), 2)
+
+    def test_get_other_password(self):
+        session = self.pool.get('server', 'test', 'pw')
+        self.assertIs(self.pool.get('server', 'test', 'pw'), session)
+
+        self.pool._login = lambda server, username, password: None
+        self.assertIsNone(self.pool.get('server', 'test', 'wrong'))
+        self.assertEqual(len(self.logins), 1)
+
+    def test_get_expired(self):
+        session = self.pool.get('server', 'test', 'pw')
+        session.cookies[0].expired = True
+        self.assertIsNot(self.pool.get('server', 'test', 'pw'), session)
+        self.assertEqual(len(self.logins), 2)
+
+    def test_renew_once(self):
+        stale = self.pool.get('server', 'test', 'pw')
+
+        threads = [
+            threading.Thread(target=self.pool.renew,
+                             args=('server', 'test', 'pw', stale))
+            for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(self.logins), 2)
+        self.assertIs(self.pool.get('server', 'test', 'pw'), self.logins[1])
+
+    def test_request_retries_refused(self):
+        self.pool.get('server', 'test', 'pw').statuses = [401]
+        response = self.pool.request(
+            'server', 'test', 'pw', 'get', 'https://server/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(self.logins), 2)
+
+    def test_request_login_failed(self):
+        self.pool._login = lambda server, username, password: None
+        self.assertIsNone(
+            self.pool.request('server', 'test', 'pw', 'get', 'url'))
+
+
+class TestServiceClients(unittest.TestCase):
+
+    def setUp(self):
+        auth._memo.clear()
+
+    def tearDown(self):
+        auth._memo.clear()
+
+    def test_service_document(self):
+        with patch('zeep.wsdl.Document') as document:
+            first = auth.service_document('test.hosted.panopto.com', 'Auth')
+            second = auth.service_document('test.hosted.panopto.com', 'Auth')
+            auth.service_document('test.hosted.panopto.com', 'Session')
+
+        self.assertIs(first, second)
+        self.assertEqual(document.call_count, 2)
+        self.assertEqual(
+            document.call_args_list[0][0][0],
+            'https://test.hosted.panopto.com/Panopto/PublicAPI/4.6/'
+            'Auth.svc?wsdl')
+
+    def test_service_document_cached(self):
+        with patch.object(auth, '_transport'), \
+                patch('panopto.wsdl_cache.load_document') as load:
+            auth.service_document('server', 'Auth', '/tmp/panopto.sqlite')
+
+        self.assertEqual(load.call_args[0][2], '/tmp/panopto.sqlite.wsdl')
+
+    def test_service_client(self):
+        with patch.object(auth, '_load_document'), \
+                patch.object(auth, '_transport'), \
+                patch('zeep.Client') as client:
+            first = auth.service_client('server', 'SessionManagement')
+            second = auth.service_client('server', 'SessionManagement')
+            auth.service_client('server', 'SessionManagement', '/tmp')
+
+        self.assertIs(first, second)
+        self.assertEqual(client.call_count, 2)
+
+    def test_auth_client_per_instance(self):
+        with patch('zeep.wsdl.Document') as document, \
+                patch('zeep.Client') as client:
+            PanoptoAuth('server')
+            PanoptoAuth('server')
+
+        # one parse, but each instance logs in on its own transport
+        self.assertEqual(document.call_count, 1)
+        self.assertEqual(client.call_count, 2)
@@ -0,0 +1,62 @@
+import os
+import tempfile
+import unittest
+
+from panopto.batch import PanoptoUploadBatch
+from panopto.tests.patches import MockResponse, MockS3Client, MockSession
+
+
+class TestPanoptoUploadBatch(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.files = []
+        for i in range(3):
+            path = os.path.join(self.dir, 'lecture{}.mp4'.format(i))
+            with open(path, 'wb') as f:
+                f.write(os.urandom(1000))
+            self.files.append(path)
+
+        self.batch = PanoptoUploadBatch(
+            'test.hosted.panopto.com', 'test', 'password',
+            max_uploads=2, max_concurrency=2)
+        self.batch.session = MockSession(
+            post=MockResponse(
+                201, b'{"ID": "39fe1efd", "UploadTarget": '
+                b'"https://test.hosted.panopto.com/Panopto/Upload/ac6bef38"}'),
+            put=MockResponse(200))
+        self.s3 = MockS3Client()
+        self.batch._s3['https://test.hosted.panopto.com'] = self.s3
+
+    def tearDown(self):
+        for path in self.files:
+            os.remove(path)
+        os.rmdir(self.dir)
+
+    def test_run(self):
+        for path in self.files:
+            self.batch.add(path, 'folder-id', description='a lecture')
+        missing = self.batch.add(
+            os.path.join(self.dir, 'missing.mp4'), 'folder-id')
+
+        jobs = self.batch.run()
+
+        self.assertEqual(len(jobs), 4)
+        for job in jobs[:3]:
+            self.assertTrue(job.succeeded)
+            self.assertEqual(job.upload_id, '39fe1efd')
+            self.assertEqual(job.bytes_uploaded, 1000)
+            self.assertIsNone(job.error)
+
+        self.assertFalse(missing.succeeded)
+        self.assertTrue(missing.error.startswith('FileNotFoundError'))
+
+        stats = self.batch.stats()
+        self.assertEqual(stats['jobs'], 4)
+        self.assertEqual(stats['succeeded'], 3)
+        self.assertEqual(stats['failed'], 1)
+        self.assertEqual(stats['bytes_uploaded'], 3000)
+        self.assertTrue(stats['throughput'] > 0)
+
+        # a manifest for every job, media for the three that exist
+        self.assertEqual(len(self.s3.objects), 7)
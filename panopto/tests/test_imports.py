@@ -0,0 +1,47 @@
+import subprocess
+import sys
+import unittest
+
+
+# dependencies that must only be imported once they are used
+HEAVY = ('boto3', 'botocore', 's3transfer', 'lxml', 'zeep', 'requests',
+         'urllib3', 'httpx')
+
+# seconds, generous for a slow CI runner but well below the cost of
+# importing zeep or boto3
+BUDGET = 0.15
+
+
+class TestImportBudget(unittest.TestCase):
+
+    def import_module(self, name):
+        '''
+            Imports name in a fresh interpreter. Returns the modules it
+            loaded and the cumulative import time, in seconds.
+        '''
+        code = 'import sys, {}; print(" ".join(sys.modules))'.format(name)
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', code],
+            capture_output=True, text=True, check=True)
+
+        cumulative = None
+        for line in result.stderr.splitlines():
+            fields = line.split('|')
+            if len(fields) == 3 and fields[2].strip() == name:
+                cumulative = int(fields[1]) / 1e6
+        return (result.stdout.split(), cumulative)
+
+    def assertWithinBudget(self, name):
+        modules, seconds = self.import_module(name)
+        heavy = [m for m in modules if m.split('.')[0] in HEAVY]
+        self.assertEqual(heavy, [], '{} imports {}'.format(name, heavy))
+        self.assertLess(seconds, BUDGET)
+
+    def test_auth(self):
+        self.assertWithinBudget('panopto.auth')
+
+    def test_session(self):
+        self.assertWithinBudget('panopto.session')
+
+    def test_upload(self):
+        self.assertWithinBudget('panopto.upload')
@@ -0,0 +1,111 @@
+import asyncio
+import unittest
+
+from mock import patch
+from zeep.exceptions import Fault
+
+from panopto.aio import AsyncPanoptoSessionManager
+from panopto.metrics import PanoptoMetrics
+from panopto.session import PanoptoSessionManager
+from panopto.tests.patches import (
+    MockAsyncSoapService, MockSoapClient, MockSoapService)
+
+
+SESSION = {'Id': 'abc', 'MP4Url': 'https://mp4', 'ThumbUrl': 'https://jpg'}
+
+
+class Operation(object):
+    name = 'GetSessionsById'
+
+
+class TestPanoptoMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.metrics = PanoptoMetrics(buckets=(0.1, 1))
+
+    def test_observe(self):
+        self.metrics.observe('GetSessionsById', 0.05)
+        self.metrics.observe('GetSessionsById', 0.5, fault=True)
+        self.metrics.observe('GetSessionsById', 5, error=True)
+        self.metrics.observe_response('GetSessionsById', 300)
+
+        operation = self.metrics.snapshot()['GetSessionsById']
+        self.assertEqual(operation['calls'], 3)
+        self.assertEqual(operation['faults'], 1)
+        self.assertEqual(operation['errors'], 1)
+        self.assertEqual(operation['latency'], {0.1: 1, 1: 2, 'inf': 3})
+        self.assertEqual(operation['response_bytes'], 300)
+
+    def test_prometheus(self):
+        self.metrics.observe('AddFolder', 0.05, fault=True)
+        text = self.metrics.prometheus()
+        self.assertIn('# TYPE panopto_soap_calls_total counter', text)
+        self.assertIn(
+            'panopto_soap_faults_total{operation="AddFolder"} 1', text)
+        self.assertIn('panopto_soap_call_seconds_bucket'
+                      '{operation="AddFolder",le="+Inf"} 1', text)
+        self.assertIn(
+            'panopto_soap_call_seconds_count{operation="AddFolder"} 1', text)
+        self.assertTrue(text.endswith('\n'))
+
+    def test_plugin(self):
+        plugin = self.metrics.plugin()
+        plugin.ingress('envelope', {'Content-Length': '120'}, Operation())
+        self.assertEqual(
+            self.metrics.snapshot()['GetSessionsById']['response_bytes'],
+            120)
+
+
+class TestMeteredSessionManager(unittest.TestCase):
+
+    def setUp(self):
+        self.metrics = PanoptoMetrics()
+        self.manager = PanoptoSessionManager(
+            'test.hosted.panopto.com', 'test', password='pw',
+            metrics=self.metrics)
+        self.service = MockSoapService({
+            'GetSessionsById': [SESSION],
+            'MoveSessions': Fault('denied'),
+            'AddFolder': ValueError('broken'),
+        })
+        self.manager.client['session'] = self.metrics.wrap(
+            MockSoapClient(self.service))
+
+    def test_calls(self):
+        self.assertEqual(self.manager.get_session_url('abc'), 'https://mp4')
+        self.assertFalse(self.manager.move_sessions(['abc'], 'folder'))
+        with self.assertRaises(ValueError):
+            self.manager.add_folder('name', 'parent')
+
+        snapshot = self.metrics.snapshot()
+        self.assertEqual(snapshot['GetSessionsById']['calls'], 1)
+        self.assertEqual(snapshot['MoveSessions']['faults'], 1)
+        self.assertEqual(snapshot['AddFolder']['errors'], 1)
+
+    def test_metered_client(self):
+        manager = PanoptoSessionManager(
+            'test.hosted.panopto.com', 'test', password='pw',
+            metrics=self.metrics)
+        with patch('panopto.auth.service_document'), \
+                patch('zeep.Client') as client:
+            manager.client['session']
+        self.assertEqual(client.call_args.kwargs['plugins'][0].metrics,
+                         self.metrics)
+
+    def test_disabled(self):
+        manager = PanoptoSessionManager(
+            'test.hosted.panopto.com', 'test', password='pw')
+        with patch('panopto.session.service_client') as client:
+            self.assertIs(manager.client['session'], client.return_value)
+
+    def test_async(self):
+        manager = AsyncPanoptoSessionManager(
+            'test.hosted.panopto.com', 'test', password='pw',
+            metrics=self.metrics)
+        service = MockAsyncSoapService({'GetSessionsById': [SESSION]})
+        manager.client['session'] = self.metrics.wrap(
+            MockSoapClient(service), asynchronous=True)
+        self.assertEqual(
+            asyncio.run(manager.get_thumb_url('abc')), 'https://jpg')
+        self.assertEqual(
+            self.metrics.snapshot()['GetSessionsById']['calls'], 1)
@@ -0,0 +1,117 @@
+from mock import patch
+
+from panopto.progress import PanoptoUploadListener, PanoptoUploadSummary
+from panopto.tests.patches import MockResponse, MockS3Client, MockSession
+from panopto.tests.test_upload import MediaTestCase
+
+
+class RecordingListener(PanoptoUploadListener):
+
+    def __init__(self):
+        self.events = []
+
+    def stage_started(self, upload, stage):
+        self.events.append(('started', stage))
+
+    def stage_finished(self, upload, stage, seconds, error):
+        self.events.append(('finished', stage, error))
+
+    def part_finished(self, upload, part_number, size, seconds):
+        self.events.append(('part', part_number, size))
+
+
+class TestPanoptoUploadListener(MediaTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.listener = RecordingListener()
+        self.uploader.listeners.append(self.listener)
+
+    def test_stages_and_parts(self):
+        self.uploader.s3 = MockS3Client()
+        self.uploader.upload_media()
+        self.uploader.session = MockSession(put=MockResponse(200))
+        self.uploader.complete_session()
+
+        events = self.listener.events
+        self.assertEqual(events[0], ('started', 'upload_media'))
+        self.assertEqual(events[-3:], [
+            ('finished', 'upload_media', None),
+            ('started', 'complete_session'),
+            ('finished', 'complete_session', None)])
+        parts = [event for event in events if event[0] == 'part']
+        self.assertEqual(len(parts), 16)
+        self.assertEqual(sum(size for part, number, size in parts), 1000)
+
+    def test_single_part(self):
+        self.uploader.s3 = MockS3Client()
+        self.uploader.chunk_size = 1000
+        self.uploader.upload_media()
+        self.assertIn(('part', 1, 1000), self.listener.events)
+
+    def test_stage_error(self):
+        self.uploader.s3 = None
+        with self.assertRaises(AttributeError):
+            self.uploader.upload_media()
+        stage, name, error = self.listener.events[-1]
+        self.assertEqual((stage, name), ('finished', 'upload_media'))
+        self.assertIsInstance(error, AttributeError)
+
+
+class TestPanoptoUploadSummary(MediaTestCase):
+
+    def test_summary(self):
+        summary = PanoptoUploadSummary()
+        self.uploader.listeners.append(summary)
+        self.uploader.s3 = MockS3Client(delay=0.001)
+        self.uploader.max_concurrency = 4
+        self.uploader.upload_media()
+
+        stats = summary.stats()
+        self.assertEqual(stats['parts'], 16)
+        self.assertEqual(stats['bytes_sent'], 1000)
+        self.assertEqual(stats['retries'], 0)
+        self.assertEqual(list(stats['stages']), ['upload_media'])
+        self.assertGreater(stats['throughput'], 0)
+        self.assertGreater(stats['part_seconds_max'], 0)
+        self.assertEqual(summary.parts_in_flight(), {})
+
+    def test_files(self):
+        summary = PanoptoUploadSummary()
+        self.uploader.listeners.append(summary)
+        self.uploader.s3 = MockS3Client()
+        self.uploader.input_file = None
+        self.uploader.add_file(self.tmp.name)
+        self.uploader.add_file(self.tmp.name, 'Secondary')
+        self.uploader.set_destination_attributes()
+        self.uploader.upload_media()
+
+        stats = summary.stats()
+        self.assertEqual(stats['parts'], 32)
+        self.assertEqual(stats['bytes_sent'], 2000)
+        self.assertIn((self.uploader.files[1].dest_filename, 16),
+                      summary.parts)
+        self.assertEqual(list(stats['stages']), ['upload_media'])
+
+    def test_retries(self):
+        summary = PanoptoUploadSummary()
+        summary.part_retried(None, 3, 1, ValueError(), 0.5)
+        summary.part_retried(None, 3, 2, ValueError(), 1.0)
+        self.assertEqual(summary.stats()['retries'], 2)
+
+    def test_rolling_throughput(self):
+        summary = PanoptoUploadSummary(window=10)
+        with patch('panopto.progress.time.monotonic') as clock:
+            clock.return_value = 0
+            summary.stage_started(None, 'upload_media')
+            summary.part_started(None, 1, 100)
+            summary.part_started(None, 2, 100)
+            clock.return_value = 5
+            summary.part_finished(None, 1, 100, 5)
+            self.assertEqual(summary.rolling_throughput(), 20)
+            self.assertEqual(summary.parts_in_flight(), {2: 5})
+
+            clock.return_value = 20
+            summary.part_finished(None, 3, 300, 3)
+            self.assertEqual(summary.rolling_throughput(), 30)
+            self.assertEqual(summary.throughput(), 20)
@@ -0,0 +1,421 @@
+from mock import patch
+import unittest
+import uuid
+
+from zeep.exceptions import Fault
+
+from panopto.session import (
+    PanoptoFolderIndex, PanoptoSessionCache, PanoptoSessionManager)
+from panopto.tests.patches import MockSoapClient, MockSoapService
+
+
+class TestPanoptoSessionManager(unittest.TestCase):
+
+    def test_clients_built_on_first_use(self):
+        with patch.object(PanoptoSessionManager, '_client') as client:
+            manager = PanoptoSessionManager(
+                'test.hosted.panopto.com', 'test', password='pw')
+            self.assertEqual(client.call_count, 0)
+
+            self.assertIs(manager.client['session'],
+                          manager.client['session'])
+            self.assertEqual(client.call_count, 1)
+            client.assert_called_with(
+                'test.hosted.panopto.com', 'SessionManagement', None)
+
+
+def paged_sessions(total, failing_page=None):
+    sessions = [{'Id': str(i)} for i in range(total)]
+
+    def get_sessions_list(auth, request, searchQuery):
+        if request['Pagination']['PageNumber'] == failing_page:
+            raise Fault('timed out')
+        size = request['Pagination']['MaxNumberResults']
+        start = request['Pagination']['PageNumber'] * size
+        return {'TotalNumberResults': total,
+                'Results': {'Session': sessions[start:start + size]}}
+    return get_sessions_list
+
+
+class TestSessionList(unittest.TestCase):
+
+    def manager(self, responses):
+        manager = PanoptoSessionManager(
+            'test.hosted.panopto.com', 'test', password='pw')
+        self.service = MockSoapService(responses)
+        manager.client['session'] = MockSoapClient(self.service)
+        return manager
+
+    def pages(self):
+        return [kwargs['request']['Pagination']['PageNumber']
+                for operation, kwargs in self.service.calls]
+
+    def test_get_session_list_all_pages(self):
+        manager = self.manager({'GetSessionsList': paged_sessions(250)})
+        sessions = manager.get_session_list('folder')
+        self.assertEqual([s['Id'] for s in sessions],
+                         [str(i) for i in range(250)])
+        self.assertEqual(self.pages(), [0, 1, 2])
+
+    def test_iter_session_list(self):
+        for prefetch in (True, False):
+            manager = self.manager({'GetSessionsList': paged_sessions(20)})
+            sessions = manager.iter_session_list(
+                'folder', page_size=10, prefetch=prefetch)
+            self.assertEqual(len(list(sessions)), 20)
+            # the last page is full, the total says there are no more
+            self.assertEqual(self.pages(), [0, 1])
+
+    def test_iter_session_list_sort(self):
+        manager = self.manager({'GetSessionsList': paged_sessions(1)})
+        list(manager.iter_session_list('folder', sort_by='Date',
+                                       sort_increasing=False))
+        request = self.service.calls[0][1]['request']
+        self.assertEqual(request['SortBy'], 'Date')
+        self.assertFalse(request['SortIncreasing'])
+
+    def test_iter_session_list_stops_early(self):
+        manager = self.manager({'GetSessionsList': paged_sessions(500)})
+        sessions = manager.iter_session_list('folder', prefetch=False)
+        self.assertEqual(next(sessions), {'Id': '0'})
+        sessions.close()
+        self.assertEqual(self.pages(), [0])
+
+    def test_empty(self):
+        manager = self.manager({'GetSessionsList': paged_sessions(0)})
+        self.assertEqual(manager.get_session_list('folder'), [])
+
+        manager = self.manager({'GetSessionsList': Fault('denied')})
+        self.assertEqual(manager.get_session_list('folder'), [])
+
+    def test_later_page_fault(self):
+        for prefetch in (True, False):
+            manager = self.manager(
+                {'GetSessionsList': paged_sessions(250, failing_page=1)})
+            sessions = manager.iter_session_list('folder', prefetch=prefetch)
+            with self.assertRaises(Fault):
+                list(sessions)
+
+
+def sessions_by_id(auth, sessionIds):
+    return [{'Id': id, 'MP4Url': 'https://{}.mp4'.format(id),
+             'ThumbUrl': 'https://{}.jpg'.format(id)}
+            for id in sessionIds['guid'] if id != 'missing']
+
+
+def panopto_ids(auth, sessionIds):
+    # Panopto answers with lower case, hyphenated guids
+    return sessions_by_id(
+        auth, {'guid': [str(uuid.UUID(id)) for id in sessionIds['guid']]})
+
+
+SESSION_ID = 'b7d3cbb4-8b9e-4c3f-9f0e-2a1d8d8f4c11'
+
+
+class TestSessionsById(unittest.TestCase):
+
+    def setUp(self):
+        self.manager = PanoptoSessionManager(
+            'test.hosted.panopto.com', 'test', password='pw')
+        self.service = MockSoapService({'GetSessionsById': sessions_by_id})
+        self.manager.client['session'] = MockSoapClient(self.service)
+
+    def batches(self):
+        return sorted(kwargs['sessionIds']['guid']
+                      for operation, kwargs in self.service.calls)
+
+    def test_get_sessions_by_id(self):
+        ids = [str(i) for i in range(250)]
+        sessions = self.manager.get_sessions_by_id(ids)
+        self.assertEqual(sorted(sessions), sorted(ids))
+        self.assertEqual(sessions['7']['MP4Url'], 'https://7.mp4')
+        self.assertEqual([len(batch) for batch in self.batches()],
+                         [100, 100, 50])
+
+    def test_batch_size(self):
+        ids = ['a', 'b', 'c', 'a', 'missing']
+        sessions = self.manager.get_sessions_by_id(
+            ids, batch_size=2, max_concurrency=1)
+        self.assertEqual(sorted(sessions), ['a', 'b', 'c'])
+        self.assertEqual(self.batches(), [['a', 'b'], ['c', 'missing']])
+
+    def test_urls(self):
+        self.assertEqual(self.manager.get_session_urls(['a', 'b']),
+                         {'a': 'https://a.mp4', 'b': 'https://b.mp4'})
+        self.assertEqual(self.manager.get_thumb_urls(['a']),
+                         {'a': 'https://a.jpg'})
+
+    def test_session_ids_sent_as_guids(self):
+        self.manager.move_sessions(['a', 'b'], 'folder')
+        operation, kwargs = self.service.calls[-1]
+        self.assertEqual(kwargs['sessionIds'], {'guid': ['a', 'b']})
+
+    def test_fault(self):
+        self.service.responses['GetSessionsById'] = Fault('denied')
+        self.assertEqual(self.manager.get_sessions_by_id(['a']), {})
+
+
+class TestPanoptoSessionCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = PanoptoSessionCache(max_size=2, ttl=60)
+        self.manager = PanoptoSessionManager(
+            'test.hosted.panopto.com', 'test', password='pw',
+            session_cache=self.cache)
+        self.service = MockSoapService({'GetSessionsById': sessions_by_id})
+        self.manager.client['session'] = MockSoapClient(self.service)
+
+    def test_hit(self):
+        self.assertEqual(self.manager.get_session_url('a'), 'https://a.mp4')
+        self.assertEqual(self.manager.get_thumb_url('a'), 'https://a.jpg')
+        self.assertEqual(len(self.service.calls), 1)
+        self.assertEqual(self.cache.stats(), {
+            'size': 1, 'hits': 1, 'misses': 1, 'evictions': 0})
+
+    def test_missing(self):
+        self.assertEqual(self.manager.get_session_url('missing'), '')
+        self.assertIsNone(self.manager.get_thumb_url('missing'))
+        self.assertEqual(len(self.service.calls), 2)
+
+    def test_only_misses_fetched(self):
+        self.manager.get_session_url('a')
+        sessions = self.manager.get_sessions_by_id(['a', 'b'])
+        self.assertEqual(sorted(sessions), ['a', 'b'])
+        self.assertEqual(
+            self.service.calls[-1][1]['sessionIds'], {'guid': ['b']})
+
+    def test_lru_eviction(self):
+        self.manager.get_sessions_by_id(['a', 'b'])
+        self.manager.get_session_url('a')
+        self.manager.get_session_url('c')
+        found, missing = self.cache.lookup(
+            ['a', 'b', 'c'], self.manager._cache_scope)
+        self.assertEqual(sorted(found), ['a', 'c'])
+        self.assertEqual(missing, ['b'])
+        self.assertEqual(self.cache.evictions, 1)
+
+    def test_ttl(self):
+        with patch('panopto.session.time.monotonic', return_value=0):
+            self.manager.get_session_url('a')
+        with patch('panopto.session.time.monotonic', return_value=61):
+            self.manager.get_session_url('a')
+        self.assertEqual(len(self.service.calls), 2)
+        self.assertEqual(self.cache.evictions, 1)
+
+    def test_move_sessions_invalidates(self):
+        self.manager.get_session_url('a')
+        self.manager.move_sessions(['a'], 'folder')
+        self.manager.get_session_url('a')
+        self.assertEqual(
+            [operation for operation, kwargs in self.service.calls],
+            ['GetSessionsById', 'MoveSessions', 'GetSessionsById'])
+
+    def test_id_formats(self):
+        self.service.responses['GetSessionsById'] = panopto_ids
+        self.manager.get_session_url(SESSION_ID.upper())
+        self.assertEqual(self.manager.get_thumb_url('{' + SESSION_ID + '}'),
+                         'https://{}.jpg'.format(SESSION_ID))
+        self.assertEqual(len(self.service.calls), 1)
+
+        self.manager.move_sessions([SESSION_ID.upper()], 'folder')
+        self.assertEqual(len(self.cache), 0)
+
+    def test_invalidated_after_move(self):
+        def move_sessions(auth, sessionIds, folderId):
+            # a lookup made while the move runs
+            self.manager.get_session_url('a')
+
+        self.service.responses['MoveSessions'] = move_sessions
+        self.manager.move_sessions(['a'], 'folder')
+        self.assertEqual(len(self.cache), 0)
+
+    def manager_for(self, username, password):
+        manager = PanoptoSessionManager(
+            'test.hosted.panopto.com', username, password=password,
+            session_cache=self.cache)
+        manager.client['session'] = MockSoapClient(self.service)
+        return manager
+
+    def test_scoped_by_identity(self):
+        self.cache.max_size = 10
+        self.manager.get_session_url('a')
+        for username, password in (('other', 'pw'), ('test', 'wrong')):
+            self.manager_for(username, password).get_session_url('a')
+        self.assertEqual(len(self.service.calls), 3)
+
+        self.manager_for('test', 'pw').get_session_url('a')
+        self.assertEqual(len(self.service.calls), 3)
+
+    def test_move_invalidates_every_scope(self):
+        other = self.manager_for('other', 'pw')
+        self.manager.get_session_url('a')
+        other.get_session_url('a')
+        self.manager.move_sessions(['a'], 'folder')
+        self.assertEqual(len(self.cache), 0)
+
+
+def paged_folders(total, parent='parent'):
+    folders = [{'Id': 'id-{}'.format(i), 'Name': 'folder {}'.format(i),
+                'ParentFolder': parent} for i in range(total)]
+
+    def get_creator_folders_list(auth, request):
+        size = request['Pagination']['MaxNumberResults']
+        start = request['Pagination']['PageNumber'] * size
+        return {'TotalNumberResults': total,
+                'Results': {'Folder': folders[start:start + size]}}
+    return get_creator_folders_list
+
+
+class TestPanoptoFolderIndex(unittest.TestCase):
+
+    def manager(self, folder_index=None):
+        manager = PanoptoSessionManager(
+            'test.hosted.panopto.com', 'test', password='pw',
+            folder_index=folder_index)
+        self.service = MockSoapService({
+            'GetCreatorFoldersList': paged_folders(150),
+            'AddFolder': {'Id': 'new-id'},
+        })
+        manager.client['session'] = MockSoapClient(self.service)
+        return manager
+
+    def operations(self):
+        return [operation for operation, kwargs in self.service.calls]
+
+    def test_get_folder_all_pages(self):
+        manager = self.manager()
+        self.assertEqual(manager.get_folder('parent', 'folder 120'),
+                         'id-120')
+        self.assertEqual(manager.get_folder('parent', 'nope'), '')
+        # without an index, every lookup lists the parent again
+        self.assertEqual(len(self.service.calls), 4)
+
+    def test_indexed(self):
+        index = PanoptoFolderIndex()
+        manager = self.manager(index)
+        self.assertEqual(manager.get_folder('parent', 'folder 1'), 'id-1')
+        self.assertEqual(manager.get_folder('parent', 'folder 149'),
+                         'id-149')
+        self.assertEqual(manager.get_folder('parent', 'nope'), '')
+        self.assertEqual(len(self.service.calls), 2)
+        self.assertEqual(
+            len(index.children('parent', manager._cache_scope)), 150)
+
+    def test_add_folder(self):
+        manager = self.manager(PanoptoFolderIndex())
+        self.assertEqual(manager.get_folder('parent', 'new'), '')
+        self.assertEqual(manager.add_folder('new', 'parent'), 'new-id')
+        self.assertEqual(manager.get_folder('parent', 'new'), 'new-id')
+        self.assertEqual(self.operations(), [
+            'GetCreatorFoldersList', 'GetCreatorFoldersList', 'AddFolder'])
+
+    def test_stale_miss_refreshes(self):
+        manager = self.manager(PanoptoFolderIndex(max_age=60))
+        with patch('panopto.session.time.monotonic', return_value=0):
+            manager.get_folder('parent', 'nope')
+        with patch('panopto.session.time.monotonic', return_value=30):
+            manager.get_folder('parent', 'nope')
+            self.assertEqual(len(self.service.calls), 2)
+        with patch('panopto.session.time.monotonic', return_value=61):
+            self.assertEqual(manager.get_folder('parent', 'folder 0'),
+                             'id-0')
+            manager.get_folder('parent', 'nope')
+        self.assertEqual(len(self.service.calls), 4)
+
+    def test_invalidate(self):
+        index = PanoptoFolderIndex()
+        index.load('a', [{'Id': '1', 'Name': 'x'}])
+        index.load('b', [{'Id': '2', 'Name': 'x'}])
+        index.load('a', [{'Id': '3', 'Name': 'x'}], scope='other')
+        index.invalidate('a')
+        self.assertIsNone(index.get('a', 'x'))
+        self.assertIsNone(index.get('a', 'x', scope='other'))
+        self.assertEqual(index.get('b', 'x'), '2')
+        self.assertTrue(index.stale('a'))
+        index.invalidate()
+        self.assertEqual(index.children('b'), [])
+
+    def test_scoped_by_identity(self):
+        index = PanoptoFolderIndex()
+        self.assertEqual(
+            self.manager(index).get_folder('parent', 'folder 1'), 'id-1')
+
+        # another user is not allowed to create in the same folders
+        other = PanoptoSessionManager(
+            'test.hosted.panopto.com', 'other', password='pw',
+            folder_index=index)
+        service = MockSoapService(
+            {'GetCreatorFoldersList': paged_folders(0)})
+        other.client['session'] = MockSoapClient(service)
+        self.assertEqual(other.get_folder('parent', 'folder 1'), '')
+        self.assertEqual(len(service.calls), 1)
+
+    def test_fault(self):
+        manager = self.manager(PanoptoFolderIndex())
+        self.service.responses['GetCreatorFoldersList'] = Fault('denied')
+        self.assertEqual(manager.get_folder('parent', 'folder 0'), '')
+
+
+ACCESS = {
+    'source': {'GroupsWithCreatorAccess': {'guid': ['g1', 'g2', 'g3']}},
+    'target': {'GroupsWithCreatorAccess': {'guid': ['g2']}},
+    'empty': {'GroupsWithCreatorAccess': None},
+}
+
+
+def folder_access(auth, folderId):
+    if folderId not in ACCESS:
+        raise Fault('not found')
+    return ACCESS[folderId]
+
+
+class TestFolderAccessSync(unittest.TestCase):
+
+    def setUp(self):
+        self.manager = PanoptoSessionManager(
+            'test.hosted.panopto.com', 'test', password='pw')
+        self.service = MockSoapService({
+            'GetFolderAccessDetails': folder_access})
+        self.manager.client['access'] = MockSoapClient(self.service)
+
+    def grants(self):
+        return sorted((kwargs['folderId'], kwargs['groupId'])
+                      for operation, kwargs in self.service.calls
+                      if operation == 'GrantGroupAccessToFolder')
+
+    def test_inherit_folder_access(self):
+        report = self.manager.inherit_folder_access('source', 'target')
+        self.assertTrue(report.succeeded)
+        self.assertEqual(sorted(report.granted), ['g1', 'g3'])
+        self.assertEqual(report.present, ['g2'])
+        self.assertEqual(self.grants(),
+                         [('target', 'g1'), ('target', 'g3')])
+
+    def test_sync_folder_access(self):
+        reports = self.manager.sync_folder_access(
+            [('source', 'target'), ('source', 'empty'),
+             ('empty', 'target')])
+        self.assertEqual([r.target for r in reports],
+                         ['target', 'empty', 'target'])
+        self.assertEqual(sorted(reports[1].granted), ['g1', 'g2', 'g3'])
+        self.assertEqual(reports[2].granted, [])
+        self.assertTrue(all(r.succeeded for r in reports))
+
+        details = [kwargs['folderId'] for operation, kwargs
+                   in self.service.calls
+                   if operation == 'GetFolderAccessDetails']
+        self.assertEqual(sorted(details), ['empty', 'source', 'target'])
+        self.assertEqual(len(self.grants()), 5)
+
+    def test_unreadable_folder(self):
+        report = self.manager.inherit_folder_access('missing', 'target')
+        self.assertFalse(report.succeeded)
+        self.assertEqual(report.error,
+                         'Failed to read access details for missing')
+        self.assertEqual(self.grants(), [])
+
+    def test_failed_grant(self):
+        self.service.responses['GrantGroupAccessToFolder'] = Fault('denied')
+        report = self.manager.inherit_folder_access('source', 'target')
+        self.assertFalse(report.succeeded)
+        self.assertEqual(sorted(report.failed), ['g1', 'g3'])
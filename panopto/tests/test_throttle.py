@@ -0,0 +1,85 @@
+import threading
+import time
+import unittest
+
+from panopto.tests.patches import MockS3Client
+from panopto.tests.test_upload import MediaTestCase
+from panopto.throttle import MIN_BURST, PanoptoBandwidthLimiter
+
+
+class TestPanoptoBandwidthLimiter(unittest.TestCase):
+
+    def test_unlimited(self):
+        limiter = PanoptoBandwidthLimiter()
+        self.assertEqual(limiter.acquire(10 ** 9), 10 ** 9)
+
+    def test_grants_at_most_burst(self):
+        limiter = PanoptoBandwidthLimiter(rate=10 ** 9, burst=1000)
+        self.assertEqual(limiter.acquire(5000), 1000)
+        self.assertEqual(limiter.acquire(10), 10)
+
+    def test_default_burst(self):
+        limiter = PanoptoBandwidthLimiter(rate=1000)
+        self.assertEqual(limiter._capacity(), MIN_BURST)
+        limiter.rate = 100 * MIN_BURST
+        self.assertEqual(limiter._capacity(), 5 * MIN_BURST)
+
+    def test_rate(self):
+        limiter = PanoptoBandwidthLimiter(rate=100000, burst=5000)
+        started = time.monotonic()
+        sent = 0
+        while sent < 20000:
+            sent += limiter.acquire(20000 - sent)
+        # the bucket starts empty, so 20000 bytes take 0.2s
+        self.assertGreaterEqual(time.monotonic() - started, 0.18)
+
+    def test_shared(self):
+        limiter = PanoptoBandwidthLimiter(rate=100000, burst=1000)
+
+        def send():
+            sent = 0
+            while sent < 5000:
+                sent += limiter.acquire(5000 - sent)
+
+        threads = [threading.Thread(target=send) for i in range(4)]
+        started = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertGreaterEqual(time.monotonic() - started, 0.18)
+
+    def test_raise_rate_wakes_waiters(self):
+        limiter = PanoptoBandwidthLimiter(rate=1, burst=1000)
+        granted = []
+        thread = threading.Thread(
+            target=lambda: granted.append(limiter.acquire(1000)))
+        thread.start()
+        time.sleep(0.05)
+        limiter.rate = 10 ** 9
+        thread.join(timeout=5)
+        self.assertEqual(granted, [1000])
+
+
+class TestThrottledUpload(MediaTestCase):
+
+    def test_upload_media(self):
+        self.uploader.s3 = MockS3Client()
+        self.uploader.max_concurrency = 4
+        self.uploader.bandwidth_limiter = PanoptoBandwidthLimiter(
+            rate=20000, burst=100)
+
+        started = time.monotonic()
+        self.uploader.upload_media()
+        self.assertGreaterEqual(time.monotonic() - started, 0.045)
+        self.assertUploaded(self.uploader.s3)
+
+    def test_put_object(self):
+        self.uploader.s3 = MockS3Client()
+        self.uploader.chunk_size = 1000
+        self.uploader.bandwidth_limiter = PanoptoBandwidthLimiter(
+            rate=10 ** 6, burst=100)
+
+        self.uploader.upload_media()
+        key = self.uploader.target.file_key('foo.mp4')
+        self.assertEqual(self.uploader.s3.objects[key], self.data)
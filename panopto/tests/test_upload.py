@@ -1,6 +1,22 @@
+import base64
+import hashlib
+from io import BytesIO
+import mmap
+import os
+import tempfile
 import unittest
+from urllib.parse import parse_qs, urlsplit
+import weakref
 
-from panopto.upload import PanoptoUploadTarget, PanoptoUpload
+from mock import patch
+
+from panopto.progress import PanoptoUploadListener
+from panopto.tests.patches import MockResponse, MockS3Client, MockSession
+from panopto.tests.upload_service import StandIn, StandInHandler
+from panopto.upload import (
+    PanoptoUploadTarget, PanoptoUpload, PanoptoUploadError,
+    PanoptoUploadJournal, _PartReader, _PartPlanner, _composite_etag,
+    _etag_digest, _transient, MAX_PARTS)
 
 
 class TestPanoptoUploadTarget(unittest.TestCase):
@@ -20,9 +36,784 @@ class TestPanoptoUploadTarget(unittest.TestCase):
         self.assertEqual(self.obj.file_key('foo.mp4'),
                          'Upload/ac6bef38-19a8-46ce-996a-e863012b0747/foo.mp4')
 
+    def test_http_target(self):
+        target = PanoptoUploadTarget(
+            'upload-id', 'http://127.0.0.1:8080/Panopto/Upload/abc')
+        self.assertEqual(target.host(), 'http://127.0.0.1:8080')
+        self.assertEqual(target.file_key('foo.mp4'), 'Upload/abc/foo.mp4')
+
     def test_pypanopto_manifest(self):
         uploader = PanoptoUpload()
         manifest = uploader._panopto_manifest('/tmp', u'foo', u'foo bar')
         self.assertTrue(b'<Title>foo</Title>' in manifest)
         self.assertTrue(b'<File>/tmp</File>' in manifest)
         self.assertTrue(b'<Description>foo bar</Description>' in manifest)
+
+
+class TestPartReader(unittest.TestCase):
+
+    def test_read(self):
+        source = bytearray(b'0123456789')
+        reader = _PartReader(memoryview(source)[2:8])
+        self.assertEqual(len(reader), 6)
+        self.assertEqual(reader.read(4), b'2345')
+        self.assertEqual(reader.read(), b'67')
+        self.assertEqual(reader.read(), b'')
+
+        reader.seek(0)
+        buffer = bytearray(4)
+        self.assertEqual(reader.readinto(buffer), 4)
+        self.assertEqual(buffer, b'2345')
+        self.assertEqual(reader.seek(-1, os.SEEK_END), 5)
+        self.assertEqual(reader.read(), b'7')
+
+    def test_limiter(self):
+        class Limiter(object):
+            def __init__(self):
+                self.asked = []
+
+            def acquire(self, size):
+                self.asked.append(size)
+                return min(size, 3)
+
+        source = bytearray(b'0123456789')
+        limiter = Limiter()
+        reader = _PartReader(memoryview(source), limiter)
+        self.assertEqual(reader.read(5), b'012')
+        buffer = bytearray(8)
+        self.assertEqual(reader.readinto(buffer), 3)
+        self.assertEqual(buffer[:3], b'345')
+        self.assertEqual(reader.read(), b'6789')
+        self.assertEqual(limiter.asked, [5, 7, 4, 1])
+
+    def test_close_releases_view(self):
+        source = bytearray(b'0123456789')
+        reader = _PartReader(memoryview(source)[2:8])
+        reader.close()
+
+        # the underlying buffer can only be resized once nothing
+        # else holds a view on it
+        source.extend(b'x')
+        self.assertEqual(len(source), 11)
+
+
+class TestPartPlanner(unittest.TestCase):
+
+    def test_fixed(self):
+        plan = list(_PartPlanner(250, 100))
+        self.assertEqual(plan, [(1, 0, 100), (2, 100, 100), (3, 200, 50)])
+
+    def test_exact(self):
+        plan = list(_PartPlanner(200, 100))
+        self.assertEqual(plan, [(1, 0, 100), (2, 100, 100)])
+
+    def test_part_limit(self):
+        plan = list(_PartPlanner(MAX_PARTS * 3 + 1, 1))
+        self.assertEqual(len(plan), MAX_PARTS)
+        self.assertEqual(plan[-1][0], MAX_PARTS)
+        self.assertEqual(plan[-1][1] + plan[-1][2], MAX_PARTS * 3 + 1)
+
+    def test_replay_planned(self):
+        planner = _PartPlanner(250, 100, planned={2: (60, 60), 1: (0, 60)})
+        self.assertEqual(list(planner),
+                         [(1, 0, 60), (2, 60, 60), (3, 120, 100),
+                          (4, 220, 30)])
+
+    def test_adaptive(self):
+        mb = 1024 * 1024
+        planner = _PartPlanner(
+            1000 * mb, 10 * mb, adaptive=True, target_seconds=1,
+            min_size=5 * mb, max_size=30 * mb)
+        parts = iter(planner)
+
+        self.assertEqual(next(parts)[2], 10 * mb)
+
+        # fast link, parts grow but at most double each time
+        planner.record(10 * mb, 0.1)
+        self.assertEqual(next(parts)[2], 20 * mb)
+        planner.record(20 * mb, 0.1)
+        self.assertEqual(next(parts)[2], 30 * mb)
+
+        # slow link, parts shrink but at most halve and not below min
+        planner.throughput = mb
+        self.assertEqual(next(parts)[2], 15 * mb)
+        self.assertEqual(next(parts)[2], 7 * mb + mb // 2)
+        self.assertEqual(next(parts)[2], 5 * mb)
+
+
+class MediaTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.NamedTemporaryFile(suffix='.mp4', delete=False)
+        self.data = os.urandom(1000)
+        self.tmp.write(self.data)
+        self.tmp.close()
+
+        self.uploader = PanoptoUpload()
+        self.uploader.input_file = self.tmp.name
+        self.uploader.dest_filename = 'foo.mp4'
+        self.uploader.chunk_size = 64
+
+        # small parts keep the tests fast, MockS3Client enforces the
+        # lowered minimum as S3 does its own
+        patcher = patch('panopto.upload.MIN_PART_SIZE', 64)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.uploader.target = PanoptoUploadTarget(
+            '39fe1efd-1f0e-46d4-b497-2643443aae8a',
+            'https://test.hosted.panopto.com/Panopto/'
+            'Upload/ac6bef38-19a8-46ce-996a-e863012b0747')
+
+    def tearDown(self):
+        os.remove(self.tmp.name)
+
+    def assertUploaded(self, s3):
+        numbers = [part['PartNumber'] for part in s3.completed]
+        self.assertEqual(numbers, list(range(1, 17)))
+        self.assertEqual(
+            b''.join(s3.parts[number] for number in numbers), self.data)
+
+
+class TestPanoptoUploadMedia(MediaTestCase):
+
+    def test_upload_media(self):
+        self.uploader.s3 = MockS3Client()
+        self.uploader.upload_media()
+        self.assertUploaded(self.uploader.s3)
+        self.assertEqual(self.uploader.s3.max_in_flight, 1)
+
+    def test_upload_media_concurrently(self):
+        self.uploader.s3 = MockS3Client(delay=0.01)
+        self.uploader.max_concurrency = 4
+        self.uploader.upload_media()
+        self.assertUploaded(self.uploader.s3)
+        self.assertEqual(self.uploader.s3.max_in_flight, 4)
+
+    def test_part_size(self):
+        mb = 1024 * 1024
+        self.uploader.chunk_size = None
+        self.assertEqual(self.uploader._part_size(1000), 13107200)
+        self.assertEqual(self.uploader._part_size(200 * 1000 ** 3), 20 * mb)
+        with self.assertRaises(ValueError):
+            self.uploader._part_size(MAX_PARTS * 5 * 1024 * mb + 1)
+
+    def test_parts_too_small(self):
+        self.uploader.s3 = MockS3Client()
+        self.uploader.chunk_size = 63
+        with self.assertRaises(ValueError):
+            self.uploader.upload_media()
+        self.assertEqual(self.uploader.s3.parts, {})
+
+        self.uploader.input_file = BytesIO(self.data)
+        with self.assertRaises(ValueError):
+            self.uploader.upload_media()
+        self.assertEqual(self.uploader.s3.parts, {})
+
+    def test_single_part(self):
+        self.uploader.s3 = MockS3Client()
+        self.uploader.chunk_size = 1000
+        self.uploader.upload_media()
+        self.assertIsNone(self.uploader.s3.completed)
+        self.assertEqual(
+            self.uploader.s3.objects[
+                self.uploader.target.file_key('foo.mp4')],
+            self.data)
+
+    def test_empty_file(self):
+        open(self.tmp.name, 'wb').close()
+        self.uploader.s3 = MockS3Client()
+        self.uploader.upload_media()
+        self.assertEqual(list(self.uploader.s3.objects.values()), [b''])
+
+    def test_parts_mapped_as_sent(self):
+        windows, live = [], []
+        real_mmap = mmap.mmap
+
+        def window(fileno, length, **kwargs):
+            mapped = real_mmap(fileno, length, **kwargs)
+            windows.append(weakref.ref(mapped))
+            live.append(sum(1 for ref in windows if ref() is not None))
+            self.assertEqual(kwargs['offset'] % mmap.ALLOCATIONGRANULARITY,
+                             0)
+            return mapped
+
+        self.uploader.s3 = MockS3Client(delay=0.01)
+        self.uploader.max_concurrency = 4
+        with patch.object(mmap, 'mmap', side_effect=window):
+            self.uploader.upload_media()
+        self.assertUploaded(self.uploader.s3)
+
+        # a window per part, no more mapped at once than are in flight,
+        # and none left once the upload is done
+        self.assertEqual(len(windows), 16)
+        self.assertLessEqual(max(live), 4)
+        self.assertEqual([ref() for ref in windows], [None] * 16)
+
+    def test_max_buffer_size(self):
+        self.uploader.s3 = MockS3Client(delay=0.01)
+        self.uploader.max_concurrency = 4
+        self.uploader.max_buffer_size = 128
+        self.uploader.upload_media()
+        self.assertUploaded(self.uploader.s3)
+        self.assertEqual(self.uploader.s3.max_in_flight, 2)
+
+
+class ReadOnlyStream(object):
+
+    def __init__(self, data):
+        self.stream = BytesIO(data)
+
+    def read(self, size=-1):
+        return self.stream.read(min(size, 10))
+
+
+class NonBlockingStream(ReadOnlyStream):
+
+    '''
+        Has nothing to read on every other call, as a non-blocking pipe
+        or socket might.
+    '''
+
+    def __init__(self, data):
+        super(NonBlockingStream, self).__init__(data)
+        self.ready = False
+
+    def read(self, size=-1):
+        self.ready = not self.ready
+        if not self.ready:
+            return None
+        return super(NonBlockingStream, self).read(size)
+
+
+class NonBlockingRawStream(NonBlockingStream):
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        if data is None:
+            return None
+        buffer[:len(data)] = data
+        return len(data)
+
+
+class TestPanoptoUploadStream(MediaTestCase):
+
+    def test_file_like(self):
+        self.uploader.s3 = MockS3Client()
+        self.uploader.input_file = BytesIO(self.data)
+        self.uploader.upload_media()
+        self.assertUploaded(self.uploader.s3)
+
+    def test_read_only(self):
+        self.uploader.s3 = MockS3Client()
+        self.uploader.input_file = ReadOnlyStream(self.data)
+        self.uploader.upload_media()
+        self.assertUploaded(self.uploader.s3)
+
+    @patch('panopto.upload._POLL_INTERVAL', 0)
+    def test_non_blocking(self):
+        for stream in (NonBlockingStream, NonBlockingRawStream):
+            self.uploader.s3 = MockS3Client()
+            self.uploader.input_file = stream(self.data)
+            self.uploader.upload_media()
+            self.assertUploaded(self.uploader.s3)
+
+    def test_empty_chunks(self):
+        self.uploader.s3 = MockS3Client()
+        self.uploader.input_file = iter(
+            [b'', self.data[:500], b'', self.data[500:], b''])
+        self.uploader.upload_media()
+        self.assertUploaded(self.uploader.s3)
+
+    def test_iterator(self):
+        self.uploader.s3 = MockS3Client(delay=0.01)
+        self.uploader.max_concurrency = 3
+        self.uploader.input_file = (
+            self.data[i:i + 100] for i in range(0, len(self.data), 100))
+        self.uploader.upload_media()
+        self.assertUploaded(self.uploader.s3)
+        self.assertEqual(self.uploader.s3.max_in_flight, 3)
+
+    def test_buffer(self):
+        self.uploader.s3 = MockS3Client()
+        self.uploader.input_file = bytearray(self.data)
+        self.uploader.upload_media()
+        self.assertUploaded(self.uploader.s3)
+
+    def test_open_file(self):
+        self.uploader.s3 = MockS3Client()
+        with open(self.tmp.name, 'rb') as f:
+            self.uploader.input_file = f
+            self.uploader.upload_media()
+        self.assertUploaded(self.uploader.s3)
+
+    def test_small_stream(self):
+        self.uploader.s3 = MockS3Client()
+        self.uploader.chunk_size = 2000
+        self.uploader.input_file = iter([self.data])
+        self.uploader.upload_media()
+        self.assertIsNone(self.uploader.s3.completed)
+        self.assertEqual(list(self.uploader.s3.objects.values()),
+                         [self.data])
+
+    def test_destination_attributes(self):
+        self.uploader.input_file = BytesIO(self.data)
+        self.uploader.filename = 'lecture.mov'
+        self.uploader.set_destination_attributes()
+        self.assertEqual(self.uploader.title, 'lecture')
+        self.assertTrue(self.uploader.dest_filename.endswith('.mov'))
+
+
+class TestPanoptoUploadIntegrity(MediaTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.uploader.verify_integrity = True
+
+    def content_md5(self, data):
+        return base64.b64encode(hashlib.md5(data).digest()).decode('ascii')
+
+    def test_etag_digest(self):
+        digest = hashlib.md5(b'media').digest()
+        self.assertEqual(_etag_digest('"{}"'.format(digest.hex())), digest)
+        self.assertIsNone(_etag_digest('"{}-2"'.format(digest.hex())))
+        self.assertIsNone(_etag_digest(None))
+        self.assertEqual(
+            _composite_etag([digest, digest]),
+            '{}-2'.format(hashlib.md5(digest + digest).hexdigest()))
+
+    def test_content_md5(self):
+        s3 = self.uploader.s3 = MockS3Client(md5_etags=True)
+        self.uploader.max_concurrency = 4
+        self.uploader.upload_media()
+        self.assertUploaded(s3)
+        for number, data in s3.parts.items():
+            self.assertEqual(s3.content_md5[number], self.content_md5(data))
+
+    def test_stream(self):
+        s3 = self.uploader.s3 = MockS3Client(md5_etags=True)
+        self.uploader.input_file = ReadOnlyStream(self.data)
+        self.uploader.upload_media()
+        self.assertUploaded(s3)
+        self.assertEqual(s3.content_md5[16], self.content_md5(s3.parts[16]))
+
+    def test_single_part(self):
+        s3 = self.uploader.s3 = MockS3Client(md5_etags=True)
+        self.uploader.chunk_size = 1000
+        self.uploader.upload_media()
+        self.assertEqual(list(s3.content_md5.values()),
+                         [self.content_md5(self.data)])
+
+        self.uploader.s3 = MockS3Client(md5_etags=True, corrupt=['object'])
+        with self.assertRaises(PanoptoUploadError):
+            self.uploader.upload_media()
+
+    def test_part_mismatch(self):
+        s3 = self.uploader.s3 = MockS3Client(md5_etags=True, corrupt=[3])
+        with self.assertRaises(PanoptoUploadError):
+            self.uploader.upload_media()
+        self.assertIsNone(s3.completed)
+
+    def test_composite_mismatch(self):
+        self.uploader.s3 = MockS3Client(md5_etags=True, corrupt=['complete'])
+        with self.assertRaises(PanoptoUploadError):
+            self.uploader.upload_media()
+
+    def test_off_by_default(self):
+        s3 = self.uploader.s3 = MockS3Client(md5_etags=True, corrupt=[3])
+        self.uploader.verify_integrity = False
+        self.uploader.upload_media()
+        self.assertEqual(set(s3.content_md5.values()), {None})
+
+
+class TestPanoptoUploadRetry(MediaTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.uploader.retry_jitter = 0
+        patcher = patch('panopto.upload.time.sleep')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.delays = []
+        delays = self.delays
+
+        class Delays(PanoptoUploadListener):
+            def part_retried(self, upload, part_number, attempt, error,
+                             delay):
+                delays.append(delay)
+
+        self.uploader.listeners.append(Delays())
+
+    def unavailable(self):
+        from botocore.exceptions import ClientError
+        return ClientError({
+            'Error': {'Code': 'ServiceUnavailable'},
+            'ResponseMetadata': {'HTTPStatusCode': 503}}, 'UploadPart')
+
+    def test_transient(self):
+        from botocore.exceptions import ClientError, EndpointConnectionError
+
+        def client_error(code, status):
+            return ClientError({
+                'Error': {'Code': code},
+                'ResponseMetadata': {'HTTPStatusCode': status}}, 'UploadPart')
+
+        self.assertTrue(_transient(self.unavailable()))
+        self.assertTrue(_transient(client_error('SlowDown', 503)))
+        self.assertTrue(_transient(client_error('RequestTimeout', 400)))
+        self.assertTrue(_transient(client_error('InternalError', 500)))
+        self.assertTrue(_transient(
+            EndpointConnectionError(endpoint_url='https://s3')))
+        self.assertFalse(_transient(client_error('NoSuchUpload', 404)))
+        self.assertFalse(_transient(client_error('AccessDenied', 403)))
+        self.assertFalse(_transient(ValueError()))
+
+    def test_retry_part(self):
+        from botocore.exceptions import ConnectionClosedError
+
+        s3 = self.uploader.s3 = MockS3Client(failures={
+            3: [self.unavailable(),
+                ConnectionClosedError(endpoint_url='https://s3')]})
+        self.uploader.upload_media()
+
+        self.assertUploaded(s3)
+        self.assertEqual(self.uploader.retries, 2)
+        self.assertEqual(self.uploader.bytes_wasted, 20)
+        self.assertEqual(self.delays, [0.5, 1.0])
+        self.assertEqual(s3.aborted, [])
+
+    def test_retry_put_object(self):
+        s3 = self.uploader.s3 = MockS3Client(failures={
+            self.uploader.target.file_key('foo.mp4'): [self.unavailable()]})
+        self.uploader.chunk_size = 1000
+        self.uploader.upload_media()
+        self.assertEqual(list(s3.objects.values()), [self.data])
+        self.assertEqual(self.uploader.retries, 1)
+
+    def test_retry_manifest(self):
+        self.uploader.set_destination_attributes()
+        key = self.uploader.target.file_key(
+            '{}.xml'.format(self.uploader.uuid))
+        s3 = self.uploader.s3 = MockS3Client(
+            failures={key: [self.unavailable()]})
+        self.uploader.upload_manifest()
+        self.assertIn(b'<Session', s3.objects[key])
+        self.assertEqual(s3.content_types[key], 'text/xml')
+        self.assertEqual(self.uploader.retries, 1)
+
+    def test_max_retry_delay(self):
+        self.uploader.part_retries = 6
+        self.uploader.max_retry_delay = 3
+        self.uploader.s3 = MockS3Client(
+            failures={3: [self.unavailable()] * 6})
+        self.uploader.upload_media()
+        self.assertEqual(self.delays, [0.5, 1.0, 2.0, 3, 3, 3])
+
+    def test_retries_exhausted(self):
+        errors = [self.unavailable() for attempt in range(4)]
+        s3 = self.uploader.s3 = MockS3Client(failures={3: errors})
+        with self.assertRaises(Exception) as raised:
+            self.uploader.upload_media()
+        self.assertIs(raised.exception, errors[-1])
+        self.assertEqual(self.uploader.retries, 3)
+        self.assertEqual(s3.aborted, ['upload-1'])
+        self.assertIsNone(s3.completed)
+
+    def test_retry_budget(self):
+        self.uploader.retry_budget = 2
+        s3 = self.uploader.s3 = MockS3Client(failures={
+            2: [self.unavailable()], 3: [self.unavailable()] * 2})
+        with self.assertRaises(Exception):
+            self.uploader.upload_media()
+        self.assertEqual(self.uploader.retries, 2)
+        self.assertEqual(s3.aborted, ['upload-1'])
+
+    def test_permanent_failure(self):
+        from botocore.exceptions import ClientError
+
+        s3 = self.uploader.s3 = MockS3Client(failures={3: [ClientError(
+            {'Error': {'Code': 'NoSuchUpload'},
+             'ResponseMetadata': {'HTTPStatusCode': 404}}, 'UploadPart')]})
+        self.uploader.max_concurrency = 4
+        with self.assertRaises(ClientError):
+            self.uploader.upload_media()
+        self.assertEqual(self.uploader.retries, 0)
+        self.assertEqual(s3.aborted, ['upload-1'])
+
+    def test_stream_aborted(self):
+        s3 = self.uploader.s3 = MockS3Client(
+            failures={3: [self.unavailable()] * 4})
+        self.uploader.input_file = ReadOnlyStream(self.data)
+        with self.assertRaises(Exception):
+            self.uploader.upload_media()
+        self.assertEqual(s3.aborted, ['upload-1'])
+
+    def test_integrity_failure_aborted(self):
+        s3 = self.uploader.s3 = MockS3Client(md5_etags=True, corrupt=[3])
+        self.uploader.verify_integrity = True
+        with self.assertRaises(PanoptoUploadError):
+            self.uploader.upload_media()
+        self.assertEqual(self.uploader.retries, 0)
+        self.assertEqual(s3.aborted, ['upload-1'])
+
+
+SLOW_DOWN = '''<?xml version="1.0" encoding="UTF-8"?>
+<Error><Code>SlowDown</Code><Message>Reduce your request rate</Message>
+</Error>'''
+
+
+class FlakyStandInHandler(StandInHandler):
+
+    '''
+        Fails the first request to start the upload and the first to
+        send part 1 with a 503 SlowDown, and the first to send part 2
+        by closing the connection.
+    '''
+
+    def _fail(self, name):
+        if name not in self.server.failures:
+            return False
+        self._read_body()
+        if self.server.failures.pop(name) == 'reset':
+            self.close_connection = True
+        else:
+            self._respond(503, SLOW_DOWN)
+        return True
+
+    def do_POST(self):
+        if not self._fail(urlsplit(self.path).query):
+            super().do_POST()
+
+    def do_PUT(self):
+        query = parse_qs(urlsplit(self.path).query)
+        if not self._fail(query.get('partNumber', [''])[0]):
+            super().do_PUT()
+
+
+class TestPanoptoUploadBotocore(MediaTestCase):
+
+    def test_retries_counted(self):
+        retried = []
+
+        class Retries(PanoptoUploadListener):
+            def part_retried(self, upload, part_number, attempt, error,
+                             delay):
+                retried.append(part_number)
+
+        with StandIn(FlakyStandInHandler) as stand_in:
+            stand_in.server.failures = {
+                'uploads': 'slow', '1': 'slow', '2': 'reset'}
+            self.uploader.target = PanoptoUploadTarget(
+                self.uploader.target.upload_id,
+                'http://{}/Panopto/Upload/{}'.format(
+                    stand_in.address(), self.uploader.target.upload_id))
+            self.uploader.create_bucket()
+            self.uploader.max_concurrency = 1
+            self.uploader.retry_delay = 0
+            self.uploader.listeners.append(Retries())
+            self.uploader.upload_media()
+
+        self.assertEqual(stand_in.server.failures, {})
+        self.assertEqual(self.uploader.retries, 3)
+        self.assertEqual(retried, [None, 1, 2])
+
+
+class TestPanoptoUploadFiles(MediaTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.screen = os.urandom(300)
+        self.captions = b'1\n00:00:00,000 --> 00:00:02,000\nHello\n'
+        with tempfile.NamedTemporaryFile(
+                suffix='.mov', delete=False) as screen:
+            screen.write(self.screen)
+        self.addCleanup(os.remove, screen.name)
+
+        self.uploader.input_file = None
+        self.uploader.title = None
+        self.uploader.add_file(self.tmp.name)
+        self.uploader.add_file(screen.name, 'Secondary', start=1.5)
+        self.uploader.add_file(BytesIO(self.captions), 'Caption',
+                               filename='captions.srt')
+
+    def test_destination_attributes(self):
+        self.uploader.set_destination_attributes()
+        uuid = self.uploader.uuid
+        self.assertEqual(
+            [media_file.dest_filename for media_file in self.uploader.files],
+            [uuid + '-1.mp4', uuid + '-2.mov', uuid + '-3.srt'])
+        self.assertEqual(self.uploader.dest_filename, uuid + '-1.mp4')
+        self.assertEqual(self.uploader.title,
+                         os.path.splitext(os.path.basename(self.tmp.name))[0])
+
+    def test_one_primary(self):
+        self.uploader.files[1].stream_type = 'Primary'
+        with self.assertRaises(ValueError):
+            self.uploader.set_destination_attributes()
+        with self.assertRaises(ValueError):
+            self.uploader.add_file(self.tmp.name, 'Tertiary')
+
+    def test_manifest(self):
+        self.uploader.set_destination_attributes()
+        uuid = self.uploader.uuid
+        manifest = self.uploader._panopto_manifest(
+            self.uploader.dest_filename, 'foo', '', self.uploader.files)
+
+        self.assertIn('<Video><Start>PT0S</Start><File>{}-1.mp4</File>'
+                      '<Type>Primary</Type></Video>'.format(uuid).encode(),
+                      manifest)
+        self.assertIn('<Video><Start>PT1.5S</Start><File>{}-2.mov</File>'
+                      '<Type>Secondary</Type></Video>'.format(uuid).encode(),
+                      manifest)
+        self.assertIn('<Captions><Caption><Start>PT0S</Start>'
+                      '<File>{}-3.srt</File></Caption></Captions>'.format(
+                          uuid).encode(), manifest)
+
+    def test_upload_media(self):
+        s3 = self.uploader.s3 = MockS3Client(delay=0.01)
+        self.uploader.set_destination_attributes()
+        self.uploader.upload_media()
+
+        key = self.uploader.target.file_key
+        uuid = self.uploader.uuid
+        self.assertEqual(s3.media[key(uuid + '-1.mp4')], self.data)
+        self.assertEqual(s3.media[key(uuid + '-2.mov')], self.screen)
+        self.assertEqual(s3.objects[key(uuid + '-3.srt')], self.captions)
+        self.assertEqual(self.uploader.bytes_uploaded,
+                         1000 + 300 + len(self.captions))
+
+        # one part at a time for each file, but the files together
+        self.assertEqual(s3.max_in_flight, 2)
+
+    def test_failed_file(self):
+        from botocore.exceptions import ClientError
+
+        # the first part 2 sent fails, the other file's is sent
+        error = ClientError({
+            'Error': {'Code': 'AccessDenied'},
+            'ResponseMetadata': {'HTTPStatusCode': 403}}, 'UploadPart')
+        s3 = self.uploader.s3 = MockS3Client(failures={2: [error]})
+        self.uploader.files.pop()
+        self.uploader.set_destination_attributes()
+
+        with self.assertRaises(ClientError):
+            self.uploader.upload_media()
+        self.assertEqual(s3.aborted, ['upload-1'])
+        self.assertEqual(len(s3.media), 1)
+
+
+class TestPanoptoUploadJournal(unittest.TestCase):
+
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), 'upload.journal')
+
+    def tearDown(self):
+        PanoptoUploadJournal(self.path).remove()
+        os.rmdir(os.path.dirname(self.path))
+
+    def test_load_missing(self):
+        self.assertFalse(PanoptoUploadJournal(self.path).load())
+
+    def test_round_trip(self):
+        journal = PanoptoUploadJournal(self.path)
+        journal.begin(upload_id='abc')
+        journal.update(multipart_upload_id='old')
+        journal.add_part(0, '"old-0"')
+        journal.update(multipart_upload_id='new', chunk_size=64)
+        journal.add_part(0, '"etag-0"')
+        journal.add_part(1, '"etag-1"')
+
+        # simulate a crash in the middle of writing a record
+        with open(self.path, 'a') as f:
+            f.write('{"PartNumber": 2, "ET')
+
+        restored = PanoptoUploadJournal(self.path)
+        self.assertTrue(restored.load())
+        self.assertEqual(restored.state['upload_id'], 'abc')
+        self.assertEqual(restored.state['multipart_upload_id'], 'new')
+        self.assertEqual(restored.parts, {0: '"etag-0"', 1: '"etag-1"'})
+
+
+class TestPanoptoUploadResume(MediaTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.uploader.server = 'test.hosted.panopto.com'
+        self.uploader.folder = 'folder-id'
+        self.uploader.journal_path = self.tmp.name + '.journal'
+
+    def tearDown(self):
+        PanoptoUploadJournal(self.uploader.journal_path).remove()
+        super().tearDown()
+
+    def begin_journal(self):
+        self.uploader.journal = PanoptoUploadJournal(
+            self.uploader.journal_path)
+        self.uploader.journal.begin(
+            source=self.uploader._source_signature(),
+            server=self.uploader.server, folder=self.uploader.folder,
+            uuid='journaled-uuid', dest_filename='journaled.mp4',
+            title='journaled', upload_id=self.uploader.target.upload_id,
+            upload_target=self.uploader.target.upload_target)
+
+    def test_resume_session(self):
+        self.begin_journal()
+        self.uploader.session = MockSession(
+            get=MockResponse(200, b'{"State": 0, "SessionId": null}'))
+
+        self.assertTrue(self.uploader._resume_session())
+        self.assertEqual(self.uploader.uuid, 'journaled-uuid')
+        self.assertEqual(self.uploader.dest_filename, 'journaled.mp4')
+
+    def test_resume_session_closed(self):
+        self.begin_journal()
+        self.uploader.session = MockSession(
+            get=MockResponse(200, b'{"State": 4, "SessionId": "s"}'))
+        self.assertFalse(self.uploader._resume_session())
+
+    def test_resume_session_other_file(self):
+        self.begin_journal()
+        with open(self.tmp.name, 'ab') as f:
+            f.write(b'more')
+        self.uploader.session = MockSession(
+            get=MockResponse(200, b'{"State": 0, "SessionId": null}'))
+        self.assertFalse(self.uploader._resume_session())
+
+    def test_resume_upload_media(self):
+        self.begin_journal()
+        self.uploader.journal.update(
+            key_name=self.uploader.target.file_key('foo.mp4'),
+            multipart_upload_id='upload-1')
+        for n in range(1, 6):
+            self.uploader.journal.plan_part(n, (n - 1) * 64, 64)
+
+        # five parts were in flight, S3 only holds the first three
+        existing = {n: self.data[(n - 1) * 64:n * 64] for n in range(1, 4)}
+        s3 = self.uploader.s3 = MockS3Client(parts=existing, max_parts=2)
+
+        with patch.object(s3, 'upload_part', wraps=s3.upload_part) as m:
+            self.uploader.upload_media()
+            sent = sorted(c.kwargs['PartNumber'] for c in m.call_args_list)
+
+        self.assertEqual(s3.created, 0)
+        self.assertEqual(sent, list(range(4, 17)))
+        self.assertUploaded(s3)
+        self.assertEqual(len(self.uploader.journal.parts), 13)
+
+    def test_failed_upload_not_aborted(self):
+        from botocore.exceptions import ClientError
+
+        self.begin_journal()
+        s3 = self.uploader.s3 = MockS3Client(failures={3: [ClientError(
+            {'Error': {'Code': 'AccessDenied'},
+             'ResponseMetadata': {'HTTPStatusCode': 403}}, 'UploadPart')]})
+        with self.assertRaises(ClientError):
+            self.uploader.upload_media()
+        self.assertEqual(s3.aborted, [])
+        self.assertEqual(sorted(self.uploader.journal.parts), [1, 2])
+
+    def test_complete_session_removes_journal(self):
+        self.begin_journal()
+        self.uploader.session = MockSession(put=MockResponse(200))
+        self.assertTrue(self.uploader.complete_session())
+        self.assertFalse(os.path.exists(self.uploader.journal_path))
@@ -0,0 +1,109 @@
+from mock import patch
+import unittest
+
+import requests
+
+from panopto.upload import PanoptoUploadStatus
+from panopto.watch import PanoptoUploadWatcher
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class TestPanoptoUploadWatcher(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = patch('panopto.watch.time', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.watcher = PanoptoUploadWatcher(
+            'test.hosted.panopto.com', 'test', 'pw',
+            min_interval=5, max_interval=20, jitter=0)
+
+    def poll(self, states):
+        # each upload steps through its list of states, one per poll
+        def poll(upload_id):
+            self.polls.append((self.clock.now, upload_id))
+            state = states[upload_id].pop(0)
+            if state is None:
+                return None
+            return {'State': state, 'SessionId': 'session-' + upload_id}
+
+        self.polls = []
+        return patch.object(PanoptoUploadWatcher, '_poll', side_effect=poll)
+
+    def test_watch(self):
+        self.watcher.add('a')
+        self.watcher.add('b')
+        with self.poll({'a': [3, 3, 3, 4], 'b': [5]}):
+            changes = list(self.watcher.watch())
+
+        self.assertEqual(changes, [
+            ('a', 3, 'session-a'), ('b', 5, 'session-b'),
+            ('a', 4, 'session-a')])
+        # a backs off while processing, b is done after one poll
+        self.assertEqual(self.polls, [
+            (0, 'a'), (0, 'b'), (5, 'a'), (15, 'a'), (35, 'a')])
+        self.assertEqual(self.watcher.pending(), [])
+
+    def test_backoff_capped_and_reset(self):
+        self.watcher.add('a')
+        with self.poll({'a': [0, 0, 0, 0, 3, 3, 4]}):
+            self.watcher.run()
+        times = [t for t, upload_id in self.polls]
+        self.assertEqual(times, [0, 5, 15, 35, 55, 60, 70])
+
+    def test_on_change(self):
+        changes = []
+        self.watcher.on_change = lambda *args: changes.append(args)
+        self.watcher.add('a')
+        with self.poll({'a': [None, 3, 4]}):
+            states = self.watcher.run()
+        self.assertEqual(changes, [
+            ('a', None, 3, 'session-a'), ('a', 3, 4, 'session-a')])
+        self.assertEqual(states, {'a': (4, 'session-a')})
+
+    def test_timeout(self):
+        self.watcher.add('a')
+        with self.poll({'a': [3] * 10}):
+            self.watcher.run(timeout=30)
+        self.assertEqual(len(self.polls), 3)
+        self.assertEqual(self.watcher.pending(), ['a'])
+
+    def test_jitter(self):
+        self.watcher.jitter = 0.5
+        with patch('panopto.watch.random.uniform', return_value=1.5) as r:
+            self.watcher.add('a')
+            with self.poll({'a': [3, 4]}):
+                self.watcher.run()
+        r.assert_called_with(0.5, 1.5)
+        self.assertEqual(self.polls[1][0], 7.5)
+
+    def test_poll_errors_retried(self):
+        self.watcher.add('a')
+        with patch.object(PanoptoUploadStatus, 'status', side_effect=[
+                requests.ConnectionError('reset'), requests.Timeout('slow'),
+                ValueError('not JSON'), {'State': 4, 'SessionId': 's'}]):
+            states = self.watcher.run()
+        self.assertEqual(states, {'a': (4, 's')})
+        self.assertEqual(self.clock.sleeps, [10, 20, 20])
+
+
+class TestPanoptoUploadStatus(unittest.TestCase):
+
+    def test_terminal_states(self):
+        self.assertEqual(
+            sorted(PanoptoUploadStatus.TERMINAL_STATES), [4, 5, 7, 8])
@@ -0,0 +1,162 @@
+from mock import Mock, patch
+import os
+import shutil
+import tempfile
+import unittest
+
+from lxml import etree
+import zeep
+from zeep.transports import Transport
+
+from panopto import wsdl_cache
+from panopto.tests.soap_service import wsdl
+
+
+class MockTransport(Transport):
+
+    # Transport.__init__ is skipped, but __del__ still reads this
+    _close_session = False
+
+    def __init__(self, content=b'<wsdl/>', schema=b'<xsd/>'):
+        self.content = content
+        self.schema = schema
+
+    def load(self, url):
+        return self.schema if '?xsd=' in url else self.content
+
+
+class StandInTransport(Transport):
+
+    '''
+        A real transport, loading the stand-in service's WSDL.
+    '''
+
+    def load(self, url):
+        return wsdl('SessionManagement', 'http://127.0.0.1/').encode()
+
+
+class MockDocument(object):
+
+    def __init__(self, location, transport):
+        # as a WCF WSDL imports its types
+        transport.load(location.replace('?wsdl', '?xsd=xsd0'))
+        self.location = location
+        self.transport = transport
+        self.qname = etree.QName('{http://tempuri.org/}GetSessionsById')
+
+
+class UnpicklableDocument(MockDocument):
+
+    def __init__(self, location, transport):
+        super().__init__(location, transport)
+        self.callback = lambda: None
+
+
+class TestLoadDocument(unittest.TestCase):
+
+    url = 'https://test.hosted.panopto.com/Panopto/PublicAPI/4.6/' \
+        'SessionManagement.svc?wsdl'
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def load(self, transport, document=MockDocument):
+        with patch.object(wsdl_cache, 'Document', wraps=document) as m:
+            loaded = wsdl_cache.load_document(
+                self.url, transport, self.cache_dir)
+            return (loaded, m.call_count)
+
+    def test_cold_then_warm(self):
+        document, parsed = self.load(MockTransport())
+        self.assertEqual(parsed, 1)
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+
+        transport = MockTransport()
+        cached, parsed = self.load(transport)
+        self.assertEqual(parsed, 0)
+        self.assertEqual(cached.location, self.url)
+        self.assertEqual(cached.qname.text, document.qname.text)
+
+        # the live transport is attached, not a pickled copy
+        self.assertIs(cached.transport, transport)
+
+    def test_wsdl_changed(self):
+        self.load(MockTransport(b'<wsdl version="1"/>'))
+        document, parsed = self.load(MockTransport(b'<wsdl version="2"/>'))
+        self.assertEqual(parsed, 1)
+        self.assertEqual(len(os.listdir(self.cache_dir)), 2)
+
+    def test_schema_changed(self):
+        self.load(MockTransport(schema=b'<xsd version="1"/>'))
+        document, parsed = self.load(
+            MockTransport(schema=b'<xsd version="1"/>'))
+        self.assertEqual(parsed, 0)
+
+        document, parsed = self.load(
+            MockTransport(schema=b'<xsd version="2"/>'))
+        self.assertEqual(parsed, 1)
+        document, parsed = self.load(
+            MockTransport(schema=b'<xsd version="2"/>'))
+        self.assertEqual(parsed, 0)
+
+    def test_corrupt(self):
+        transport = MockTransport()
+        path = wsdl_cache.cache_path(
+            self.cache_dir, self.url, transport.content)
+        with open(path, 'wb') as f:
+            f.write(b'not a pickle')
+
+        document, parsed = self.load(transport)
+        self.assertEqual(parsed, 1)
+        self.assertIsInstance(document, MockDocument)
+
+    def test_unpicklable(self):
+        document, parsed = self.load(MockTransport(), UnpicklableDocument)
+        self.assertEqual(parsed, 1)
+        self.assertEqual(os.listdir(self.cache_dir), [])
+
+    def test_private_dir(self):
+        cache_dir = os.path.join(self.cache_dir, 'wsdl')
+        with patch.object(wsdl_cache, 'Document', MockDocument):
+            wsdl_cache.load_document(self.url, MockTransport(), cache_dir)
+        self.assertEqual(os.stat(cache_dir).st_mode & 0o777, 0o700)
+        self.assertEqual(len(os.listdir(cache_dir)), 1)
+
+    def test_shared_dir(self):
+        self.load(MockTransport())
+        os.chmod(self.cache_dir, 0o1777)
+
+        document, parsed = self.load(MockTransport())
+        self.assertEqual(parsed, 1)
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+
+    def test_other_owner(self):
+        self.load(MockTransport())
+        owner = Mock(st_uid=os.getuid() + 1)
+        with patch.object(wsdl_cache.os, 'fstat', return_value=owner):
+            document, parsed = self.load(MockTransport())
+        self.assertEqual(parsed, 1)
+
+    def test_zeep_document(self):
+        transport = StandInTransport()
+        document = wsdl_cache.load_document(
+            self.url, transport, self.cache_dir)
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+
+        with patch.object(wsdl_cache, 'Document') as parse:
+            cached = wsdl_cache.load_document(
+                self.url, transport, self.cache_dir)
+        parse.assert_not_called()
+        self.assertIs(cached.transport, transport)
+
+        messages = []
+        for loaded in (document, cached):
+            client = zeep.Client(loaded, transport=transport)
+            ids = client.get_type('ns0:ArrayOfguid')(guid=['a', 'b'])
+            messages.append(etree.tostring(client.create_message(
+                client.service, 'GetSessionsById', sessionIds=ids)))
+        self.assertEqual(messages[0], messages[1])
+        self.assertIn(b'<ns0:guid>b</ns0:guid>', messages[1])
@@ -0,0 +1,122 @@
+'''
+    A local stand-in for Panopto's sessionUpload REST endpoints and the
+    S3 multipart API, shared by the tests and benchmarks. Uploads are
+    accepted and their bodies dropped.
+'''
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import threading
+from urllib.parse import parse_qs, urlsplit
+import uuid
+
+
+REST_PATH = '/Panopto/PublicAPI/REST/sessionUpload'
+
+INITIATED = '''<?xml version="1.0" encoding="UTF-8"?>
+<InitiateMultipartUploadResult>
+<Bucket>Panopto</Bucket><Key>{}</Key><UploadId>{}</UploadId>
+</InitiateMultipartUploadResult>'''
+
+COMPLETED = '''<?xml version="1.0" encoding="UTF-8"?>
+<CompleteMultipartUploadResult>
+<Bucket>Panopto</Bucket><Key>{}</Key><ETag>"{}"</ETag>
+</CompleteMultipartUploadResult>'''
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+
+    '''
+        Answers the sessionUpload REST calls and the S3 calls boto3
+        makes for put_object and multipart uploads. Request bodies are
+        read and dropped.
+    '''
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _respond(self, status, body=b'', headers=None):
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _json(self, status, content):
+        self._respond(status, json.dumps(content),
+                      {'Content-Type': 'application/json'})
+
+    def _drain(self, size):
+        while size > 0:
+            data = self.rfile.read(min(size, 1024 * 1024))
+            if not data:
+                break
+            size -= len(data)
+
+    def _read_body(self):
+        if self.headers.get('Transfer-Encoding', '').lower() != 'chunked':
+            self._drain(int(self.headers.get('Content-Length') or 0))
+            return
+
+        while True:
+            size = int(self.rfile.readline().split(b';')[0], 16)
+            if size == 0:
+                # trailers end with a blank line
+                while self.rfile.readline() not in (b'\r\n', b'\n', b''):
+                    pass
+                return
+            self._drain(size)
+            self.rfile.readline()
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        query = parse_qs(url.query, keep_blank_values=True)
+        self._read_body()
+
+        if url.path == REST_PATH:
+            upload_id = str(uuid.uuid4())
+            host = self.headers['Host']
+            self._json(201, {
+                'ID': upload_id,
+                'UploadTarget': 'http://{}/Panopto/Upload/{}'.format(
+                    host, upload_id)})
+        elif 'uploads' in query:
+            self._respond(200, INITIATED.format(url.path, uuid.uuid4()))
+        else:
+            self._respond(200, COMPLETED.format(url.path, 'benchmark'))
+
+    def do_PUT(self):
+        url = urlsplit(self.path)
+        self._read_body()
+
+        if url.path.startswith(REST_PATH):
+            self._json(200, {})
+        else:
+            self._respond(200, headers={'ETag': '"benchmark"'})
+
+    def do_GET(self):
+        self._json(200, {'State': 4, 'SessionId': 'benchmark'})
+
+
+class StandIn(object):
+
+    def __init__(self, handler=StandInHandler):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(
+            target=self.server.serve_forever, daemon=True)
+
+    def address(self):
+        return '{}:{}'.format(*self.server.server_address)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
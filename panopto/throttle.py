@@ -0,0 +1,82 @@
+import threading
+import time
+
+
+# the smallest grant, in bytes, so that a low rate does not turn into a
+# stream of tiny reads
+MIN_BURST = 16 * 1024
+
+
+class PanoptoBandwidthLimiter(object):
+
+    '''
+        A token bucket capping the bytes per second that the uploads
+        sharing it send. Set the same limiter on every upload to cap
+        them together:
+
+        limiter = PanoptoBandwidthLimiter(rate=20 * 1000 * 1000)
+        for uploader in uploads:
+            uploader.bandwidth_limiter = limiter
+        ...
+        limiter.rate = 50 * 1000 * 1000  # evenings
+
+        Media parts take tokens as botocore reads them, and a read is
+        granted no more than the bucket holds, so bytes go out in small
+        steady steps rather than in bursts. The bucket holds burst
+        bytes, by default a twentieth of a second's worth. A rate of
+        None lets everything through.
+
+        Every read is counted, including those of a part botocore
+        resends. Over https botocore sends its checksum after the body,
+        reading the part once. Over plain http, as to a local stand-in,
+        it reads each part twice, once for the checksum, which halves
+        the rate media is sent at.
+    '''
+
+    def __init__(self, rate=None, burst=None):
+        self._rate = rate
+        self.burst = burst
+        self._tokens = 0.0
+        self._updated = time.monotonic()
+        self._condition = threading.Condition()
+
+    @property
+    def rate(self):
+        return self._rate
+
+    @rate.setter
+    def rate(self, rate):
+        with self._condition:
+            self._refill()
+            self._rate = rate
+            # waiting readers recompute their wait at the new rate
+            self._condition.notify_all()
+
+    def _capacity(self) -> int:
+        return self.burst or max(MIN_BURST, int(self._rate / 20))
+
+    def _refill(self):
+        now = time.monotonic()
+        if self._rate:
+            self._tokens = min(
+                self._capacity(),
+                self._tokens + (now - self._updated) * self._rate)
+        self._updated = now
+
+    def acquire(self, size: int) -> int:
+        '''
+            Waits until some of size bytes may be sent and returns how
+            many, between 1 and size.
+        '''
+        with self._condition:
+            while True:
+                if not self._rate or size <= 0:
+                    return size
+
+                self._refill()
+                wanted = min(size, self._capacity())
+                if self._tokens >= wanted:
+                    self._tokens -= wanted
+                    return wanted
+                self._condition.wait(
+                    (wanted - self._tokens) / self._rate)
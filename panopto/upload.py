@@ -1,19 +1,363 @@
 from _io import BytesIO
+from contextlib import contextmanager
 from datetime import timezone
 from datetime import datetime
-from json import loads
-import math
+from json import dumps, loads
+import base64
+import copy
+import functools
+import hashlib
+import io
+import mmap
 import os
+import random
 import re
+import select
+import stat
+import threading
+import time
 import unicodedata
 import uuid
 
-import boto3
-from lxml import etree
+from panopto.auth import session_pool
 
-from botocore import UNSIGNED
-from botocore.client import Config
-from panopto.auth import PanoptoAuth
+
+# S3 multipart limits. Every part but the last must be at least
+# MIN_PART_SIZE, and an upload may have at most MAX_PARTS parts.
+MIN_PART_SIZE = 5 * 1024 * 1024
+MAX_PART_SIZE = 5 * 1024 * 1024 * 1024
+MAX_PARTS = 10000
+DEFAULT_PART_SIZE = 13107200
+
+
+# S3 error codes worth retrying whatever their HTTP status
+_TRANSIENT_CODES = {'RequestTimeout', 'RequestTimeTooSkewed', 'SlowDown',
+                    'Throttling', 'ThrottlingException', 'InternalError',
+                    'ServiceUnavailable'}
+
+# seconds to wait for a non-blocking stream before reading it again
+_POLL_INTERVAL = 0.05
+
+# the ETag S3 gives a completed multipart upload
+_COMPOSITE_ETAG = re.compile(r'^"?([0-9a-fA-F]{32}-[0-9]+)"?$')
+
+
+def _ceil_div(a: int, b: int) -> int:
+    return -(-a // b)
+
+
+def _etag_digest(etag: str) -> bytes:
+    '''
+        The MD5 digest an S3 ETag stands for, or None if the ETag is not
+        a plain MD5, as for KMS encrypted objects.
+    '''
+    match = re.match(r'^"?([0-9a-fA-F]{32})"?$', etag or '')
+    return bytes.fromhex(match.group(1)) if match else None
+
+
+def _composite_etag(digests: list) -> str:
+    '''
+        The ETag S3 gives a multipart upload of parts with these MD5
+        digests, in PartNumber order.
+    '''
+    return '{}-{}'.format(
+        hashlib.md5(b''.join(digests)).hexdigest(), len(digests))
+
+
+def _transient(error: Exception) -> bool:
+    '''
+        Whether an S3 call that raised error may succeed if repeated:
+        connection errors, timeouts, throttling and 5xx responses.
+    '''
+    from botocore.exceptions import (
+        ClientError, ConnectionError, HTTPClientError)
+
+    if isinstance(error, (ConnectionError, HTTPClientError)):
+        return True
+    if isinstance(error, ClientError):
+        response = error.response
+        status = response.get('ResponseMetadata', {}).get('HTTPStatusCode')
+        code = response.get('Error', {}).get('Code')
+        return (code in _TRANSIENT_CODES or status in (408, 429) or
+                (status or 0) >= 500)
+    return False
+
+
+def _duration(seconds) -> str:
+    '''
+        An offset in seconds as the ISO 8601 duration manifests use.
+    '''
+    seconds = round(float(seconds), 3)
+    if seconds == int(seconds):
+        seconds = int(seconds)
+    return 'PT{}S'.format(seconds)
+
+
+def _source_name(input_file, filename) -> str:
+    '''
+        The name of a media source: its path, the given filename or the
+        name of an open file, or '' for an anonymous stream.
+    '''
+    name = filename
+    if isinstance(input_file, (str, os.PathLike)):
+        name = os.fspath(input_file)
+    elif name is None:
+        name = getattr(input_file, 'name', None)
+    return name if isinstance(name, str) else ''
+
+
+def _stage(method):
+    '''
+        Reports a PanoptoUpload workflow stage to the upload's
+        listeners as it starts and finishes.
+    '''
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        self._notify('stage_started', method.__name__)
+        started = time.monotonic()
+        error = None
+        try:
+            return method(self, *args, **kwargs)
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self._notify('stage_finished', method.__name__,
+                         time.monotonic() - started, error)
+    return wrapper
+
+
+class PanoptoUploadError(Exception):
+    '''
+        Raised when S3 reports media stored differently from how it was
+        sent.
+    '''
+
+
+class _PartReader(io.RawIOBase):
+
+    '''
+        A seekable, read-only file over a memoryview of one media part.
+        botocore streams the body in small reads and rewinds it on
+        retry, so the part itself is never copied into a bytes object.
+        With a limiter, each read waits for its bytes and may return
+        fewer than asked for.
+    '''
+
+    def __init__(self, view: memoryview, limiter=None):
+        self._view = view
+        self._position = 0
+        self._limiter = limiter
+
+    def __len__(self) -> int:
+        return len(self._view)
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += len(self._view)
+        self._position = max(0, offset)
+        return self._position
+
+    def _allowed(self, size: int) -> int:
+        size = max(0, min(size, len(self._view) - self._position))
+        if self._limiter is None or size == 0:
+            return size
+        return self._limiter.acquire(size)
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            return self.readall()
+        end = self._position + self._allowed(size)
+        data = self._view[self._position:end].tobytes()
+        self._position += len(data)
+        return data
+
+    def readall(self) -> bytes:
+        chunks = []
+        while True:
+            chunk = self.read(len(self._view))
+            if not chunk:
+                return b''.join(chunks)
+            chunks.append(chunk)
+
+    def readinto(self, buffer) -> int:
+        end = self._position + self._allowed(len(buffer))
+        data = self._view[self._position:end]
+        count = len(data)
+        buffer[:count] = data
+        self._position += count
+        return count
+
+    def md5(self) -> bytes:
+        return hashlib.md5(self._view).digest()
+
+    def close(self):
+        self._view.release()
+        super().close()
+
+
+class _MappedFile(object):
+
+    '''
+        A regular file of known size, sliced like a memoryview. Each
+        slice maps only its own pages, from an offset aligned to
+        mmap.ALLOCATIONGRANULARITY, and is unmapped once the view is
+        released. Resident memory so follows the parts in flight rather
+        than the file size.
+    '''
+
+    def __init__(self, fileno: int, start: int, size: int):
+        self._fileno = fileno
+        self._start = start
+        self._size = max(0, size)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __getitem__(self, item: slice) -> memoryview:
+        start, stop, step = item.indices(self._size)
+        if stop <= start:
+            return memoryview(b'')
+
+        offset = self._start + start
+        skip = offset % mmap.ALLOCATIONGRANULARITY
+        mapped = mmap.mmap(self._fileno, skip + stop - start,
+                           access=mmap.ACCESS_READ, offset=offset - skip)
+        # the slice keeps the map alive, releasing it unmaps the window
+        with memoryview(mapped) as view:
+            return view[skip:]
+
+
+class _StreamReader(io.RawIOBase):
+
+    '''
+        Adapts a readable file-like object, or an iterator of bytes-like
+        chunks, to readinto. Sources without readinto are copied through
+        a pending view of their last chunk. As with a raw stream, None
+        means a non-blocking source has nothing to read yet, not EOF.
+    '''
+
+    def __init__(self, source):
+        self._source = source
+        self._readinto = getattr(source, 'readinto', None)
+        self._chunks = None if hasattr(source, 'read') else iter(source)
+        self._pending = memoryview(b'')
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer):
+        if self._readinto is not None:
+            return self._readinto(buffer)
+
+        while not self._pending:
+            if self._chunks is None:
+                chunk = self._source.read(len(buffer))
+                if chunk is None:
+                    return None
+                if not len(chunk):
+                    return 0
+            else:
+                chunk = next(self._chunks, None)
+                if chunk is None:
+                    return 0
+            self._pending = memoryview(chunk).cast('B')
+
+        count = min(len(buffer), len(self._pending))
+        buffer[:count] = self._pending[:count]
+        self._pending = self._pending[count:]
+        return count
+
+    def wait(self, timeout: float):
+        '''
+            Waits up to timeout seconds for a non-blocking source to
+            become readable.
+        '''
+        try:
+            select.select([self._source], [], [], timeout)
+        except (TypeError, ValueError, OSError):
+            time.sleep(timeout)
+
+
+class _PartPlanner(object):
+
+    '''
+        Lays out the (PartNumber, offset, size) parts of a multipart
+        upload. Part numbers start at 1 and the plan never needs more
+        than MAX_PARTS parts. Parts planned by an interrupted upload are
+        replayed first, unchanged.
+
+        When adaptive, each new part is sized to take about
+        target_seconds at the per-part throughput measured so far. A
+        part is at most twice or half the size of the one before it and
+        stays between min_size and max_size.
+    '''
+
+    def __init__(self, source_size: int, part_size: int, planned=None,
+                 adaptive=False, target_seconds=10,
+                 min_size=MIN_PART_SIZE, max_size=MAX_PART_SIZE):
+        self.source_size = source_size
+        self.part_size = part_size
+        self.planned = dict(planned or {})
+        self.adaptive = adaptive
+        self.target_seconds = target_seconds
+        self.min_size = min_size
+        self.max_size = max_size
+        self.throughput = None
+        self.lock = threading.Lock()
+
+    def record(self, size: int, seconds: float):
+        if seconds <= 0:
+            return
+
+        rate = size / seconds
+        with self.lock:
+            if self.throughput is None:
+                self.throughput = rate
+            else:
+                self.throughput = 0.7 * self.throughput + 0.3 * rate
+
+    def _next_size(self, number: int, offset: int) -> int:
+        with self.lock:
+            throughput = self.throughput
+
+        if self.adaptive and throughput:
+            wanted = int(throughput * self.target_seconds)
+            wanted -= wanted % (1024 * 1024)
+            self.part_size = min(
+                max(wanted, self.part_size // 2, self.min_size),
+                self.part_size * 2, self.max_size)
+
+        # never leave more bytes than the remaining part numbers can hold
+        remaining = self.source_size - offset
+        return max(self.part_size,
+                   _ceil_div(remaining, MAX_PARTS - number + 1))
+
+    def __iter__(self):
+        number, offset = 1, 0
+        for planned in sorted(self.planned.items()):
+            part_number, (part_offset, size) = planned
+            yield (part_number, part_offset, size)
+            number = part_number + 1
+            offset = part_offset + size
+
+        while offset < self.source_size:
+            size = min(self._next_size(number, offset),
+                       self.source_size - offset)
+            yield (number, offset, size)
+            number += 1
+            offset += size
 
 
 class PanoptoUploadTarget(object):
@@ -29,11 +373,11 @@ class PanoptoUploadTarget(object):
         self.upload_target = upload_target
 
         m = re.match(
-            r'https:\/\/(.*)\/Panopto\/(.*)\/(.*)', upload_target)
+            r'(https?):\/\/(.*)\/Panopto\/(.*)\/(.*)', upload_target)
 
-        self.hostname = 'https://{}'.format(m.group(1))
+        self.hostname = '{}://{}'.format(m.group(1), m.group(2))
         self.bucket_name = 'Panopto'
-        self.key_base = '{}/{}'.format(m.group(2), m.group(3))
+        self.key_base = '{}/{}'.format(m.group(3), m.group(4))
 
     def file_key(self, filename):
         return '{}/{}'.format(self.key_base, filename)
@@ -42,6 +386,110 @@ class PanoptoUploadTarget(object):
         return self.hostname
 
 
+class PanoptoUploadJournal(object):
+
+    '''
+        An append-only, on-disk checkpoint of an in-progress upload.
+
+        Each line is a JSON record. Part records carry a PartNumber and
+        either the Offset and Size it was planned with or the ETag it was
+        uploaded as. Every other record is merged into `state`. Recording
+        a new multipart_upload_id discards the parts of the previous one.
+        A truncated final line, left by a crash mid-write, is ignored.
+    '''
+
+    def __init__(self, path: str):
+        self.path = path
+        self.state = {}
+        self.plan = {}
+        self.parts = {}
+        self.lock = threading.Lock()
+
+    def load(self) -> bool:
+        try:
+            with open(self.path) as journal:
+                lines = journal.readlines()
+        except OSError:
+            return False
+
+        for line in lines:
+            try:
+                record = loads(line)
+            except ValueError:
+                continue
+            self._apply(record)
+
+        return bool(self.state)
+
+    def _apply(self, record: dict):
+        if 'Offset' in record:
+            self.plan[record['PartNumber']] = (
+                record['Offset'], record['Size'])
+            return
+        if 'ETag' in record:
+            self.parts[record['PartNumber']] = record['ETag']
+            return
+
+        if 'multipart_upload_id' in record:
+            self.plan = {}
+            self.parts = {}
+        self.state.update(record)
+
+    def _write(self, record: dict, mode: str = 'a'):
+        with self.lock:
+            self._apply(record)
+            with open(self.path, mode) as journal:
+                journal.write(dumps(record) + '\n')
+                journal.flush()
+                os.fsync(journal.fileno())
+
+    def begin(self, **state):
+        self.state = {}
+        self.plan = {}
+        self.parts = {}
+        self._write(state, mode='w')
+
+    def update(self, **state):
+        self._write(state)
+
+    def plan_part(self, part_number: int, offset: int, size: int):
+        self._write(
+            {'PartNumber': part_number, 'Offset': offset, 'Size': size})
+
+    def add_part(self, part_number: int, etag: str):
+        self._write({'PartNumber': part_number, 'ETag': etag})
+
+    def remove(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class PanoptoUploadFile(object):
+
+    '''
+        One file of a multi-stream session, added with
+        PanoptoUpload.add_file. stream_type is 'Primary' or 'Secondary'
+        for a video, or 'Caption' for a caption file. start is the offset
+        in seconds at which the stream begins in the session.
+        input_file and filename are as for PanoptoUpload.
+    '''
+
+    VIDEO_TYPES = ('Primary', 'Secondary')
+    CAPTION = 'Caption'
+
+    def __init__(self, input_file, stream_type='Primary', start=0,
+                 filename=None):
+        if stream_type not in self.VIDEO_TYPES + (self.CAPTION,):
+            raise ValueError('Unknown stream type {}'.format(stream_type))
+        self.input_file = input_file
+        self.stream_type = stream_type
+        self.start = start
+        self.filename = filename
+        self.dest_filename = None
+
+
 class PanoptoUpload(object):
 
     '''
@@ -58,6 +506,22 @@ class PanoptoUpload(object):
         4. Complete session via Panopto's REST api with a manifest of all
            all uploaded files
 
+        input_file is usually a path, but may also be an open file, any
+        readable file-like object, an iterator of bytes or a bytes-like
+        object. Sources whose size cannot be known up front are streamed
+        into parts as they are read. Set filename to name such sources.
+
+        For a multi-stream session, such as a camera and a screen
+        recording with captions, add each file with add_file rather than
+        setting input_file. The manifest lists them all, and upload_media
+        sends them at the same time, each with up to max_concurrency
+        parts in flight.
+
+        Set journal_path to make the upload of a path resumable. Progress is
+        checkpointed to a PanoptoUploadJournal, and a restarted upload
+        of the same file reuses the Panopto session and multipart upload,
+        sending only the parts S3 does not already have.
+
         More details here:
         https://support.panopto.com/articles/Documentation/Upload-API
     '''
@@ -69,13 +533,108 @@ class PanoptoUpload(object):
         self.username = None
         self.password = None
         self.input_file = None
+        self.filename = None
         self.dest_filename = None
         self.title = None
         self.description = None
         self.uuid = str(uuid.uuid4())
+        self.journal_path = None
+        self.journal = None
+
+        # chunk_size defaults to DEFAULT_PART_SIZE, raised as needed to
+        # stay under MAX_PARTS. Sources no larger than one part are sent
+        # with a single put. adaptive_chunk_size resizes parts as the
+        # upload runs, aiming for target_chunk_seconds per part
+        self.chunk_size = None
+        self.adaptive_chunk_size = False
+        self.target_chunk_seconds = 10
+
+        # number of media parts uploaded at once. max_buffer_size, when
+        # set, caps the bytes held by in-flight parts and so may lower
+        # the effective concurrency
+        self.max_concurrency = 1
+        self.max_buffer_size = None
+
+        # an authenticated requests.Session, S3 client or part executor
+        # set before the upload begins is used rather than a new one
+        self.session = None
+        self.s3 = None
+        self.executor = None
+
+        # send each media part with its Content-MD5, and check the ETags
+        # S3 returns, raising PanoptoUploadError on a mismatch
+        self.verify_integrity = False
+
+        # panopto.progress.PanoptoUploadListener objects, told as each
+        # stage of the upload and each media part starts and finishes
+        self.listeners = []
+
+        # the PanoptoUploadFile sent by each copy of this upload that
+        # upload_media makes for the files of a multi-stream session
+        self.media_file = None
+
+        # a media part that fails with a transient error is sent again,
+        # up to part_retries times, after retry_delay seconds growing by
+        # retry_backoff each time up to max_retry_delay, and jittered by
+        # up to retry_jitter times the delay. retry_budget caps the
+        # retries of the whole upload. When a part still fails, the
+        # multipart upload is aborted unless it is journaled
+        self.part_retries = 3
+        self.retry_delay = 0.5
+        self.retry_backoff = 2
+        self.max_retry_delay = 20
+        self.retry_jitter = 0.5
+        self.retry_budget = 20
+
+        # a panopto.throttle.PanoptoBandwidthLimiter capping the rate
+        # media is sent at, which may be shared with other uploads
+        self.bandwidth_limiter = None
+
+        # retries made, and bytes sent in attempts that failed
+        self.retries = 0
+        self.bytes_wasted = 0
+
+        self.bytes_uploaded = 0
+        self._bytes_lock = threading.Lock()
+        self._digests = {}
+
+    def _notify(self, event, *args):
+        for listener in self.listeners:
+            getattr(listener, event)(self, *args)
+
+    def _input_is_path(self) -> bool:
+        return isinstance(self.input_file, (str, os.PathLike))
+
+    def add_file(self, input_file, stream_type='Primary', start=0,
+                 filename=None) -> PanoptoUploadFile:
+        media_file = PanoptoUploadFile(input_file, stream_type, start,
+                                       filename)
+        self.files.append(media_file)
+        return media_file
+
+    def _set_file_destinations(self):
+        types = [media_file.stream_type for media_file in self.files]
+        if types.count('Primary') != 1:
+            raise ValueError('A session needs exactly one Primary video')
+
+        for number, media_file in enumerate(self.files, 1):
+            name = _source_name(media_file.input_file, media_file.filename)
+            media_file.dest_filename = '{}-{}{}'.format(
+                self.uuid, number, os.path.splitext(name)[1])
+            if media_file.stream_type == 'Primary':
+                primary = name
+                self.dest_filename = media_file.dest_filename
+
+        if not self.title:
+            self.title = os.path.splitext(os.path.basename(primary))[0]
 
     def set_destination_attributes(self):
-        path, filename = os.path.split(self.input_file)
+        if self.files:
+            self._set_file_destinations()
+            return
+
+        name = _source_name(self.input_file, self.filename)
+        path, filename = os.path.split(name)
 
         fname, ext = os.path.splitext(filename)
         self.dest_filename = '{}{}'.format(self.uuid, ext)
@@ -83,23 +642,27 @@ class PanoptoUpload(object):
         if not self.title:
             self.title = fname
 
+    @_stage
     def create_session(self) -> bool:
-        # authenticate
-        auth = PanoptoAuth(self.server)
-
-        self.session = auth.authenticate_with_password(
-            self.username, self.password)
+        if self.session is None:
+            # authenticate
+            self.session = session_pool.get(
+                self.server, self.username, self.password)
 
         if not self.session:
             return False
 
+        resumable = self.journal_path and self._input_is_path()
+        if resumable and self._resume_session():
+            return True
+
         self.set_destination_attributes()
 
         url = 'https://{}/Panopto/PublicAPI/REST/sessionUpload'.format(
             self.server)
         payload = {'FolderId': self.folder}
 
-        response = self.session.post(url, json=payload)
+        response = self._request('post', url, json=payload)
 
         if response.status_code != 201:
             return False
@@ -107,9 +670,74 @@ class PanoptoUpload(object):
         content = loads(response.content)
         self.target = PanoptoUploadTarget(
             content['ID'], content['UploadTarget'])
+
+        if resumable:
+            self.journal = PanoptoUploadJournal(self.journal_path)
+            self.journal.begin(
+                source=self._source_signature(), server=self.server,
+                folder=self.folder, uuid=self.uuid,
+                dest_filename=self.dest_filename, title=self.title,
+                upload_id=self.target.upload_id,
+                upload_target=self.target.upload_target)
+        return True
+
+    def _request(self, method, url, **kwargs):
+        '''
+            Make a Panopto REST request, logging in again through the
+            session pool and retrying once if the session is refused.
+        '''
+        response = self.session.request(method, url, **kwargs)
+        if response.status_code in (401, 403) and self.username:
+            session = session_pool.renew(
+                self.server, self.username, self.password, self.session)
+            if session is not None:
+                self.session = session
+                response = session.request(method, url, **kwargs)
+        return response
+
+    def _source_signature(self) -> list:
+        info = os.stat(self.input_file)
+        return [os.path.abspath(self.input_file), info.st_size,
+                info.st_mtime_ns]
+
+    def _resume_session(self) -> bool:
+        '''
+            Restore the upload target recorded in the journal, provided
+            the journal describes this file, server and folder and
+            Panopto still has the upload open.
+        '''
+        journal = PanoptoUploadJournal(self.journal_path)
+        if not journal.load():
+            return False
+
+        state = journal.state
+        if (state.get('source') != self._source_signature() or
+                state.get('server') != self.server or
+                state.get('folder') != self.folder):
+            return False
+
+        url = 'https://{}/Panopto/PublicAPI/REST/sessionUpload/{}'.format(
+            self.server, state['upload_id'])
+        response = self._request('get', url)
+        if (response.status_code != 200 or
+                loads(response.content)['State'] !=
+                PanoptoUploadStatus.UPLOAD_CREATED):
+            return False
+
+        self.uuid = state['uuid']
+        self.dest_filename = state['dest_filename']
+        self.title = state['title']
+        self.target = PanoptoUploadTarget(
+            state['upload_id'], state['upload_target'])
+        self.journal = journal
         return True
 
+    @_stage
     def create_bucket(self):
+        import boto3
+        from botocore import UNSIGNED
+        from botocore.client import Config
+
         self.s3 = boto3.client('s3', aws_access_key_id=None,
                                aws_secret_access_key=None,
                                endpoint_url=self.target.host(),
@@ -117,39 +745,513 @@ class PanoptoUpload(object):
                                    signature_version=UNSIGNED,
                                    s3={
                                        'payload_signing_enabled': False
-                                   }))
+                                   },
+                                   # requests are retried by _send,
+                                   # where they are counted
+                                   retries={'total_max_attempts': 1}))
 
-    def upload_media(self):
-        source_file = open(self.input_file, 'rb')
-        key_name = self.target.file_key(self.dest_filename)
-        upload_id = self.s3.create_multipart_upload(
-            Bucket=self.target.bucket_name, Key=key_name)['UploadId']
+    def _part_size(self, source_size: int) -> int:
+        part_size = self.chunk_size or DEFAULT_PART_SIZE
+        if part_size * MAX_PARTS < source_size:
+            # round up to a whole MiB
+            part_size = _ceil_div(source_size, MAX_PARTS * 1024 * 1024)
+            part_size *= 1024 * 1024
+        if part_size > MAX_PART_SIZE:
+            raise ValueError(
+                'Media of {} bytes is too large to upload'.format(
+                    source_size))
+        if part_size < source_size:
+            self._check_part_size(part_size)
+        return part_size
+
+    @staticmethod
+    def _check_part_size(part_size: int):
+        '''
+            S3 only refuses parts below MIN_PART_SIZE once the upload is
+            completed, after every part has been sent.
+        '''
+        if part_size < MIN_PART_SIZE:
+            raise ValueError(
+                'Parts of {} bytes are below the {} byte minimum of a '
+                'multipart upload'.format(part_size, MIN_PART_SIZE))
+
+    def _max_parts_in_flight(self, chunk_size: int) -> int:
+        slots = max(1, self.max_concurrency)
+        if self.max_buffer_size:
+            slots = min(slots, max(1, self.max_buffer_size // chunk_size))
+        return slots
+
+    def _count_bytes(self, count: int):
+        with self._bytes_lock:
+            self.bytes_uploaded += count
+
+    def _content_md5(self, data) -> tuple[bytes, dict]:
+        '''
+            The MD5 of a part, hashed from the same buffer the upload
+            then sends, and the upload arguments that carry it.
+        '''
+        if not self.verify_integrity:
+            return (None, {})
+        digest = data.md5()
+        return (digest,
+                {'ContentMD5': base64.b64encode(digest).decode('ascii')})
 
-        parts = []
-        chunk_size = 13107200
-        source_size = os.stat(self.input_file).st_size
-        chunk_count = int(math.ceil(source_size / float(chunk_size)))
+    def _check_etag(self, what: str, etag: str, digest: bytes):
+        stored = _etag_digest(etag)
+        if stored is not None and stored != digest:
+            raise PanoptoUploadError(
+                '{} was stored with ETag {}, not {}'.format(
+                    what, etag, digest.hex()))
 
-        for i in range(chunk_count):
-            offset = chunk_size * i
-            byte_count = min(chunk_size, source_size - offset)
+    def _check_composite_etag(self, parts: list, response: dict):
+        '''
+            Compare the ETag of a completed multipart upload with the
+            one its part digests give. Resumed parts count with the MD5
+            their ETag stands for. Nothing is checked when an ETag is not
+            MD5 based.
+        '''
+        digests = [self._digests.get(part['PartNumber']) or
+                   _etag_digest(part['ETag']) for part in parts]
+        match = _COMPOSITE_ETAG.match(response.get('ETag') or '')
+        if None in digests or match is None:
+            return
 
-            data = source_file.read(byte_count)
-            part = self.s3.upload_part(
+        expected = _composite_etag(digests)
+        if match.group(1).lower() != expected:
+            raise PanoptoUploadError(
+                'Media was stored with ETag {}, not {}'.format(
+                    response['ETag'], expected))
+
+    def _retry_delay(self, attempt: int) -> float:
+        '''
+            Seconds to wait before retry number attempt, counted from 1,
+            or None if the part may not be retried again.
+        '''
+        with self._bytes_lock:
+            if attempt > self.part_retries or (
+                    self.retry_budget is not None and
+                    self.retries >= self.retry_budget):
+                return None
+            self.retries += 1
+
+        delay = min(self.retry_delay * self.retry_backoff ** (attempt - 1),
+                    self.max_retry_delay)
+        return delay * random.uniform(
+            1 - self.retry_jitter, 1 + self.retry_jitter)
+
+    def _send(self, part_number, data, send):
+        '''
+            Calls send() to upload data, sending it again from the start
+            while it fails with a transient error and retries are left.
+            The calls that start, list and complete a multipart upload
+            have no part, and pass None for part_number and data.
+        '''
+        attempt = 0
+        while True:
+            if data is not None:
+                data.seek(0)
+            try:
+                return send()
+            except Exception as e:
+                if data is not None:
+                    with self._bytes_lock:
+                        self.bytes_wasted += data.tell()
+                attempt += 1
+                delay = self._retry_delay(attempt) if _transient(e) else None
+                if delay is None:
+                    raise
+
+                self._notify('part_retried', part_number, attempt, e, delay)
+                time.sleep(delay)
+
+    def _abort_multipart(self, key_name, upload_id):
+        '''
+            Aborts a multipart upload whose parts could not be sent, so
+            that S3 drops the parts it holds. A journaled upload is left
+            to be resumed.
+        '''
+        if self.journal:
+            return
+        try:
+            self.s3.abort_multipart_upload(
+                Bucket=self.target.bucket_name, Key=key_name,
+                UploadId=upload_id)
+        except Exception:
+            # the part that failed is the error worth raising
+            pass
+
+    def _upload_part(self, key_name, upload_id, part_number, data) -> dict:
+        size = len(data)
+        digest, kwargs = self._content_md5(data)
+        try:
+            part = self._send(part_number, data, lambda: self.s3.upload_part(
                 Bucket=self.target.bucket_name, Body=data, Key=key_name,
-                UploadId=upload_id, PartNumber=i)
-            parts.append({'PartNumber': i, 'ETag': part['ETag']})
+                UploadId=upload_id, PartNumber=part_number, **kwargs))
+        finally:
+            data.close()
+
+        if digest is not None:
+            self._check_etag(
+                'Part {}'.format(part_number), part['ETag'], digest)
+            with self._bytes_lock:
+                self._digests[part_number] = digest
+
+        self._count_bytes(size)
+        if self.journal:
+            self.journal.add_part(part_number, part['ETag'])
+        return {'PartNumber': part_number, 'ETag': part['ETag']}
+
+    def _upload_parts(self, key_name, upload_id, chunks, slots,
+                      planner=None) -> list:
+        '''
+            Upload (part_number, data) chunks, at most `slots` at a time.
+            A slot is claimed before the next chunk is read, so no more
+            than `slots` parts are ever held in memory. Each part's
+            throughput is reported to the planner, if any. Returns the
+            part list in PartNumber order.
+        '''
+        def upload(part_number, data):
+            size = len(data)
+            self._notify('part_started', part_number, size)
+            started = time.monotonic()
+            part = self._upload_part(key_name, upload_id, part_number, data)
+            seconds = time.monotonic() - started
+            if planner is not None:
+                planner.record(size, seconds)
+            self._notify('part_finished', part_number, size, seconds)
+            return part
+
+        if slots == 1:
+            return [upload(number, data) for number, data in chunks]
+
+        from concurrent.futures import ThreadPoolExecutor, wait
+
+        semaphore = threading.BoundedSemaphore(slots)
+        failed = threading.Event()
+
+        def release(future):
+            if future.exception() is not None:
+                failed.set()
+            semaphore.release()
+
+        futures = []
+        executor = self.executor or ThreadPoolExecutor(max_workers=slots)
+        try:
+            while True:
+                semaphore.acquire()
+                if failed.is_set():
+                    break
 
-        self.s3.complete_multipart_upload(
-            Bucket=self.target.bucket_name,
-            Key=key_name,
-            UploadId=upload_id,
-            MultipartUpload={'Parts': parts})
+                chunk = next(chunks, None)
+                if chunk is None:
+                    break
 
-        source_file.close()
+                future = executor.submit(upload, *chunk)
+                future.add_done_callback(release)
+                futures.append(future)
+        finally:
+            wait(futures)
+            if executor is not self.executor:
+                executor.shutdown()
+
+        return [future.result() for future in futures]
+
+    def _list_parts(self, key_name, upload_id) -> dict:
+        parts = {}
+        kwargs = {'Bucket': self.target.bucket_name, 'Key': key_name,
+                  'UploadId': upload_id}
+        while True:
+            response = self._send(
+                None, None, lambda: self.s3.list_parts(**kwargs))
+            for part in response.get('Parts', []):
+                parts[part['PartNumber']] = part['ETag']
+
+            if not response.get('IsTruncated'):
+                return parts
+            kwargs['PartNumberMarker'] = response['NextPartNumberMarker']
+
+    def _resume_multipart(self, key_name) -> tuple[str, dict]:
+        '''
+            Returns the journaled multipart upload id and the parts S3
+            already holds for it, or (None, {}) if there is nothing to
+            resume. If S3 cannot list the parts, the journal is trusted.
+            Parts missing from the journal's plan are ignored and will
+            be overwritten.
+        '''
+        from botocore.exceptions import ClientError
+
+        if self.journal is None:
+            return (None, {})
+
+        state = self.journal.state
+        upload_id = state.get('multipart_upload_id')
+        if upload_id is None or state.get('key_name') != key_name:
+            return (None, {})
+
+        try:
+            uploaded = self._list_parts(key_name, upload_id)
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') == 'NoSuchUpload':
+                return (None, {})
+            uploaded = self.journal.parts
+
+        return (upload_id, {number: etag for number, etag in uploaded.items()
+                            if number in self.journal.plan})
+
+    @contextmanager
+    def _map_file(self, source_file):
+        '''
+            Yields a _MappedFile over source_file, from its current
+            position to the end.
+        '''
+        size = os.fstat(source_file.fileno()).st_size - source_file.tell()
+        yield _MappedFile(source_file.fileno(), source_file.tell(), size)
+
+    @contextmanager
+    def _open_source(self):
+        '''
+            Yields a _MappedFile or memoryview over input_file when its
+            size is known, otherwise a _StreamReader over it.
+        '''
+        source = self.input_file
+        if self._input_is_path():
+            with open(source, 'rb') as source_file, \
+                    self._map_file(source_file) as view:
+                yield view
+        elif self._is_regular_file(source):
+            with self._map_file(source) as view:
+                yield view
+        elif hasattr(source, 'read'):
+            yield _StreamReader(source)
+        else:
+            try:
+                view = memoryview(source)
+            except TypeError:
+                yield _StreamReader(source)
+                return
+
+            with view, view.cast('B') as data:
+                yield data
+
+    def _is_regular_file(self, source) -> bool:
+        try:
+            return stat.S_ISREG(os.fstat(source.fileno()).st_mode)
+        except (AttributeError, OSError, ValueError):
+            return False
+
+    def _read_chunks(self, source, planner, skip):
+        for number, offset, size in planner:
+            if number in skip:
+                continue
+
+            if self.journal and number not in self.journal.plan:
+                self.journal.plan_part(number, offset, size)
+            yield (number, _PartReader(source[offset:offset + size],
+                                       self.bandwidth_limiter))
+
+    def _put_object(self, key_name, source):
+        body = _PartReader(source[:], self.bandwidth_limiter)
+        digest, kwargs = self._content_md5(body)
+        self._notify('part_started', 1, len(source))
+        started = time.monotonic()
+        try:
+            response = self._send(1, body, lambda: self.s3.put_object(
+                Bucket=self.target.bucket_name, Key=key_name, Body=body,
+                **kwargs))
+        finally:
+            body.close()
+
+        if digest is not None:
+            self._check_etag('Media', response['ETag'], digest)
+        self._count_bytes(len(source))
+        self._notify('part_finished', 1, len(source),
+                     time.monotonic() - started)
+
+    def _upload_multipart(self, key_name, source, part_size):
+        upload_id, uploaded = self._resume_multipart(key_name)
+        if upload_id is None:
+            upload_id = self._create_multipart(key_name)
+            if self.journal:
+                self.journal.update(
+                    key_name=key_name, multipart_upload_id=upload_id)
+
+        slots = self._max_parts_in_flight(part_size)
+        max_size = MAX_PART_SIZE
+        if self.max_buffer_size:
+            max_size = max(part_size, self.max_buffer_size // slots)
+
+        planner = _PartPlanner(
+            len(source), part_size,
+            planned=self.journal.plan if self.journal else None,
+            adaptive=self.adaptive_chunk_size,
+            target_seconds=self.target_chunk_seconds,
+            min_size=MIN_PART_SIZE, max_size=max_size)
+
+        chunks = self._read_chunks(source, planner, uploaded)
+        try:
+            parts = self._upload_parts(key_name, upload_id, chunks, slots,
+                                       planner)
+        except Exception:
+            self._abort_multipart(key_name, upload_id)
+            raise
+
+        parts.extend({'PartNumber': number, 'ETag': etag}
+                     for number, etag in uploaded.items())
+        parts.sort(key=lambda part: part['PartNumber'])
+
+        self._complete_multipart(key_name, upload_id, parts)
+
+    def _create_multipart(self, key_name) -> str:
+        return self._send(None, None, lambda: self.s3.create_multipart_upload(
+            Bucket=self.target.bucket_name, Key=key_name))['UploadId']
+
+    def _complete_multipart(self, key_name, upload_id, parts):
+        response = self._send(
+            None, None, lambda: self.s3.complete_multipart_upload(
+                Bucket=self.target.bucket_name,
+                Key=key_name,
+                UploadId=upload_id,
+                MultipartUpload={'Parts': parts}))
+
+        if self.verify_integrity:
+            self._check_composite_etag(parts, response)
+
+    def _fill_part(self, stream, size: int) -> memoryview:
+        view = memoryview(bytearray(size))
+        filled = 0
+        while filled < size:
+            count = stream.readinto(view[filled:])
+            if count is None:
+                stream.wait(_POLL_INTERVAL)
+                continue
+            if not count:
+                break
+            filled += count
+        return view[:filled]
+
+    def _stream_chunks(self, stream, part_size, max_size, first):
+        '''
+            Reads stream into parts. Having no total size to plan with,
+            the part size doubles every thousand parts, up to max_size,
+            so MAX_PARTS can still hold a very long stream.
+        '''
+        number, data = 1, first
+        while len(data):
+            if number > MAX_PARTS:
+                raise ValueError('Media is too large to upload')
+            yield (number, _PartReader(data, self.bandwidth_limiter))
+
+            number += 1
+            size = min(part_size << ((number - 1) // 1000), max_size)
+            data = self._fill_part(stream, size)
+
+    def _upload_stream(self, key_name, stream):
+        part_size = self.chunk_size or DEFAULT_PART_SIZE
+        first = self._fill_part(stream, part_size)
+        if len(first) < part_size:
+            self._put_object(key_name, first)
+            return
+
+        self._check_part_size(part_size)
+        upload_id = self._create_multipart(key_name)
+
+        slots = self._max_parts_in_flight(part_size)
+        max_size = MAX_PART_SIZE
+        if self.max_buffer_size:
+            max_size = max(part_size, self.max_buffer_size // slots)
+
+        chunks = self._stream_chunks(stream, part_size, max_size, first)
+        try:
+            parts = self._upload_parts(key_name, upload_id, chunks, slots)
+        except Exception:
+            self._abort_multipart(key_name, upload_id)
+            raise
+        self._complete_multipart(key_name, upload_id, parts)
+
+    def _file_upload(self, media_file, executor) -> 'PanoptoUpload':
+        '''
+            A copy of this upload that sends one file of a multi-stream
+            session to the same target, with its own counters. Listeners
+            are told of its parts with the copy as the upload.
+        '''
+        upload = copy.copy(self)
+        upload.files = []
+        upload.media_file = media_file
+        upload.input_file = media_file.input_file
+        upload.filename = media_file.filename
+        upload.dest_filename = media_file.dest_filename
+        upload.journal = None
+        upload.executor = executor
+        upload.retries = 0
+        upload.bytes_wasted = 0
+        upload.bytes_uploaded = 0
+        upload._bytes_lock = threading.Lock()
+        upload._digests = {}
+        return upload
+
+    def _upload_files(self):
+        '''
+            Sends every file of a multi-stream session at once, sharing
+            one executor for their parts. Each file is sent through to
+            the end even if another fails, then the first error raised.
+        '''
+        from concurrent.futures import ThreadPoolExecutor
+
+        workers = max(1, self.max_concurrency) * len(self.files)
+        executor = self.executor or ThreadPoolExecutor(max_workers=workers)
+        uploads = [self._file_upload(media_file, executor)
+                   for media_file in self.files]
+        try:
+            with ThreadPoolExecutor(max_workers=len(uploads)) as files:
+                futures = [files.submit(upload._upload_media)
+                           for upload in uploads]
+        finally:
+            if executor is not self.executor:
+                executor.shutdown()
+
+        with self._bytes_lock:
+            for upload in uploads:
+                self.bytes_uploaded += upload.bytes_uploaded
+                self.retries += upload.retries
+                self.bytes_wasted += upload.bytes_wasted
+        for future in futures:
+            future.result()
+
+    @_stage
+    def upload_media(self):
+        if self.files:
+            self._upload_files()
+        else:
+            self._upload_media()
+
+    def _upload_media(self):
+        key_name = self.target.file_key(self.dest_filename)
+        self._digests = {}
+
+        with self._open_source() as source:
+            if isinstance(source, _StreamReader):
+                self._upload_stream(key_name, source)
+                return
+
+            part_size = self._part_size(len(source))
+            if len(source) <= part_size:
+                self._put_object(key_name, source)
+            else:
+                self._upload_multipart(key_name, source, part_size)
 
     def _panopto_manifest(
-            self, dest_filename: str, title: str, descript: str) -> bytes:
+            self, dest_filename: str, title: str, descript: str,
+            files: list = None) -> bytes:
+        '''
+            A manifest of the PanoptoUploadFile files, or of a single
+            Primary video, dest_filename, when there are none.
+        '''
+        from lxml import etree
+
+        if not files:
+            files = [PanoptoUploadFile(None)]
+            files[0].dest_filename = dest_filename
+
         namespace_map = {
             None: 'http://tempuri.org/UniversalCaptureSpecification/v1',
             'xsi': 'http://www.w3.org/2001/XMLSchema-instance',
@@ -171,36 +1273,48 @@ class PanoptoUpload(object):
         elt.text = datetime.now(timezone.utc).isoformat()
         root.append(elt)
 
-        video = etree.Element('Video')
-        elt = etree.Element('Start')
-        elt.text = 'PT0S'
-        video.append(elt)
+        videos = etree.Element('Videos')
+        captions = etree.Element('Captions')
+        for media_file in files:
+            caption = media_file.stream_type == PanoptoUploadFile.CAPTION
+            stream = etree.Element('Caption' if caption else 'Video')
+
+            elt = etree.Element('Start')
+            elt.text = _duration(media_file.start)
+            stream.append(elt)
 
-        elt = etree.Element('File')
-        elt.text = dest_filename
-        video.append(elt)
+            elt = etree.Element('File')
+            elt.text = media_file.dest_filename
+            stream.append(elt)
 
-        elt = etree.Element('Type')
-        elt.text = 'Primary'
-        video.append(elt)
+            if caption:
+                captions.append(stream)
+                continue
+
+            elt = etree.Element('Type')
+            elt.text = media_file.stream_type
+            stream.append(elt)
+            videos.append(stream)
 
-        videos = etree.Element('Videos')
-        videos.append(video)
         root.append(videos)
+        if len(captions):
+            root.append(captions)
 
         return etree.tostring(root, xml_declaration=True, encoding='UTF-8')
 
+    @_stage
     def upload_manifest(self):
         # create and upload a manifest file for panopto
         manifest = self._panopto_manifest(
-            self.dest_filename, self.title, self.description)
+            self.dest_filename, self.title, self.description, self.files)
         source_file = BytesIO(manifest)
         key_name = self.target.file_key('{}.xml'.format(self.uuid))
 
-        self.s3.upload_fileobj(
-            source_file, self.target.bucket_name, key_name,
-            ExtraArgs={'ContentType': 'text/xml'})
+        self._send(None, source_file, lambda: self.s3.put_object(
+            Bucket=self.target.bucket_name, Key=key_name, Body=source_file,
+            ContentType='text/xml'))
 
+    @_stage
     def complete_session(self) -> bool:
         url = 'https://{}/Panopto/PublicAPI/REST/sessionUpload/{}'.format(
             self.server, self.target.upload_id)
@@ -215,8 +1329,13 @@ class PanoptoUpload(object):
             'Message': None
         }
 
-        response = self.session.put(url, json=payload)
-        return response.status_code == 200
+        response = self._request('put', url, json=payload)
+        if response.status_code != 200:
+            return False
+
+        if self.journal:
+            self.journal.remove()
+        return True
 
     def get_upload_id(self) -> str:
         return self.target.upload_id
@@ -266,24 +1385,33 @@ class PanoptoUploadStatus(object):
         UPLOAD_DELETION_ERROR: 'Upload Deletion Error'
     }
 
+    # states an upload does not leave
+    TERMINAL_STATES = frozenset([
+        UPLOAD_READY, UPLOAD_ERROR, UPLOAD_DELETED, UPLOAD_DELETION_ERROR])
+
     def __init__(self):
         self.server = None
         self.username = None
         self.password = None
         self.upload_id = None
 
-    def check(self) -> tuple[int, str]:
-        auth = PanoptoAuth(self.server)
-
-        self.session = auth.authenticate_with_password(
-            self.username, self.password)
-
+    def status(self) -> dict:
+        '''
+            Returns the sessionUpload record for upload_id, or None if
+            it could not be read.
+        '''
         url = 'https://{}/Panopto/PublicAPI/REST/sessionUpload/{}'.format(
             self.server, self.upload_id)
 
-        response = self.session.get(url)
-        if response.status_code == 200:
-            content = loads(response.content)
+        response = session_pool.request(
+            self.server, self.username, self.password, 'get', url)
+        if response is not None and response.status_code == 200:
+            return loads(response.content)
+        return None
+
+    def check(self) -> tuple[int, str]:
+        content = self.status()
+        if content is not None:
             return (content['State'], content['SessionId'])
 
         return (0, None)
@@ -0,0 +1,125 @@
+import heapq
+import random
+import time
+
+from panopto.upload import PanoptoUploadStatus
+
+
+class PanoptoUploadWatcher(object):
+
+    '''
+        Follow the processing state of many uploads.
+
+        Every poll goes through panopto.auth.session_pool, so all
+        uploads share one authenticated session. Each upload is polled
+        on its own schedule: every min_interval seconds at first,
+        backing off by a factor of backoff while its state is unchanged,
+        up to max_interval. Intervals are jittered by up to jitter times
+        their length so that uploads added together spread out. An
+        upload is no longer polled once it reaches one of
+        PanoptoUploadStatus.TERMINAL_STATES.
+
+        State changes are yielded by watch() and passed to on_change as
+        on_change(upload_id, previous_state, state, session_id).
+
+        watcher = PanoptoUploadWatcher(server, username, password)
+        for upload_id in upload_ids:
+            watcher.add(upload_id)
+        for upload_id, state, session_id in watcher.watch():
+            print(upload_id, PanoptoUploadStatus.UPLOAD_STATES[state])
+    '''
+
+    def __init__(self, server, username, password,
+                 min_interval=5, max_interval=300, backoff=2, jitter=0.1,
+                 on_change=None):
+        self.server = server
+        self.username = username
+        self.password = password
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.jitter = jitter
+        self.on_change = on_change
+
+        # upload id to (state, session id), (None, None) before a poll
+        self.states = {}
+        self._intervals = {}
+        self._due = []
+
+    def add(self, upload_id):
+        if upload_id in self.states:
+            return
+        self.states[upload_id] = (None, None)
+        self._intervals[upload_id] = self.min_interval
+        heapq.heappush(self._due, (time.monotonic(), upload_id))
+
+    def pending(self) -> list:
+        return [upload_id for upload_id, (state, session_id)
+                in self.states.items()
+                if state not in PanoptoUploadStatus.TERMINAL_STATES]
+
+    def _poll(self, upload_id):
+        import requests
+
+        status = PanoptoUploadStatus()
+        status.server = self.server
+        status.username = self.username
+        status.password = self.password
+        status.upload_id = upload_id
+        try:
+            return status.status()
+        except (requests.RequestException, ValueError):
+            # a dropped connection or a garbled body, treated as
+            # unreadable so the upload is polled again
+            return None
+
+    def _schedule(self, upload_id, changed):
+        if changed:
+            interval = self.min_interval
+        else:
+            interval = min(self._intervals[upload_id] * self.backoff,
+                           self.max_interval)
+        self._intervals[upload_id] = interval
+
+        delay = interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+        heapq.heappush(self._due, (time.monotonic() + delay, upload_id))
+
+    def watch(self, timeout=None):
+        '''
+            Polls until every upload is in a terminal state, or for at
+            most timeout seconds, yielding (upload_id, state,
+            session_id) each time an upload's state changes.
+        '''
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._due:
+            due = self._due[0][0]
+            if deadline is not None and due > deadline:
+                return
+            wait = due - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+
+            due, upload_id = heapq.heappop(self._due)
+            content = self._poll(upload_id)
+            if content is None:
+                # unreadable this time, try again later
+                self._schedule(upload_id, False)
+                continue
+
+            previous = self.states[upload_id]
+            current = (content['State'], content['SessionId'])
+            changed = current != previous
+            if current[0] not in PanoptoUploadStatus.TERMINAL_STATES:
+                self._schedule(upload_id, changed)
+            if not changed:
+                continue
+
+            self.states[upload_id] = current
+            if self.on_change is not None:
+                self.on_change(upload_id, previous[0], *current)
+            yield (upload_id,) + current
+
+    def run(self, timeout=None) -> dict:
+        for change in self.watch(timeout):
+            pass
+        return self.states
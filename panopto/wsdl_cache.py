@@ -0,0 +1,195 @@
+from contextlib import contextmanager
+import hashlib
+import io
+import json
+import os
+import pickle
+import stat
+import tempfile
+import threading
+
+from lxml import etree
+import requests
+import zeep
+from zeep.cache import Base as CacheBase
+from zeep.transports import Transport
+from zeep.wsdl import Document
+
+
+# bump when the pickled layout changes
+CACHE_FORMAT = 2
+
+
+def _dynamic_type(name, bases, namespace):
+    return type(name, bases, namespace)
+
+
+class _DocumentPickler(pickle.Pickler):
+    '''
+        Pickles a parsed zeep Document without its live transport, and
+        with lxml objects, which do not pickle, stored as their text.
+        The thread-local overrides of its Settings are per call, so an
+        empty threading.local stands in for them.
+
+        zeep makes a class for each schema type as it parses, which
+        pickle cannot import by name. Those are rebuilt from their name,
+        bases and namespace, and the value classes zeep caches on a type
+        are stored as a reference to that type.
+    '''
+
+    def persistent_id(self, obj):
+        if isinstance(obj, (Transport, CacheBase, requests.Session)):
+            return ('transport',)
+        if isinstance(obj, threading.local):
+            return ('local',)
+        if isinstance(obj, etree.QName):
+            return ('qname', obj.text)
+        if isinstance(obj, etree._Element):
+            return ('element', etree.tostring(obj))
+        if isinstance(obj, type) and obj.__module__ == 'zeep.objects':
+            xsd_type = obj.__dict__.get('_xsd_type')
+            for name in ('_value_class', '_array_class'):
+                if getattr(xsd_type, '__dict__', {}).get(name) is obj:
+                    return (name, xsd_type)
+        return None
+
+    def reducer_override(self, obj):
+        if (isinstance(obj, type) and
+                obj.__module__ == 'zeep.xsd.dynamic_types'):
+            namespace = {
+                key: value for key, value in vars(obj).items()
+                if key not in ('__dict__', '__weakref__')}
+            return (_dynamic_type,
+                    (obj.__name__, obj.__bases__, namespace))
+        return NotImplemented
+
+
+class _DocumentUnpickler(pickle.Unpickler):
+
+    def __init__(self, file, transport):
+        super().__init__(file)
+        self.transport = transport
+
+    def persistent_load(self, pid):
+        if pid[0] == 'transport':
+            return self.transport
+        if pid[0] == 'local':
+            return threading.local()
+        if pid[0] == 'qname':
+            return etree.QName(pid[1])
+        if pid[0] == 'element':
+            return etree.fromstring(pid[1])
+        if pid[0] in ('_value_class', '_array_class'):
+            # the type may still be waiting for its state; the cached
+            # property then makes the class, and the state keeps it
+            return getattr(pid[1], pid[0])
+        raise pickle.UnpicklingError('unknown id {}'.format(pid[0]))
+
+
+def cache_path(cache_dir, url, content) -> str:
+    '''
+        The cache file for a WSDL, versioned by the hash of its content
+        and the zeep release that parsed it. The schemas it imports are
+        checked against the hashes stored in the file.
+    '''
+    digest = hashlib.sha256(url.encode('utf-8') + content).hexdigest()
+    return os.path.join(cache_dir, 'wsdl-{}-{}-{}.pickle'.format(
+        CACHE_FORMAT, zeep.__version__, digest[:32]))
+
+
+def _digest(content) -> str:
+    return hashlib.sha256(content).hexdigest()
+
+
+@contextmanager
+def _recording(transport):
+    '''
+        Yields a dict filled with the hash of every document transport
+        loads, the WSDL and each schema it imports, until exit.
+    '''
+    loaded = {}
+    load = transport.load
+
+    def recording_load(url):
+        content = load(url)
+        loaded[url] = _digest(content)
+        return content
+
+    transport.load = recording_load
+    try:
+        yield loaded
+    finally:
+        del transport.load
+
+
+def _changed(loaded, transport) -> bool:
+    return any(_digest(transport.load(url)) != digest
+               for url, digest in loaded.items())
+
+
+def _owned(info) -> bool:
+    getuid = getattr(os, 'getuid', None)
+    return getuid is not None and info.st_uid == getuid()
+
+
+def _private_dir(path) -> bool:
+    '''
+        Creates path with mode 0700 if it is missing, and says whether
+        it is a directory owned by this user that no one else may use.
+        Unpickling runs code, so pickles are only read from and written
+        to such a directory, and never where there are no POSIX owners.
+    '''
+    try:
+        os.makedirs(path, mode=0o700, exist_ok=True)
+        info = os.lstat(path)
+    except OSError:
+        return False
+    return (stat.S_ISDIR(info.st_mode) and _owned(info) and
+            not info.st_mode & 0o077)
+
+
+def load_document(url, transport, cache_dir):
+    '''
+        Returns the zeep Document for url, unpickled from cache_dir when
+        a copy parsed from the same WSDL and schemas is there. Otherwise
+        the WSDL is parsed and, if the result can be pickled, saved for
+        the next process. Any cache failure falls back to a plain parse,
+        as does a cache_dir that is not private to this user.
+
+        A cache file is a line of JSON, the hash of every document the
+        parse loaded by URL, followed by the pickled Document.
+    '''
+    if not _private_dir(cache_dir):
+        return Document(url, transport)
+
+    content = transport.load(url)
+    path = cache_path(cache_dir, url, content)
+
+    try:
+        with open(path, 'rb') as f:
+            if not _owned(os.fstat(f.fileno())):
+                raise pickle.UnpicklingError('not owned by this user')
+            if _changed(json.loads(f.readline()), transport):
+                raise pickle.UnpicklingError('an imported schema changed')
+            return _DocumentUnpickler(f, transport).load()
+    except Exception:
+        # missing, stale or corrupt, parse again and overwrite it
+        pass
+
+    with _recording(transport) as loaded:
+        document = Document(url, transport)
+    try:
+        buffer = io.BytesIO()
+        buffer.write(json.dumps(loaded).encode('utf-8') + b'\n')
+        _DocumentPickler(buffer, pickle.HIGHEST_PROTOCOL).dump(document)
+    except Exception:
+        return document
+
+    try:
+        with tempfile.NamedTemporaryFile(
+                dir=cache_dir, delete=False, suffix='.tmp') as f:
+            f.write(buffer.getvalue())
+        os.replace(f.name, path)
+    except OSError:
+        pass
+    return document
@@ -39,6 +39,9 @@ setup(
         "boto3",
         "botocore",
     ],
+    extras_require={
+        "async": ["httpx"],
+    },
     scripts=[],
     license="GPLv3+",
     platforms=["any"],